@@ -0,0 +1,92 @@
+"""Measures memory allocated by the engine per scheduler step.
+
+A single zero-cost synthetic submodel is run for a number of steps with
+tracemalloc enabled. Between two consecutive calls to its solve(), the
+engine executes exactly one O_I, S and B operator, so the memory
+allocated in between is engine overhead. We report the number of bytes
+allocated on top of what was live at the previous step (the transient
+peak), and the number of bytes still live afterwards.
+
+As a baseline, the run is repeated with the inbox handling the engine
+had before inboxes were double-buffered: taking the messages replaced
+the inbox with a deep copy of an empty template dict. The difference
+between the two runs is what double buffering saves.
+
+Usage: python benchmarks/allocation_benchmark.py
+"""
+from synthetic import SyntheticSubmodel, make_configuration, make_element
+
+from littlemuscle.model_execution_graph import ModelExecutionGraph, ModelNode
+from littlemuscle.simulation_engine import run_simulation
+
+from copy import deepcopy
+import tracemalloc
+
+
+NUM_STEPS = 1000
+
+
+class TracingSubmodel(SyntheticSubmodel):
+    def __init__(self) -> None:
+        super().__init__([], [])
+        self.peaks = []
+        self.growth = []
+
+    def solve(self, time, input_messages):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.num_solves > 0:
+            self.peaks.append(peak - self.__last)
+            self.growth.append(current - self.__last)
+        super().solve(time, input_messages)
+        tracemalloc.reset_peak()
+        self.__last = tracemalloc.get_traced_memory()[0]
+
+
+def copy_inbox_templates(node: ModelNode) -> None:
+    """Makes node allocate a new inbox whenever its messages are taken.
+
+    Before double buffering, take_messages() returned the inbox and
+    replaced it with a deep copy of an empty template, a dict with a
+    None for the state and each receiving endpoint. The copy is kept
+    until the next take, as the inbox was.
+    """
+    template = dict.fromkeys(node.slot_indices)
+    take_messages = node.take_messages
+    inbox = [deepcopy(template)]
+
+    def take_messages_and_copy():
+        messages = take_messages()
+        inbox[0] = deepcopy(template)
+        return messages
+
+    node.take_messages = take_messages_and_copy
+
+
+def measure(baseline: bool) -> TracingSubmodel:
+    submodel = TracingSubmodel()
+    element = make_element('element', submodel)
+
+    configurations = {element.name: make_configuration(1.0, float(NUM_STEPS))}
+    graph = ModelExecutionGraph([element], [])
+    if baseline:
+        for node in graph.nodes():
+            copy_inbox_templates(node)
+
+    tracemalloc.start()
+    run_simulation(graph, configurations)
+    tracemalloc.stop()
+    return submodel
+
+
+if __name__ == '__main__':
+    results = [('deepcopied inbox', measure(True)), ('double-buffered', measure(False))]
+
+    print('{:32}{:>18}{:>18}'.format('', *(name for name, _ in results)))
+    print('{:32}{:>18}{:>18}'.format('steps:', *(
+        len(submodel.peaks) for _, submodel in results)))
+    print('{:32}{:>18.1f}{:>18.1f}'.format('transient bytes per step (avg):', *(
+        sum(submodel.peaks) / len(submodel.peaks) for _, submodel in results)))
+    print('{:32}{:>18}{:>18}'.format('transient bytes per step (max):', *(
+        max(submodel.peaks) for _, submodel in results)))
+    print('{:32}{:>18.1f}{:>18.1f}'.format('retained bytes per step (avg):', *(
+        sum(submodel.growth) / len(submodel.growth) for _, submodel in results)))
@@ -0,0 +1,88 @@
+"""Measures the benefit of the asyncio engine for I/O-bound submodels.
+
+A model that consumes forcing data from several readers is run with
+run_simulation and with Simulation.run(asynchronous=True). Each reader
+stands in for a submodel that reads its data from a large file or from
+an external service, by sleeping for a fixed time per step: blocking
+with time.sleep() in the synchronous version, and with asyncio.sleep()
+in the async one. With the asyncio engine the waits of the readers
+overlap, so a step should take about as long as a single read, rather
+than as long as all of them together.
+
+Usage: python benchmarks/async_benchmark.py
+"""
+from synthetic import SyntheticSubmodel, make_configuration
+
+from littlemuscle import Simulation
+from littlemuscle.message import Message
+
+import asyncio
+from time import perf_counter, sleep
+from typing import Any, Dict, List
+
+
+NUM_STEPS = 20
+DELAY = 0.005
+
+
+class SlowReader(SyntheticSubmodel):
+    """Sends the step number, after waiting DELAY seconds to read it."""
+    def __init__(self) -> None:
+        super().__init__([], ['out'])
+
+    def solve(self, time: float, input_messages: Dict[str, Message]) -> None:
+        sleep(DELAY)
+        super().solve(time, input_messages)
+
+    def observe_intermediate_state(self) -> Dict[str, Any]:
+        return {'out': self.num_solves}
+
+
+class AsyncSlowReader(SlowReader):
+    """Like SlowReader, but waits without blocking."""
+    async def solve(self, time: float, input_messages: Dict[str, Message]) -> None:
+        await asyncio.sleep(DELAY)
+        SyntheticSubmodel.solve(self, time, input_messages)
+
+
+class Consumer(SyntheticSubmodel):
+    """Adds up everything it receives."""
+    def __init__(self, receives: List[str]) -> None:
+        super().__init__(receives, [])
+        self.total = 0
+
+    def solve(self, time: float, input_messages: Dict[str, Message]) -> None:
+        super().solve(time, input_messages)
+        self.total += sum(message.data for message in input_messages.values())
+
+
+def make_simulation(num_readers: int, reader_type: type) -> (Simulation, Consumer):
+    names = ['reader{}'.format(i) for i in range(num_readers)]
+    consumer = Consumer(['from_{}'.format(name) for name in names])
+
+    simulation = Simulation()
+    simulation.add_submodel('consumer', consumer)
+    simulation.set_configuration('consumer', make_configuration(1.0, float(NUM_STEPS)))
+    for name in names:
+        simulation.add_submodel(name, reader_type())
+        simulation.set_configuration(name, make_configuration(1.0, float(NUM_STEPS)))
+        simulation.add_conduit(name, 'out', 'consumer', 'from_{}'.format(name))
+    return simulation, consumer
+
+
+def time_run(num_readers: int, asynchronous: bool) -> (float, int):
+    reader_type = AsyncSlowReader if asynchronous else SlowReader
+    simulation, consumer = make_simulation(num_readers, reader_type)
+    start = perf_counter()
+    simulation.run(asynchronous=asynchronous)
+    return perf_counter() - start, consumer.total
+
+
+if __name__ == '__main__':
+    print('{:>10} {:>12} {:>12} {:>10}'.format('readers', 'sync [s]', 'async [s]', 'speedup'))
+    for num_readers in [1, 4, 16]:
+        sync_time, sync_total = time_run(num_readers, False)
+        async_time, async_total = time_run(num_readers, True)
+        assert sync_total == async_total
+        print('{:>10} {:>12.3f} {:>12.3f} {:>10.1f}'.format(
+            num_readers, sync_time, async_time, sync_time / async_time))
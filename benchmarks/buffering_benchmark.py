@@ -0,0 +1,93 @@
+"""Measures how buffered conduits let a producer run ahead in parallel.
+
+A producer sends to a consumer every step, and both cost a varying
+amount of CPU time per step, out of phase: when one has an expensive
+step, the other has a cheap one. With a conduit depth of one, each
+waits for the other's expensive steps, while with a deeper conduit the
+producer can work ahead during the consumer's expensive steps, and the
+consumer can catch up during the producer's. The run is parallel, with
+each submodel in its own process.
+
+Usage: python benchmarks/buffering_benchmark.py
+"""
+from synthetic import make_configuration
+
+from littlemuscle import Simulation
+from littlemuscle.configuration import Configuration
+from littlemuscle.message import Message
+from littlemuscle.operator import Operator
+from littlemuscle.submodel import SubmodelDescription, TimeDrivenSubmodel
+
+from time import perf_counter
+from typing import Any, Dict
+
+
+NUM_STEPS = 40
+COST = 2000000
+# the number of consecutive expensive or cheap steps
+PERIOD = 4
+DEPTHS = [1, 2, 4, 8]
+
+
+class AlternatingSubmodel(TimeDrivenSubmodel):
+    """Costs COST loop iterations on every other run of PERIOD steps,
+    and a tenth of that on the others.
+    """
+    def __init__(self, receives: bool, sends: bool, phase: int) -> None:
+        self.receives = receives
+        self.sends = sends
+        self.phase = phase
+
+    def describe(self) -> SubmodelDescription:
+        description = SubmodelDescription(1)
+        if self.receives:
+            description.add_endpoint(Operator.S, 'in')
+        if self.sends:
+            description.add_endpoint(Operator.O_I, 'out')
+        return description
+
+    def initialise_state(self,
+            configuration: Configuration,
+            initial_time: float,
+            input_messages: Dict[str, Message]
+            ) -> None:
+        self.step = 0
+
+    def solve(self, time: float, input_messages: Dict[str, Message]) -> None:
+        expensive = (self.step // PERIOD + self.phase) % 2 == 0
+        total = 0
+        for i in range(COST if expensive else COST // 10):
+            total += i
+        self.step += 1
+
+    def update_boundary_conditions(self,
+            time: float, input_messages: Dict[str, Message]) -> None:
+        pass
+
+    def has_converged(self) -> bool:
+        return False
+
+    def observe_intermediate_state(self) -> Dict[str, Any]:
+        return {'out': self.step} if self.sends else {}
+
+    def observe_final_state(self) -> Dict[str, Any]:
+        return {}
+
+
+def time_run(depth: int) -> float:
+    simulation = Simulation()
+    simulation.add_submodel('producer', AlternatingSubmodel(False, True, 0))
+    simulation.add_submodel('consumer', AlternatingSubmodel(True, False, 1))
+    simulation.add_conduit('producer', 'out', 'consumer', 'in', depth=depth)
+    for name in ['producer', 'consumer']:
+        simulation.set_configuration(name, make_configuration(1.0, float(NUM_STEPS)))
+
+    start = perf_counter()
+    simulation.run(parallel=True)
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    print('{:>8} {:>10}'.format('depth', 'time [s]'))
+    for depth in DEPTHS:
+        print('{:>8} {:>10.3f}'.format(depth, time_run(depth)))
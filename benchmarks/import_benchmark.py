@@ -0,0 +1,56 @@
+"""Measures how long it takes to import littlemuscle.
+
+Each measurement imports the package in a fresh interpreter. Importing
+must not pull in matplotlib or networkx, which are only needed by
+Simulation.plot() and ModelExecutionGraph.to_networkx(), nor NumPy,
+which is only needed for arrays in messages, nor asyncio, which is only
+needed for asynchronous runs, nor any of the standard library modules
+in SLOW_MODULES, which are only needed by parallel runs, checkpoints,
+recordings, sinks, caches and sweeps. If it does, this script exits
+with an error naming them, so that the regression is noticed.
+
+Usage: python benchmarks/import_benchmark.py
+"""
+import os
+import subprocess
+import sys
+
+
+NUM_REPEATS = 10
+
+HEAVY_MODULES = ['matplotlib', 'networkx', 'numpy', 'asyncio']
+
+SLOW_MODULES = [
+        'hashlib', 'json', 'mmap', 'multiprocessing', 'pickle', 'queue',
+        'threading', 'zlib']
+
+IMPORT_SCRIPT = '''
+import sys
+from time import perf_counter
+start = perf_counter()
+import littlemuscle
+elapsed = perf_counter() - start
+print(elapsed, ','.join(name for name in sys.argv[1:] if name in sys.modules) or '-')
+'''
+
+
+def time_import():
+    # run from the root of the repository, so that it imports from there
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output(
+            [sys.executable, '-c', IMPORT_SCRIPT] + HEAVY_MODULES + SLOW_MODULES, cwd=root)
+    elapsed, loaded = output.decode().split()
+    return float(elapsed), [] if loaded == '-' else loaded.split(',')
+
+
+if __name__ == '__main__':
+    results = [time_import() for i in range(NUM_REPEATS)]
+    times = sorted(elapsed for elapsed, _ in results)
+
+    print('import littlemuscle: min {:.1f} ms, median {:.1f} ms'.format(
+        times[0] * 1e3, times[len(times) // 2] * 1e3))
+
+    loaded = sorted(set(name for _, names in results for name in names))
+    if loaded:
+        print('Error: importing littlemuscle loaded {}'.format(', '.join(loaded)))
+        sys.exit(1)
@@ -0,0 +1,47 @@
+"""Measures the benefit of interpolating conduits between time scales.
+
+An expensive coarse submodel drives a cheap fine one, which takes
+RATIO steps for each coarse step. Without interpolation, the coarse
+submodel has to run at the fine time step to send a message for every
+fine step. With a LINEAR interpolating conduit, it runs at its own time
+step, and the conduit serves the fine submodel at each of its steps.
+
+Usage: python benchmarks/interpolation_benchmark.py
+"""
+from synthetic import SyntheticSubmodel, make_configuration
+
+from littlemuscle import Interpolation, Simulation
+
+from time import perf_counter
+
+
+NUM_COARSE_STEPS = 20
+RATIO = 10
+COARSE_COST = 1000000
+FINE_COST = 10000
+
+
+def time_run(interpolation: Interpolation) -> float:
+    extent = float(NUM_COARSE_STEPS)
+    fine_grain = 1.0 / RATIO
+    simulation = Simulation()
+    simulation.add_submodel('coarse', SyntheticSubmodel([], ['out'], COARSE_COST))
+    simulation.add_submodel('fine', SyntheticSubmodel(['in'], [], FINE_COST))
+    if interpolation is None:
+        simulation.add_conduit('coarse', 'out', 'fine', 'in')
+        simulation.set_configuration('coarse', make_configuration(fine_grain, extent))
+    else:
+        simulation.add_conduit('coarse', 'out', 'fine', 'in',
+                depth=2, interpolation=interpolation)
+        simulation.set_configuration('coarse', make_configuration(1.0, extent))
+    simulation.set_configuration('fine', make_configuration(fine_grain, extent))
+
+    start = perf_counter()
+    simulation.run()
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    print('{:>14} {:>10}'.format('coupling', 'time [s]'))
+    print('{:>14} {:>10.3f}'.format('lockstep', time_run(None)))
+    print('{:>14} {:>10.3f}'.format('linear', time_run(Interpolation.LINEAR)))
@@ -0,0 +1,81 @@
+"""Measures per-operator scheduling cost as the execution graph grows.
+
+Runs a set of independent, zero-cost synthetic submodels through the
+ready-queue scheduler in run_simulation, and through a reference loop
+that finds the next runnable node by scanning the whole graph, as the
+engine used to do. The ready queue's cost per operator execution should
+stay flat, while the scan grows linearly with the number of nodes.
+
+Also runs a precompiled static schedule (see littlemuscle.schedule),
+not counting the time taken to compile it.
+
+Usage: python benchmarks/scheduler_benchmark.py
+"""
+from synthetic import independent_topology, make_configuration
+
+from littlemuscle.message import Message
+from littlemuscle.model_execution_graph import ModelExecutionGraph, STATE_SLOT
+from littlemuscle.operator import Operator
+from littlemuscle.schedule import compile_schedule, run_schedule
+from littlemuscle.simulation_engine import (
+        _deliver_messages, _run_operator, run_simulation)
+
+from collections import deque
+from time import perf_counter
+
+
+NUM_STEPS = 200
+
+
+def run_linear_scan(graph, configurations):
+    for node in graph.nodes():
+        if node.operator == Operator.F_INIT:
+            node.post_message(STATE_SLOT, Message(0.0, 0.0, False))
+
+    node = _scan_for_runnable_node(graph)
+    while node:
+        sent_messages = _run_operator(
+                node.operator, node.implementation,
+                configurations.get(node.element_name), node.take_messages())
+        _deliver_messages(graph, node, sent_messages, deque())
+        node = _scan_for_runnable_node(graph)
+
+
+def _scan_for_runnable_node(graph):
+    for node in graph.nodes():
+        if node.inbox_full():
+            return node
+    return None
+
+
+def time_run(run, num_elements, static=False):
+    elements, conduits, submodels = independent_topology(num_elements)
+    configuration = make_configuration(1.0, float(NUM_STEPS))
+    configurations = {element.name: configuration for element in elements}
+    graph = ModelExecutionGraph(elements, conduits)
+
+    if static:
+        schedule = compile_schedule(graph, configurations)
+        start = perf_counter()
+        run_schedule(graph, configurations, schedule)
+        elapsed = perf_counter() - start
+    else:
+        start = perf_counter()
+        run(graph, configurations)
+        elapsed = perf_counter() - start
+
+    num_operators = sum(s.num_operator_executions() for s in submodels)
+    return elapsed / num_operators
+
+
+if __name__ == '__main__':
+    print('{:>10} {:>10} {:>20} {:>20} {:>20}'.format(
+        'elements', 'nodes', 'ready queue [us/op]', 'linear scan [us/op]',
+        'static [us/op]'))
+    for num_elements in [1, 4, 16, 64]:
+        ready_queue = time_run(run_simulation, num_elements)
+        linear_scan = time_run(run_linear_scan, num_elements)
+        static = time_run(None, num_elements, static=True)
+        print('{:>10} {:>10} {:>20.2f} {:>20.2f} {:>20.2f}'.format(
+            num_elements, 5 * num_elements,
+            ready_queue * 1e6, linear_scan * 1e6, static * 1e6))
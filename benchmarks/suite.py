@@ -0,0 +1,151 @@
+"""Benchmark suite for the simulation engine.
+
+Runs synthetic submodels (see synthetic.py) in each of the topologies
+in synthetic.TOPOLOGIES, for a range of sizes, and measures for each
+case:
+
+- operator executions per second of Simulation.run(),
+- the fraction of run time spent in the engine rather than in operators,
+  from a second run with a Profiler,
+- the peak memory allocated during the run, from a third run under
+  tracemalloc.
+
+Results are written as JSON, together with the git commit they were
+measured at, so that runs on different commits can be compared.
+
+Usage:
+    python benchmarks/suite.py [--quick] [--output results.json]
+    python benchmarks/suite.py --compare old.json new.json
+"""
+from synthetic import TOPOLOGIES
+
+from littlemuscle import Profiler
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Any, Dict, List
+
+
+SIZES = [1, 4, 16, 64]
+STEPS = [10, 100]
+COSTS = [0, 1000]
+PAYLOAD_SIZES = [0, 1 << 16]
+
+QUICK_SIZES = [1, 8]
+QUICK_STEPS = [10]
+
+
+def run_case(topology: str, size: int, steps: int, cost: int, payload_size: int) -> Dict[str, Any]:
+    make_topology = TOPOLOGIES[topology]
+
+    simulation, submodels = make_topology(size, steps, cost, payload_size)
+    start = perf_counter()
+    simulation.run()
+    wall_time = perf_counter() - start
+    num_operators = sum(submodel.num_operator_executions() for submodel in submodels)
+
+    simulation, _ = make_topology(size, steps, cost, payload_size)
+    profiler = Profiler()
+    start = perf_counter()
+    simulation.run(profiler=profiler)
+    profiled_time = perf_counter() - start
+
+    simulation, _ = make_topology(size, steps, cost, payload_size)
+    tracemalloc.start()
+    simulation.run()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+            'topology': topology,
+            'size': size,
+            'steps': steps,
+            'cost': cost,
+            'payload_size': payload_size,
+            'wall_time': wall_time,
+            'operator_executions': num_operators,
+            'operators_per_second': num_operators / wall_time,
+            'scheduler_fraction': profiler.scheduler_time() / profiled_time,
+            'peak_memory': peak_memory,
+            }
+
+
+def run_suite(sizes: List[int], steps: List[int]) -> Dict[str, Any]:
+    results = []
+    for topology in sorted(TOPOLOGIES):
+        for size in sizes:
+            if topology in ('chain', 'all_to_all') and size < 2:
+                continue
+            for num_steps in steps:
+                for cost in COSTS:
+                    for payload_size in PAYLOAD_SIZES:
+                        result = run_case(topology, size, num_steps, cost, payload_size)
+                        print('{topology:>16} size {size:>3} steps {steps:>4} '
+                                'cost {cost:>5} payload {payload_size:>6}: '
+                                '{operators_per_second:>10.0f} ops/s '
+                                '{scheduler_fraction:>6.1%} scheduler '
+                                '{peak_memory:>10} B peak'.format(**result),
+                                file=sys.stderr)
+                        results.append(result)
+
+    return {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+            }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    def key(result: Dict[str, Any]) -> tuple:
+        return (result['topology'], result['size'], result['steps'],
+                result['cost'], result['payload_size'])
+
+    old_results = {key(result): result for result in old['results']}
+    print('{:>16} {:>5} {:>6} {:>6} {:>8} {:>12} {:>12} {:>8}'.format(
+        'topology', 'size', 'steps', 'cost', 'payload', 'old ops/s', 'new ops/s', 'speedup'))
+    for result in new['results']:
+        old_result = old_results.get(key(result))
+        if old_result is None:
+            continue
+        print('{:>16} {:>5} {:>6} {:>6} {:>8} {:>12.0f} {:>12.0f} {:>8.2f}'.format(
+            *key(result), old_result['operators_per_second'],
+            result['operators_per_second'],
+            result['operators_per_second'] / old_result['operators_per_second']))
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the simulation engine.')
+    parser.add_argument('--quick', action='store_true', help='run a small subset')
+    parser.add_argument('--output', help='file to write results to, default stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+            help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            compare(json.load(old_file), json.load(new_file))
+    else:
+        if args.quick:
+            results = run_suite(QUICK_SIZES, QUICK_STEPS)
+        else:
+            results = run_suite(SIZES, STEPS)
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        else:
+            json.dump(results, sys.stdout, indent=2)
@@ -0,0 +1,78 @@
+"""Measures the benefit of caching submodel results in a parameter sweep.
+
+A chain of three submodels, each initialised from the final state of
+the one before it, is swept over a parameter of the last one only. The
+sweep is run without a cache, with an empty cache, and again with the
+cache filled by the previous sweep. With a cache, the first two stages
+only run in the runs that start before their results are in the cache,
+one per process, and with a filled cache nothing runs at all.
+
+Usage: python benchmarks/sweep_benchmark.py
+"""
+from synthetic import SyntheticSubmodel, make_configuration
+
+from littlemuscle import Simulation, run_sweep
+from littlemuscle.mapper import Mapper, MapperDescription
+from littlemuscle.message import Message
+
+import shutil
+import tempfile
+from time import perf_counter
+from typing import Any, Dict
+
+
+NUM_STEPS = 20
+COST = 100000
+NUM_POINTS = 8
+NUM_PROCESSES = 4
+
+
+class Result(Mapper):
+    """Keeps the data of the message it receives."""
+    def describe(self) -> MapperDescription:
+        description = MapperDescription()
+        description.add_input('in')
+        return description
+
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        self.data = input_messages['in'].data
+        return {}
+
+
+def make_simulation() -> Simulation:
+    simulation = Simulation()
+    simulation.add_submodel('first', SyntheticSubmodel(
+        [], [], COST, final_sends=['out']))
+    simulation.add_submodel('second', SyntheticSubmodel(
+        [], [], COST, init_receives=['in'], final_sends=['out']))
+    simulation.add_submodel('third', SyntheticSubmodel(
+        [], [], COST, init_receives=['in'], final_sends=['out']))
+    simulation.add_mapper('result', Result())
+    simulation.add_conduit('first', 'out', 'second', 'in')
+    simulation.add_conduit('second', 'out', 'third', 'in')
+    simulation.add_conduit('third', 'out', 'result', 'in')
+    for name in ['first', 'second', 'third']:
+        simulation.set_configuration(name, make_configuration(1.0, float(NUM_STEPS)))
+    return simulation
+
+
+def observe(simulation: Simulation) -> Any:
+    return simulation.get_submodel('result').data
+
+
+def time_sweep(cache_directory: str) -> float:
+    grid = {'third': {'x': list(range(NUM_POINTS))}}
+    start = perf_counter()
+    run_sweep(make_simulation(), grid, observe, NUM_PROCESSES, cache_directory)
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    cache_directory = tempfile.mkdtemp()
+    try:
+        print('{:>14} {:>10}'.format('cache', 'time [s]'))
+        print('{:>14} {:>10.3f}'.format('none', time_sweep(None)))
+        print('{:>14} {:>10.3f}'.format('empty', time_sweep(cache_directory)))
+        print('{:>14} {:>10.3f}'.format('filled', time_sweep(cache_directory)))
+    finally:
+        shutil.rmtree(cache_directory)
@@ -0,0 +1,230 @@
+"""Synthetic submodels and topologies for benchmarking the engine.
+
+These submodels do no real science. Each one burns a configurable amount
+of CPU time per step and sends a payload of configurable size on every
+endpoint, so that the cost of the coupling machinery can be measured
+separately from the cost of the models being coupled.
+
+The benchmark scripts all import this module first. It puts the root of
+the repository on sys.path, so that they run from a source checkout
+without installing littlemuscle or setting PYTHONPATH.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from littlemuscle import Simulation
+from littlemuscle.configuration import Configuration
+from littlemuscle.message import Message
+from littlemuscle.model import ComputeElement, Conduit, KindOfComputeElement
+from littlemuscle.operator import Operator
+from littlemuscle.scale import Scale
+from littlemuscle.submodel import SubmodelDescription, TimeDrivenSubmodel
+from littlemuscle.time_driven_adapter import TimeDrivenAdapter
+
+from typing import Any, Dict, List, Tuple
+
+
+class SyntheticSubmodel(TimeDrivenSubmodel):
+    """A submodel that costs time and sends data, but computes nothing.
+
+    Args:
+        receives: Names of endpoints to receive on in S.
+        sends: Names of endpoints to send on in O_I.
+        cost: Number of loop iterations to spend per solve.
+        payload_size: Number of bytes to send on each endpoint.
+        init_receives: Names of endpoints to receive on in F_INIT.
+        final_sends: Names of endpoints to send on in O_F.
+        fan_out: If not zero, send a list of this many payloads from O_I
+            instead of one, to drive an ensemble.
+    """
+    def __init__(self,
+            receives: List[str], sends: List[str],
+            cost: int = 0, payload_size: int = 0,
+            init_receives: List[str] = [], final_sends: List[str] = [],
+            fan_out: int = 0
+            ) -> None:
+        self.receives = receives
+        self.sends = sends
+        self.cost = cost
+        self.payload_size = payload_size
+        self.init_receives = init_receives
+        self.final_sends = final_sends
+        self.fan_out = fan_out
+        self.num_inits = 0
+        self.num_solves = 0
+
+    def describe(self) -> SubmodelDescription:
+        description = SubmodelDescription(1)
+        for name in self.init_receives:
+            description.add_endpoint(Operator.F_INIT, name)
+        for name in self.receives:
+            description.add_endpoint(Operator.S, name)
+        for name in self.sends:
+            description.add_endpoint(Operator.O_I, name)
+        for name in self.final_sends:
+            description.add_endpoint(Operator.O_F, name)
+        return description
+
+    def initialise_state(self,
+            configuration: Configuration,
+            initial_time: float,
+            input_messages: Dict[str, Message]
+            ) -> None:
+        self.num_inits += 1
+        self.state = 0.0
+
+    def solve(self, time: float, input_messages: Dict[str, Message]) -> None:
+        self.num_solves += 1
+        total = 0
+        for i in range(self.cost):
+            total += i
+        self.state = time
+
+    def update_boundary_conditions(self,
+            time: float, input_messages: Dict[str, Message]) -> None:
+        pass
+
+    def has_converged(self) -> bool:
+        return False
+
+    def observe_intermediate_state(self) -> Dict[str, Any]:
+        if self.fan_out:
+            return {name: [bytes(self.payload_size) for i in range(self.fan_out)]
+                    for name in self.sends}
+        return {name: bytes(self.payload_size) for name in self.sends}
+
+    def observe_final_state(self) -> Dict[str, Any]:
+        return {name: bytes(self.payload_size) for name in self.final_sends}
+
+    def num_operator_executions(self) -> int:
+        # each step is O_I, S, B; each loop adds one F_INIT and one O_F
+        return 3 * self.num_solves + 2 * self.num_inits
+
+
+def make_configuration(grain: float, extent: float) -> Configuration:
+    configuration = Configuration()
+    configuration.time_scale = Scale(grain, extent)
+    return configuration
+
+
+def independent_topology(
+        num_elements: int,
+        cost: int = 0, payload_size: int = 0
+        ) -> Tuple[List[ComputeElement], List[Conduit], List[SyntheticSubmodel]]:
+    """Makes num_elements submodels that do not communicate."""
+    submodels = [SyntheticSubmodel([], [], cost, payload_size)
+            for i in range(num_elements)]
+    elements = [make_element('element{}'.format(i), submodel)
+            for i, submodel in enumerate(submodels)]
+    return elements, [], submodels
+
+
+def make_element(name: str, submodel: TimeDrivenSubmodel) -> ComputeElement:
+    endpoints = submodel.describe().endpoints
+    return ComputeElement(KindOfComputeElement.SUBMODEL, name, endpoints,
+            TimeDrivenAdapter(submodel))
+
+
+# Topologies for Simulation. Each function returns the Simulation and
+# the submodels whose operator executions make up the whole run, and
+# takes a size, the number of macro steps, a cost and a payload size.
+
+Topology = Tuple[Simulation, List[SyntheticSubmodel]]
+
+MICRO_STEPS = 10
+
+
+def macro_micro(size: int, steps: int, cost: int, payload_size: int) -> Topology:
+    """One macro model, coupled to size micro models.
+
+    Each macro step, each micro model is initialised from the macro
+    model's O_I, runs MICRO_STEPS steps, and returns its O_F to the
+    macro model's S.
+    """
+    names = ['micro{}'.format(i) for i in range(size)]
+    macro = SyntheticSubmodel(
+            ['from_{}'.format(name) for name in names],
+            ['to_{}'.format(name) for name in names],
+            cost, payload_size)
+    micros = [SyntheticSubmodel([], [], cost, payload_size, ['in'], ['out'])
+            for name in names]
+
+    simulation = Simulation()
+    simulation.add_submodel('macro', macro)
+    simulation.set_configuration('macro', make_configuration(1.0, float(steps)))
+    for name, micro in zip(names, micros):
+        simulation.add_submodel(name, micro)
+        simulation.set_configuration(name, make_configuration(1.0, float(MICRO_STEPS)))
+        simulation.add_conduit('macro', 'to_{}'.format(name), name, 'in')
+        simulation.add_conduit(name, 'out', 'macro', 'from_{}'.format(name))
+    return simulation, [macro] + micros
+
+
+def chain(size: int, steps: int, cost: int, payload_size: int) -> Topology:
+    """size submodels, each sending to the next via O_I -> S."""
+    submodels = [SyntheticSubmodel(
+                ['in'] if i > 0 else [], ['out'] if i < size - 1 else [],
+                cost, payload_size)
+            for i in range(size)]
+
+    simulation = Simulation()
+    for i, submodel in enumerate(submodels):
+        simulation.add_submodel('element{}'.format(i), submodel)
+        simulation.set_configuration(
+                'element{}'.format(i), make_configuration(1.0, float(steps)))
+    for i in range(size - 1):
+        simulation.add_conduit(
+                'element{}'.format(i), 'out', 'element{}'.format(i + 1), 'in')
+    return simulation, submodels
+
+
+def fan_out_ensemble(size: int, steps: int, cost: int, payload_size: int) -> Topology:
+    """A macro model driving an ensemble of size micro models.
+
+    Like macro_micro, but with the micro models in a single ensemble
+    element, so the macro model sends one list with size payloads.
+    """
+    macro = SyntheticSubmodel(
+            ['from_ensemble'], ['to_ensemble'], cost, payload_size, fan_out=size)
+    micros = [SyntheticSubmodel([], [], cost, payload_size, ['in'], ['out'])
+            for i in range(size)]
+
+    simulation = Simulation()
+    simulation.add_submodel('macro', macro)
+    simulation.add_ensemble('ensemble', micros)
+    simulation.set_configuration('macro', make_configuration(1.0, float(steps)))
+    simulation.set_configuration('ensemble', make_configuration(1.0, float(MICRO_STEPS)))
+    simulation.add_conduit('macro', 'to_ensemble', 'ensemble', 'in')
+    simulation.add_conduit('ensemble', 'out', 'macro', 'from_ensemble')
+    return simulation, [macro] + micros[:1]
+
+
+def all_to_all(size: int, steps: int, cost: int, payload_size: int) -> Topology:
+    """size submodels, each sending to every other one every step."""
+    names = ['element{}'.format(i) for i in range(size)]
+    submodels = [SyntheticSubmodel(
+                ['from_{}'.format(other) for other in names if other != name],
+                ['to_{}'.format(other) for other in names if other != name],
+                cost, payload_size)
+            for name in names]
+
+    simulation = Simulation()
+    for name, submodel in zip(names, submodels):
+        simulation.add_submodel(name, submodel)
+        simulation.set_configuration(name, make_configuration(1.0, float(steps)))
+    for sender in names:
+        for receiver in names:
+            if sender != receiver:
+                simulation.add_conduit(
+                        sender, 'to_{}'.format(receiver),
+                        receiver, 'from_{}'.format(sender))
+    return simulation, submodels
+
+
+TOPOLOGIES = {
+        'macro_micro': macro_micro,
+        'chain': chain,
+        'fan_out_ensemble': fan_out_ensemble,
+        'all_to_all': all_to_all,
+        }
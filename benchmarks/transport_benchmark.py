@@ -0,0 +1,90 @@
+"""Compares message throughput of the parallel engine's transports.
+
+A producer sends a NumPy array to a consumer every step, both running
+in their own worker process. We measure the number of payload bytes
+delivered per second for a range of payload sizes, once with the
+default PickleTransport and once with the SharedMemoryTransport.
+
+Usage: python benchmarks/transport_benchmark.py
+"""
+from synthetic import make_configuration, make_element
+
+from littlemuscle.model import Conduit
+from littlemuscle.model_execution_graph import ModelExecutionGraph
+from littlemuscle.operator import Operator
+from littlemuscle.parallel_engine import run_simulation_parallel
+from littlemuscle.shared_memory_transport import SharedMemoryTransport
+from littlemuscle.submodel import SubmodelDescription, TimeDrivenSubmodel
+from littlemuscle.transport import PickleTransport
+
+import numpy as np
+from time import perf_counter
+
+
+NUM_STEPS = 20
+
+
+class ArrayProducer(TimeDrivenSubmodel):
+    def __init__(self, payload_size: int) -> None:
+        self.payload_size = payload_size
+
+    def describe(self):
+        description = SubmodelDescription(1)
+        description.add_endpoint(Operator.O_I, 'out')
+        return description
+
+    def initialise_state(self, configuration, initial_time, input_messages):
+        self.state = np.ones(self.payload_size // 8)
+
+    def solve(self, time, input_messages):
+        pass
+
+    def update_boundary_conditions(self, time, input_messages):
+        pass
+
+    def has_converged(self):
+        return False
+
+    def observe_intermediate_state(self):
+        return {'out': self.state}
+
+    def observe_final_state(self):
+        return {}
+
+
+class ArrayConsumer(ArrayProducer):
+    def describe(self):
+        description = SubmodelDescription(1)
+        description.add_endpoint(Operator.S, 'in')
+        return description
+
+    def solve(self, time, input_messages):
+        self.total = input_messages['in'].data[-1]
+
+    def observe_intermediate_state(self):
+        return {}
+
+
+def time_run(payload_size, transport):
+    producer = make_element('producer', ArrayProducer(payload_size))
+    consumer = make_element('consumer', ArrayConsumer(0))
+    conduit = Conduit('producer', producer.endpoints[0], 'consumer', consumer.endpoints[0])
+    graph = ModelExecutionGraph([producer, consumer], [conduit])
+
+    configuration = make_configuration(1.0, float(NUM_STEPS))
+    configurations = {'producer': configuration, 'consumer': configuration}
+
+    start = perf_counter()
+    run_simulation_parallel(graph, configurations, transport)
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    print('{:>12} {:>20} {:>20}'.format(
+        'payload [B]', 'pickle [MB/s]', 'shared mem [MB/s]'))
+    for payload_size in [1 << 10, 1 << 16, 1 << 20, 1 << 24, 1 << 27]:
+        pickled = time_run(payload_size, PickleTransport())
+        shared = time_run(payload_size, SharedMemoryTransport(min_size=1 << 16))
+        megabytes = NUM_STEPS * payload_size / 1e6
+        print('{:>12} {:>20.1f} {:>20.1f}'.format(
+            payload_size, megabytes / pickled, megabytes / shared))
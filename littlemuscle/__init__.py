@@ -1,16 +1,38 @@
+from .checkpoint import Checkpointer
 from .configuration import Configuration
-from .message import Message
+from .interpolation import Interpolation
+from .mapper import Mapper, MapperDescription
+from .memoization import ResultCache
+from .message import Lazy, Message
+from .profiler import Profiler
+from .recording import Recorder
 from .scale import Scale
 from .simulation import Simulation
-from .submodel import SubmodelDescription, TimeDrivenSubmodel, Operator
+from .sink import Sink, read_sink
+from .sweep import run_sweep
+from .submodel import (
+        BatchedTimeDrivenSubmodel, SubmodelDescription, TimeDrivenSubmodel,
+        Operator)
 
 
 __all__ = [
+        'BatchedTimeDrivenSubmodel',
+        'Checkpointer',
         'Configuration',
+        'Interpolation',
+        'Lazy',
+        'Mapper',
+        'MapperDescription',
         'Message',
         'Operator',
+        'Profiler',
+        'Recorder',
+        'ResultCache',
         'Scale',
         'Simulation',
+        'Sink',
         'SubmodelDescription',
         'TimeDrivenSubmodel',
+        'read_sink',
+        'run_sweep',
         ]
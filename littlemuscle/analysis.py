@@ -0,0 +1,240 @@
+from .configuration import Configuration
+from .model_execution_graph import ModelExecutionGraph, ModelNode, STATE_SLOT
+from .operator import Operator
+from .time_driven_adapter import TimeDrivenAdapter
+
+from typing import Dict, List, Set, Tuple
+
+
+# senders and their sending endpoints, by receiving node and slot
+Sources = Dict[Tuple[ModelNode, int], List[Tuple[ModelNode, str]]]
+
+
+def check_graph(graph: ModelExecutionGraph) -> List[str]:
+    """Finds operators that can never run, without running anything.
+
+    An operator can never run if one of its receiving endpoints is not
+    connected, or connected to an operator that can never run itself,
+    e.g. because two elements wait for each other.
+
+    Returns:
+        A description of each problem found.
+    """
+    return _find_unrunnable(graph, _find_sources(graph))
+
+
+def check_message_counts(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration]
+        ) -> List[str]:
+    """Finds receiving endpoints that may be sent too few messages.
+
+    These are endpoints that, according to the time scales in the
+    configurations, will be sent fewer messages than they consume, so
+    that the receiver will wait forever unless it converges early,
+    which is only known while running. This is only checked where the
+    number of messages is known beforehand, e.g. for
+    TimeDrivenSubmodels with fixed steps, and only if check_graph()
+    found nothing.
+
+    Returns:
+        A description of each mismatch found.
+    """
+    sources = _find_sources(graph)
+    if _find_unrunnable(graph, sources):
+        return []
+    return _find_starved(graph, configurations, sources)
+
+
+def find_waiting_nodes(graph: ModelExecutionGraph) -> Tuple[
+        Dict[ModelNode, List[str]], Dict[ModelNode, List[str]]]:
+    """Finds the nodes that were left waiting at the end of a run.
+
+    These are nodes that received some, but not all, of the messages
+    they need to run. They are split into nodes that hold the state of
+    an element that did not finish its run, which stopped the run
+    early, and nodes that were only sent more messages than they used,
+    e.g. by a sender that ran longer than its receiver. An F_INIT that
+    only holds the state of its finished element, ready for another run
+    that never came, is not waiting.
+
+    Returns:
+        The nodes of unfinished elements, and the other waiting nodes,
+        each with the names of the endpoints it is still waiting for.
+        The state slot is called ''.
+    """
+    unfinished = {}     # type: Dict[ModelNode, List[str]]
+    leftover = {}       # type: Dict[ModelNode, List[str]]
+    for node in graph.nodes():
+        if node.num_missing == 0 or node.num_missing == len(node.endpoint_names):
+            continue
+        messages = node.peek_messages()
+        state = messages[STATE_SLOT] if node.operator != Operator.M else None
+        # the state an F_INIT gets after O_F says the element will repeat
+        finished = node.operator == Operator.F_INIT and state is not None and state.data
+        if finished and node.num_missing == len(messages) - 1:
+            continue
+        missing = [name for name, message in zip(node.endpoint_names, messages)
+                if message is None]
+        if state is not None and not finished:
+            unfinished[node] = missing
+        else:
+            leftover[node] = missing
+    return unfinished, leftover
+
+
+def describe_waiting_nodes(waiting: Dict[ModelNode, List[str]]) -> str:
+    """Describes nodes found by find_waiting_nodes() for a message."""
+    return ', '.join('{} for {}'.format(node_name(node), ', '.join(
+        endpoint or 'its state' for endpoint in endpoints))
+        for node, endpoints in waiting.items())
+
+
+def node_name(node: ModelNode) -> str:
+    return '{}.{}'.format(node.element_name, node.operator.value)
+
+
+def _find_sources(graph: ModelExecutionGraph) -> Sources:
+    sources = {}    # type: Sources
+    for node in graph.nodes():
+        for endpoint, receiver in node.routes.items():
+            sources.setdefault(receiver, []).append((node, endpoint))
+        for endpoint, taps in (node.taps or {}).items():
+            for receiver in taps:
+                sources.setdefault(receiver, []).append((node, endpoint))
+    return sources
+
+
+def _find_unrunnable(graph: ModelExecutionGraph, sources: Sources) -> List[str]:
+    """Finds operators that can never run.
+
+    An operator can run once all its slots can be filled. Starting from
+    the state messages that F_INITs get at the start of a run, this
+    marks operators as runnable until nothing changes.
+    """
+    runnable = set()    # type: Set[ModelNode]
+    changed = True
+    while changed:
+        changed = False
+        for node in graph.nodes():
+            if node in runnable:
+                continue
+            if all(_can_fill(node, slot, sources, runnable)
+                    for slot in range(len(node.endpoint_names))):
+                runnable.add(node)
+                changed = True
+
+    problems = []
+    for node in graph.nodes():
+        if node in runnable:
+            continue
+        for slot, endpoint in enumerate(node.endpoint_names):
+            if endpoint == '' or _can_fill(node, slot, sources, runnable):
+                continue
+            if (node, slot) not in sources:
+                problems.append('{} can never run, as nothing is connected to {}'.format(
+                    node_name(node), endpoint))
+            else:
+                sender, sending_endpoint = sources[(node, slot)][0]
+                problems.append(('{} can never run, as {} waits for {}.{}, which can'
+                    ' never run').format(
+                        node_name(node), endpoint, sender.element_name, sending_endpoint))
+    return problems
+
+
+def _can_fill(node: ModelNode, slot: int, sources: Sources, runnable: Set[ModelNode]) -> bool:
+    if node.operator == Operator.F_INIT and slot == STATE_SLOT:
+        return True
+    return any(sender in runnable for sender, _ in sources.get((node, slot), []))
+
+
+def _find_starved(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration],
+        sources: Sources
+        ) -> List[str]:
+    """Finds endpoints that will receive fewer messages than needed."""
+    counts = _count_executions(graph, configurations, sources)
+
+    problems = []
+    for (receiver, slot), senders in sorted(
+            sources.items(), key=lambda item: (item[0][0].index, item[0][1])):
+        if slot == STATE_SLOT and receiver.operator != Operator.M:
+            continue
+        if receiver.adapters is not None and receiver.adapters[slot] is not None:
+            # served at every event of the receiver
+            continue
+        sender, endpoint = senders[0]
+        sent = counts.get(sender)
+        received = counts.get(receiver)
+        if sent is not None and received is not None and sent < received:
+            problems.append(('{} runs {} times, but {}.{} sends only {} messages to its'
+                ' endpoint {}').format(
+                    node_name(receiver), received, sender.element_name, endpoint, sent,
+                    receiver.endpoint_names[slot]))
+    return problems
+
+
+def _count_executions(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration],
+        sources: Sources
+        ) -> Dict[ModelNode, int]:
+    """Returns how often nodes will run, for those where that is known.
+
+    Elements that receive nothing in F_INIT run once, and a time-driven
+    submodel with fixed steps runs O_I, S and B once per step. Elements
+    that receive in F_INIT run once per message, and mappers run as
+    often as the least frequent of their inputs arrives.
+    """
+    counts = {}     # type: Dict[ModelNode, int]
+    elements = {}   # type: Dict[str, List[ModelNode]]
+    for node in graph.nodes():
+        elements.setdefault(node.element_name, []).append(node)
+
+    changed = True
+    while changed:
+        changed = False
+        for element_nodes in elements.values():
+            for node, count in _count_element(element_nodes, configurations, sources, counts):
+                if counts.get(node) != count:
+                    counts[node] = count
+                    changed = True
+    return counts
+
+
+def _count_element(
+        nodes: List[ModelNode],
+        configurations: Dict[str, Configuration],
+        sources: Sources,
+        counts: Dict[ModelNode, int]
+        ) -> List[Tuple[ModelNode, int]]:
+
+    def input_count(node: ModelNode, first_slot: int) -> int:
+        inputs = [counts.get(sources[(node, slot)][0][0]) if (node, slot) in sources else None
+                for slot in range(first_slot, len(node.endpoint_names))]
+        if not inputs or None in inputs:
+            return None
+        return min(inputs)
+
+    if nodes[0].operator == Operator.M:
+        count = input_count(nodes[0], 0)
+        return [] if count is None else [(nodes[0], count)]
+
+    by_operator = {node.operator: node for node in nodes}
+    f_init = by_operator[Operator.F_INIT]
+    if len(f_init.endpoint_names) == 1:
+        runs = 1
+    else:
+        runs = input_count(f_init, 1)
+    if runs is None:
+        return []
+
+    result = [(f_init, runs), (by_operator[Operator.O_F], runs)]
+    implementation = f_init.implementation
+    if runs == 1 and isinstance(implementation, TimeDrivenAdapter):
+        steps = implementation.num_steps(configurations.get(f_init.element_name))
+        if steps is not None:
+            for operator in (Operator.O_I, Operator.S, Operator.B):
+                result.append((by_operator[operator], steps))
+    return result
@@ -0,0 +1,116 @@
+from .configuration import Configuration
+from .mapper import Mapper
+from .model_execution_graph import Inbox, ModelExecutionGraph, ModelNode
+from .operator import Operator
+from .simulation_engine import (
+        Outbox, ReadyQueue, _deliver_messages, _finish_b, _finish_f_init, _finish_m,
+        _finish_o_f, _finish_o_i, _finish_s, _next_node, _start_b, _start_f_init, _start_m,
+        _start_o_f, _start_o_i, _start_s, _start_simulation)
+from .submodel import Submodel
+from .time_driven_adapter import _is_awaitable
+
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Set, Tuple, Union
+
+
+def run_simulation_async(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration]
+        ) -> None:
+    """Run a simulation, overlapping operators that wait.
+
+    Runs simulate_async() in a new event loop. See there.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(simulate_async(graph, configurations))
+    finally:
+        loop.close()
+
+
+async def simulate_async(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration]
+        ) -> None:
+    """Run a simulation as a coroutine.
+
+    Submodel and mapper methods may be coroutine functions (async def),
+    e.g. for submodels that read data from files or wait for an external
+    solver. A TimeDrivenSubmodel may have async methods as well, the
+    TimeDrivenAdapter passes them through. Synchronous methods are
+    called as usual.
+
+    Runnable operators are started as tasks, so that the waits of async
+    ones overlap. Their results are delivered in the order in which
+    run_simulation() would have run them, and an operator is only
+    started early if none of the operators before it in the ready queue
+    can send it a message. Each operator therefore receives exactly the
+    same messages as with run_simulation(), and the results are the
+    same.
+    """
+    receivers = {node: {receiver for receiver, _ in node.routes.values()}
+            for node in graph.nodes()}     # type: Dict[ModelNode, Set[ModelNode]]
+    for node in graph.nodes():
+        for taps in (node.taps or {}).values():
+            receivers[node].update(receiver for receiver, _ in taps)
+
+    ready = _start_simulation(graph)
+    blocked = deque()   # type: ReadyQueue
+    running = deque()   # type: Deque[Tuple[ModelNode, asyncio.Future]]
+    try:
+        while ready or blocked or running:
+            while ready or blocked:
+                head = blocked[0] if blocked else ready[0]
+                if any(head in receivers[node] for node, _ in running):
+                    break
+                if head.num_blocking and running:
+                    # the node to run next depends on the running ones
+                    break
+                node = _next_node(graph, ready, blocked)
+                task = asyncio.ensure_future(_run_operator_async(
+                        node.operator, node.implementation,
+                        configurations.get(node.element_name), node.take_messages()))
+                running.append((node, task))
+
+            node, task = running.popleft()
+            _deliver_messages(graph, node, await task, ready)
+
+    finally:
+        for _, task in running:
+            task.cancel()
+
+
+async def _result(value: Any) -> Any:
+    """Awaits value if it is awaitable, and returns the result."""
+    if _is_awaitable(value):
+        return await value
+    return value
+
+
+async def _run_operator_async(
+        operator: Operator,
+        implementation: Union[Submodel, Mapper],
+        configuration: Configuration,
+        received_messages: Inbox
+        ) -> Outbox:
+    """Like _run_operator(), but awaits async implementation methods."""
+
+    if operator == Operator.F_INIT:
+        events, result = _start_f_init(configuration, received_messages, implementation)
+        return _finish_f_init(events, await _result(result))
+    elif operator == Operator.O_I:
+        events, result = _start_o_i(received_messages, implementation)
+        return _finish_o_i(events, await _result(result))
+    elif operator == Operator.S:
+        events, result = _start_s(received_messages, implementation)
+        return _finish_s(events, await _result(result))
+    elif operator == Operator.B:
+        events, result = _start_b(received_messages, implementation)
+        return _finish_b(events, await _result(result))
+    elif operator == Operator.O_F:
+        events, result = _start_o_f(received_messages, implementation)
+        return _finish_o_f(events, await _result(result))
+    elif operator == Operator.M:
+        events, result = _start_m(received_messages, implementation)
+        return _finish_m(events, await _result(result))
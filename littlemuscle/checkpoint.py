@@ -0,0 +1,242 @@
+from .message import Message
+from .model_execution_graph import ModelExecutionGraph, ModelNode
+from .operator import Operator
+
+from collections import deque
+import os
+from time import monotonic
+from typing import Any, Deque, Dict, List, Tuple
+
+# hashlib, pickle and zlib are slow to import and only needed when
+# checkpointing, so they are imported where they are used
+
+
+NodeKey = Tuple[str, str]
+
+_MANIFEST_PREFIX = 'checkpoint-'
+_MANIFEST_SUFFIX = '.pickle'
+
+
+class Checkpointer:
+    """Periodically saves the complete state of a running simulation.
+
+    A checkpoint contains the messages waiting in the inbox of every
+    ModelNode, including the state messages carrying the current and
+    next event of each submodel, the order in which runnable nodes are
+    queued, and the state of every submodel as returned by its
+    save_state() method. Passing a checkpoint to run_simulation() or
+    Simulation.run() as resume_from continues the run from that point.
+
+    Checkpoints are stored in a directory, as a small manifest file per
+    checkpoint plus a store of blobs, one per submodel state and one for
+    the messages. Blobs are named by the hash of their contents, so
+    state that has not changed since the previous checkpoint is not
+    written again. Blobs are zlib-compressed unless compression is 0.
+
+    Args:
+        directory: Directory to write checkpoints to.
+        simulated_interval: Write a checkpoint every time simulated time
+            has advanced by this much.
+        wall_interval: Write a checkpoint every time this many seconds
+            of wall clock time have passed.
+        compression: zlib compression level, 0 to disable.
+        keep: Number of most recent checkpoints to keep.
+    """
+    def __init__(self,
+            directory: str,
+            simulated_interval: float = None,
+            wall_interval: float = None,
+            compression: int = 1,
+            keep: int = 2
+            ) -> None:
+
+        self.directory = directory
+        self.simulated_interval = simulated_interval
+        self.wall_interval = wall_interval
+        self.compression = compression
+        self.keep = keep
+
+        self.__next_simulated_time = simulated_interval
+        self.__next_wall_time = None    # type: float
+        self.__count = 0
+
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+
+
+    def start(self, simulated_time: float) -> None:
+        """Sets the intervals to count from the given start time."""
+        if self.simulated_interval is not None:
+            self.__next_simulated_time = simulated_time + self.simulated_interval
+        if self.wall_interval is not None:
+            self.__next_wall_time = monotonic() + self.wall_interval
+        existing = _list_manifests(self.directory)
+        if existing:
+            self.__count = _manifest_number(existing[-1])
+
+
+    def is_due(self, simulated_time: float) -> bool:
+        if self.__next_simulated_time is not None:
+            if simulated_time >= self.__next_simulated_time:
+                return True
+        if self.__next_wall_time is not None:
+            if monotonic() >= self.__next_wall_time:
+                return True
+        return False
+
+
+    def write(self,
+            graph: ModelExecutionGraph,
+            ready: Deque[ModelNode],
+            simulated_time: float
+            ) -> str:
+        """Writes a checkpoint and returns the path of its manifest."""
+        inboxes = {_node_key(node): node.buffered_messages() for node in graph.nodes()}
+        states = {node.element_name: self.__write_blob(node.implementation.save_state())
+                for node in graph.nodes() if node.operator == Operator.F_INIT}
+
+        manifest = {
+                'simulated_time': simulated_time,
+                'ready': [_node_key(node) for node in ready],
+                'inboxes': self.__write_blob(inboxes),
+                'states': states,
+                'finished': [(_node_key(node), slot)
+                    for node in graph.nodes() for slot in node.finished_slots()],
+                }
+
+        import pickle
+        self.__count += 1
+        path = os.path.join(self.directory, '{}{:06d}{}'.format(
+            _MANIFEST_PREFIX, self.__count, _MANIFEST_SUFFIX))
+        _write_atomically(path, pickle.dumps(manifest, pickle.HIGHEST_PROTOCOL))
+
+        if self.simulated_interval is not None:
+            while self.__next_simulated_time <= simulated_time:
+                self.__next_simulated_time += self.simulated_interval
+        if self.wall_interval is not None:
+            self.__next_wall_time = monotonic() + self.wall_interval
+
+        self.__remove_old_checkpoints()
+        return path
+
+
+    def __write_blob(self, obj: Any) -> str:
+        from hashlib import sha256
+        import pickle
+        import zlib
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        name = sha256(data).hexdigest()
+        path = os.path.join(self.directory, 'blobs', name)
+        if not os.path.exists(path):
+            if self.compression:
+                data = b'Z' + zlib.compress(data, self.compression)
+            else:
+                data = b'P' + data
+            _write_atomically(path, data)
+        return name
+
+
+    def __remove_old_checkpoints(self) -> None:
+        manifests = _list_manifests(self.directory)
+        if len(manifests) <= self.keep:
+            return
+
+        for path in manifests[:-self.keep]:
+            os.remove(path)
+
+        in_use = set()
+        for path in manifests[-self.keep:]:
+            manifest = _read_manifest(path)
+            in_use.add(manifest['inboxes'])
+            in_use.update(manifest['states'].values())
+
+        blob_dir = os.path.join(self.directory, 'blobs')
+        for name in os.listdir(blob_dir):
+            if name not in in_use:
+                os.remove(os.path.join(blob_dir, name))
+
+
+def latest_checkpoint(directory: str) -> str:
+    """Returns the path of the most recent checkpoint in directory."""
+    manifests = _list_manifests(directory)
+    if not manifests:
+        raise RuntimeError('No checkpoints found in {}'.format(directory))
+    return manifests[-1]
+
+
+def load_checkpoint(graph: ModelExecutionGraph, path: str) -> Tuple[Deque[ModelNode], float]:
+    """Restores a checkpoint into a freshly built graph.
+
+    Restores the submodel states and node inboxes, and returns the queue
+    of runnable nodes and the simulated time at the checkpoint.
+
+    Args:
+        graph: The execution graph of the same model that was
+            checkpointed.
+        path: A checkpoint manifest, or a directory of checkpoints, in
+            which case the most recent one is used.
+    """
+    if os.path.isdir(path):
+        path = latest_checkpoint(path)
+    directory = os.path.dirname(path)
+    manifest = _read_manifest(path)
+
+    nodes = {_node_key(node): node for node in graph.nodes()}
+    inboxes = _read_blob(directory, manifest['inboxes'])
+    if set(inboxes) != set(nodes):
+        raise RuntimeError('Checkpoint {} does not match the model being run'.format(path))
+
+    for key, node in nodes.items():
+        if node.operator == Operator.F_INIT:
+            state = _read_blob(directory, manifest['states'][node.element_name])
+            node.implementation.load_state(state)
+        for slot, messages in enumerate(inboxes[key]):
+            if not isinstance(messages, list):
+                # one message or None, as written by earlier versions
+                messages = [] if messages is None else [messages]
+            for message in messages:
+                node.post_message(slot, message)
+    for key, slot in manifest.get('finished', []):
+        nodes[key].finish_sending(slot)
+
+    ready = deque(nodes[key] for key in manifest['ready'])
+    return ready, manifest['simulated_time']
+
+
+def _node_key(node: ModelNode) -> NodeKey:
+    return node.element_name, node.operator.value
+
+
+def _list_manifests(directory: str) -> List[str]:
+    names = sorted(name for name in os.listdir(directory)
+            if name.startswith(_MANIFEST_PREFIX) and name.endswith(_MANIFEST_SUFFIX))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _manifest_number(path: str) -> int:
+    name = os.path.basename(path)
+    return int(name[len(_MANIFEST_PREFIX):-len(_MANIFEST_SUFFIX)])
+
+
+def _read_manifest(path: str) -> Dict[str, Any]:
+    import pickle
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _read_blob(directory: str, name: str) -> Any:
+    import pickle
+    import zlib
+    with open(os.path.join(directory, 'blobs', name), 'rb') as f:
+        data = f.read()
+    if data[:1] == b'Z':
+        return pickle.loads(zlib.decompress(data[1:]))
+    return pickle.loads(data[1:])
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
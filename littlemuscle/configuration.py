@@ -45,4 +45,4 @@ def _merge_parameters(
     for key in overriding_dict:
         merged_dict[key] = overriding_dict[key]
 
-    return new_dict
+    return merged_dict
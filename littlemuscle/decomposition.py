@@ -0,0 +1,200 @@
+"""Spatial domain decomposition of submodels.
+
+A DecomposedSubmodel runs a submodel as several subdomains, each a
+compute element of its own, so that with Simulation.run(parallel=True)
+each subdomain runs in a separate process.
+
+This module requires NumPy, and is not imported by littlemuscle itself.
+"""
+from .configuration import Configuration
+from .message import Message
+from .numpy_mappers import Gather, Scatter
+from .operator import Operator
+from .scale import Scale
+from .simulation import Simulation
+from .submodel import SubmodelDescription, TimeDrivenSubmodel
+
+from overrides import overrides
+from typing import Any, Dict, List
+
+
+LOWER_BOUNDARY = 'lower_boundary'
+UPPER_BOUNDARY = 'upper_boundary'
+LOWER_HALO = 'lower_halo'
+UPPER_HALO = 'upper_halo'
+
+
+class DecomposedSubmodel(Simulation):
+    """A submodel split into subdomains along its first spatial axis.
+
+    Each subdomain is a TimeDrivenSubmodel that covers a part of the
+    domain, and exchanges halos with its neighbours: in O_I it observes
+    the cells along its lower and upper edge as 'lower_boundary' and
+    'upper_boundary', and in S it receives those of its neighbours as
+    'lower_halo' and 'upper_halo'. These endpoints are added to its
+    description and connected automatically, and are left out at the
+    ends of the domain, where there is no neighbour.
+
+    The other endpoints are those of the undecomposed submodel, as
+    described by the subdomains, and are available to connect to when
+    this is added to a Simulation with add_simulation(). Array data
+    received on them is split along its first axis, with one part for
+    each subdomain, other data is sent to each subdomain as is.
+    Observations are joined along the first axis if they are arrays or
+    sequences, and sent as a list with one item per subdomain otherwise.
+
+    The configuration is that of the whole domain. Each subdomain gets
+    a copy with the extent of the first space scale reduced to its part
+    of the cells, and parameters 'subdomain', 'num_subdomains' and
+    'subdomain_offset', the latter being the position of its lower edge.
+    Cells are divided like numpy.array_split() divides array items, so
+    arrays with a row per cell are split into matching parts.
+
+    Args:
+        subdomains: One submodel per subdomain, in order along the axis.
+        configuration: Configuration of the whole domain.
+    """
+    def __init__(self,
+            subdomains: List[TimeDrivenSubmodel],
+            configuration: Configuration
+            ) -> None:
+        super().__init__()
+
+        if len(subdomains) == 0:
+            raise ValueError('A decomposed submodel needs at least one subdomain')
+        description = subdomains[0].describe()
+        if description.num_spatial_dimensions < 1:
+            raise ValueError('Only submodels with a spatial domain can be decomposed')
+        for endpoint in description.endpoints:
+            if endpoint.name in (LOWER_BOUNDARY, UPPER_BOUNDARY, LOWER_HALO, UPPER_HALO):
+                raise ValueError('Endpoint name {} is reserved for halo exchange'.format(
+                    endpoint.name))
+
+        num_subdomains = len(subdomains)
+        names = ['subdomain{}'.format(i) for i in range(num_subdomains)]
+        for i, subdomain in enumerate(subdomains):
+            self.add_submodel(names[i], _Subdomain(
+                subdomain, lower=i > 0, upper=i < num_subdomains - 1))
+
+        for lower, upper in zip(names, names[1:]):
+            self.add_conduit(lower, UPPER_BOUNDARY, upper, LOWER_HALO)
+            self.add_conduit(upper, LOWER_BOUNDARY, lower, UPPER_HALO)
+
+        for endpoint in description.endpoints:
+            if endpoint.operator.may_receive():
+                scatter = 'scatter_{}'.format(endpoint.name)
+                self.add_mapper(scatter, Scatter(
+                        ['out{}'.format(i) for i in range(num_subdomains)]))
+                for i, name in enumerate(names):
+                    self.add_conduit(scatter, 'out{}'.format(i), name, endpoint.name)
+                self.export_endpoint(endpoint.name, scatter, 'in')
+            else:
+                gather = 'gather_{}'.format(endpoint.name)
+                self.add_mapper(gather, Gather(
+                        ['in{}'.format(i) for i in range(num_subdomains)]))
+                for i, name in enumerate(names):
+                    self.add_conduit(name, endpoint.name, gather, 'in{}'.format(i))
+                self.export_endpoint(endpoint.name, gather, 'out')
+
+        for name, subdomain_configuration in zip(
+                names, _split_configuration(configuration, num_subdomains)):
+            self.set_configuration(name, subdomain_configuration)
+
+
+def _split_configuration(configuration: Configuration, num_parts: int) -> List[Configuration]:
+    if not configuration.space_scales:
+        raise ValueError('The configuration of a decomposed submodel needs a space scale')
+    scale = configuration.space_scales[0]
+    num_cells = int(round(scale.extent / scale.grain))
+    if num_cells < num_parts:
+        raise ValueError('Cannot split {} cells into {} subdomains'.format(
+            num_cells, num_parts))
+
+    configurations = []
+    start = 0
+    for i in range(num_parts):
+        size = num_cells // num_parts + (1 if i < num_cells % num_parts else 0)
+        part = Configuration()
+        part.time_scale = configuration.time_scale
+        part.space_scales = [Scale(scale.grain, size * scale.grain)] + \
+                configuration.space_scales[1:]
+        part.parameters = dict(configuration.parameters)
+        part.parameters['subdomain'] = i
+        part.parameters['num_subdomains'] = num_parts
+        part.parameters['subdomain_offset'] = start * scale.grain
+        configurations.append(part)
+        start += size
+    return configurations
+
+
+class _Subdomain(TimeDrivenSubmodel):
+    """Adds the halo exchange endpoints to a subdomain's submodel."""
+    def __init__(self, submodel: TimeDrivenSubmodel, lower: bool, upper: bool) -> None:
+        self.__submodel = submodel
+
+        self.__description = SubmodelDescription(submodel.describe().num_spatial_dimensions)
+        for endpoint in submodel.describe().endpoints:
+            self.__description.add_endpoint(endpoint.operator, endpoint.name)
+        if lower:
+            self.__description.add_endpoint(Operator.O_I, LOWER_BOUNDARY)
+            self.__description.add_endpoint(Operator.S, LOWER_HALO)
+        if upper:
+            self.__description.add_endpoint(Operator.O_I, UPPER_BOUNDARY)
+            self.__description.add_endpoint(Operator.S, UPPER_HALO)
+        self.__sends = {endpoint.name for endpoint in self.__description.endpoints
+                if endpoint.operator == Operator.O_I}
+
+        # keep the submodel's own step size choice visible to the adapter
+        if type(submodel).propose_step is not TimeDrivenSubmodel.propose_step:
+            self.propose_step = submodel.propose_step
+
+
+    @overrides
+    def describe(self) -> SubmodelDescription:
+        return self.__description
+
+
+    @overrides
+    def initialise_state(self,
+            configuration: Configuration,
+            initial_time: float,
+            input_messages: Dict[str, Message]
+            ) -> None:
+        return self.__submodel.initialise_state(configuration, initial_time, input_messages)
+
+
+    @overrides
+    def solve(self, time: float, input_messages: Dict[str, Message]) -> None:
+        return self.__submodel.solve(time, input_messages)
+
+
+    @overrides
+    def update_boundary_conditions(self,
+            time: float, input_messages: Dict[str, Message]) -> None:
+        return self.__submodel.update_boundary_conditions(time, input_messages)
+
+
+    @overrides
+    def has_converged(self) -> bool:
+        return self.__submodel.has_converged()
+
+
+    @overrides
+    def observe_intermediate_state(self) -> Dict[str, Any]:
+        observation = self.__submodel.observe_intermediate_state()
+        return {name: data for name, data in observation.items() if name in self.__sends}
+
+
+    @overrides
+    def observe_final_state(self) -> Dict[str, Any]:
+        return self.__submodel.observe_final_state()
+
+
+    @overrides
+    def save_state(self) -> Any:
+        return self.__submodel.save_state()
+
+
+    @overrides
+    def load_state(self, state: Any) -> None:
+        self.__submodel.load_state(state)
@@ -0,0 +1,247 @@
+from .configuration import Configuration
+from .message import Message
+from .submodel import Submodel, SubmodelDescription
+
+from overrides import overrides
+from traceback import format_exc
+from typing import Any, Callable, Dict, List, Mapping, Tuple, TYPE_CHECKING
+import weakref
+
+if TYPE_CHECKING:
+    from multiprocessing import Process
+    from multiprocessing.connection import Connection
+
+
+class Ensemble(Submodel):
+    """Runs several instances of a submodel as a single compute element.
+
+    Messages sent to an ensemble must have as data a sequence with one
+    item per instance, e.g. a list or an array with the instances along
+    the first axis. Item i is passed to instance i (scatter). Messages
+    sent by the ensemble have as data a list with, for each instance,
+    the data that instance sent (gather).
+
+    All instances must step through the same events. An instance that
+    finishes (e.g. because it converged) is no longer solved, but its
+    final observation is still sent along, until all instances have
+    finished.
+
+    With num_processes > 1, the instances are divided over that many
+    worker processes, which then run concurrently. Submodels and message
+    data must be picklable in that case.
+    """
+    def __init__(self, instances: List[Submodel], num_processes: int = 1) -> None:
+        if len(instances) == 0:
+            raise ValueError('An ensemble needs at least one instance')
+
+        self.__size = len(instances)
+        self.__description = instances[0].describe()
+        self.__remote = num_processes > 1
+
+        if self.__remote:
+            chunk_size = -(-len(instances) // min(num_processes, len(instances)))
+            self.__bounds = list(range(0, len(instances), chunk_size)) + [len(instances)]
+            self.__members = [
+                    _RemoteEnsemble(Ensemble(instances[start:stop]))
+                    for start, stop in zip(self.__bounds, self.__bounds[1:])]
+        else:
+            self.__bounds = list(range(len(instances) + 1))
+            self.__members = instances
+
+        self.__running = [True] * len(self.__members)
+
+
+    @overrides
+    def describe(self) -> SubmodelDescription:
+        return self.__description
+
+
+    @overrides
+    def initialise_state(self,
+            configuration: Configuration,
+            initial_event: float,
+            input_messages: Dict[str, Message]
+            ) -> float:
+
+        self.__running = [True] * len(self.__members)
+        next_events = self.__call_members('initialise_state', lambda i: (
+                configuration, initial_event, self.__scatter(input_messages, i)))
+        return self.__combine(next_events)
+
+
+    @overrides
+    def solve(self,
+            event: float,
+            input_messages: Dict[str, Message]) -> float:
+
+        next_events = self.__call_members('solve', lambda i: (
+                event, self.__scatter(input_messages, i)), self.__running)
+        return self.__combine(next_events, False)
+
+
+    @overrides
+    def update_boundary_conditions(self,
+            event: float, next_event: float,
+            input_messages: Dict[str, Message]) -> float:
+
+        next_events = self.__call_members('update_boundary_conditions', lambda i: (
+                event, next_event, self.__scatter(input_messages, i)), self.__running)
+        return self.__combine(next_events)
+
+
+    @overrides
+    def observe_intermediate_state(self) -> Dict[str, Any]:
+        return self.__gather(self.__call_members('observe_intermediate_state', lambda i: ()))
+
+
+    @overrides
+    def observe_final_state(self) -> Dict[str, Any]:
+        return self.__gather(self.__call_members('observe_final_state', lambda i: ()))
+
+
+    @overrides
+    def save_state(self) -> Any:
+        return {
+                'running': self.__running,
+                'members': self.__call_members('save_state', lambda i: ())
+                }
+
+
+    @overrides
+    def load_state(self, state: Any) -> None:
+        self.__running = state['running']
+        self.__call_members('load_state', lambda i: (state['members'][i],))
+
+
+    def __call_members(self,
+            method: str,
+            make_args: Callable[[int], Tuple],
+            selected: List[bool] = None
+            ) -> List[Any]:
+        """Calls method on the selected members, concurrently if remote.
+
+        Returns the results, with None for members that were not called.
+        """
+        if selected is None:
+            selected = [True] * len(self.__members)
+
+        if not self.__remote:
+            return [getattr(member, method)(*make_args(i)) if selected[i] else None
+                    for i, member in enumerate(self.__members)]
+
+        for i, member in enumerate(self.__members):
+            if selected[i]:
+                member.submit(method, make_args(i))
+        return [member.result() if selected[i] else None
+                for i, member in enumerate(self.__members)]
+
+
+    def __scatter(self, input_messages: Mapping[str, Message], i: int) -> Dict[str, Message]:
+        start, stop = self.__bounds[i], self.__bounds[i + 1]
+        scattered = dict()
+        for name, message in input_messages.items():
+            if len(message.data) != self.__size:
+                raise RuntimeError(
+                        'Ensemble of size {} received {} items on endpoint {}'.format(
+                            self.__size, len(message.data), name))
+            if self.__remote:
+                data = message.data[start:stop]
+            else:
+                data = message.data[start]
+            scattered[name] = Message(message.time, message.next_time, data)
+        return scattered
+
+
+    def __gather(self, observations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        gathered = dict()       # type: Dict[str, List[Any]]
+        for i, observation in enumerate(observations):
+            for name, data in observation.items():
+                if self.__remote:
+                    gathered.setdefault(name, []).extend(data)
+                else:
+                    gathered.setdefault(name, []).append(data)
+        return gathered
+
+
+    def __combine(self, next_events: List[float], update_running: bool = True) -> float:
+        """Combines the members' next events into that of the ensemble.
+
+        Members that return None are done, and if update_running is set,
+        they are not run again until the ensemble is reinitialised.
+        """
+        running_events = {event for event in next_events if event is not None}
+        if len(running_events) > 1:
+            raise RuntimeError(
+                    'Ensemble instances disagree on the next event: {}'.format(
+                        sorted(running_events)))
+
+        if update_running:
+            self.__running = [event is not None for event in next_events]
+
+        if running_events:
+            return running_events.pop()
+        return None
+
+
+class _RemoteEnsemble:
+    """Runs a (part of an) Ensemble in a separate process.
+
+    Ensemble calls Submodel methods on it using submit() and result(),
+    so that several of these can work at the same time. The process is
+    started on first use, so that it is a child of whichever process
+    ends up running the Ensemble.
+    """
+    def __init__(self, ensemble: Ensemble) -> None:
+        self.__ensemble = ensemble
+        self.__connection = None        # type: Connection
+
+
+    def submit(self, method: str, args: Tuple) -> None:
+        """Starts calling method on the ensemble in the worker."""
+        if self.__connection is None:
+            self.__start()
+        self.__connection.send((method, args))
+
+
+    def result(self) -> Any:
+        """Waits for and returns the result of the submitted call."""
+        succeeded, result = self.__connection.recv()
+        if not succeeded:
+            raise RuntimeError('Error in ensemble worker:\n{}'.format(result))
+        return result
+
+
+    def __start(self) -> None:
+        # multiprocessing is slow to import, so only do it here
+        from multiprocessing import Pipe, Process
+        self.__connection, worker_connection = Pipe()
+        process = Process(
+                target=_remote_ensemble_main,
+                args=(worker_connection, self.__ensemble),
+                name='littlemuscle-ensemble',
+                daemon=True)
+        process.start()
+        worker_connection.close()
+        weakref.finalize(self, _stop_remote_ensemble, self.__connection, process)
+
+
+def _remote_ensemble_main(connection: 'Connection', ensemble: Ensemble) -> None:
+    request = connection.recv()
+    while request is not None:
+        method, args = request
+        try:
+            connection.send((True, getattr(ensemble, method)(*args)))
+        except Exception:
+            connection.send((False, format_exc()))
+        request = connection.recv()
+
+
+def _stop_remote_ensemble(connection: 'Connection', process: 'Process') -> None:
+    try:
+        connection.send(None)
+    except (BrokenPipeError, OSError):
+        pass
+    process.join(1.0)
+    if process.is_alive():
+        process.terminate()
+    connection.close()
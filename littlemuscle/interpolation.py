@@ -0,0 +1,161 @@
+from .message import Message
+
+from collections import deque
+from enum import Enum
+from numbers import Number
+from typing import Any, Deque, List
+
+
+class Interpolation(Enum):
+    """How a conduit serves messages at the receiver's events.
+
+    HOLD serves the data of the message whose step contains the event,
+    from its time up to and including its next_time, so that with equal
+    time scales the receiver gets what it would get without adapter.
+    LINEAR interpolates linearly in time between the messages sent
+    before and after the event, for numbers and NumPy arrays, and holds
+    other data.
+    """
+    HOLD = 'hold'
+    LINEAR = 'linear'
+
+
+class TemporalAdapter:
+    """Buffers the messages sent over a conduit, to serve them at the
+    receiver's events.
+
+    Messages are expected in order of time. A message is dropped once
+    an event after its step is served. Before the first message, the
+    data of that message is served, and so is the data of the last one
+    after its step, if its next_time is None or the sender has finished,
+    see finish().
+    """
+    def __init__(self, interpolation: Interpolation, size: int) -> None:
+        """Create a TemporalAdapter.
+
+        Args:
+            interpolation: How to serve data between messages.
+            size: The number of messages that may still be served to
+                keep before the buffer is full, see full().
+        """
+        self.interpolation = interpolation
+        self.finished = False
+        # whether full() was True when the receiver last looked
+        self.blocking = False
+        self.size = size
+        self.__messages = deque()   # type: Deque[Message]
+        # the last event served, and the next one if known
+        self.__event = None         # type: float
+        self.__next_event = None    # type: float
+
+
+    def __len__(self) -> int:
+        return len(self.__messages)
+
+
+    def messages(self) -> List[Message]:
+        """Returns the buffered messages, oldest first."""
+        return list(self.__messages)
+
+
+    def add(self, message: Message) -> None:
+        self.__messages.append(message)
+        self.finished = False
+
+
+    def finish(self) -> None:
+        """Marks the last message added as the last one for now."""
+        self.finished = True
+
+
+    def clear(self) -> None:
+        self.__messages.clear()
+        self.finished = False
+        self.blocking = False
+        self.__event = None
+        self.__next_event = None
+
+
+    def full(self) -> bool:
+        """Whether size messages that may still be served are buffered.
+
+        Events served are increasing, so after serving an event, a
+        message is no longer needed if its step ended at or before it,
+        or before the next event if that is known, and likewise if the
+        next message was sent then. Such messages are dropped when the
+        next event is served, and do not count. Before the first event,
+        it is not known which messages will be needed, and the buffer is
+        never full, so that the sender can run up to that event.
+        """
+        messages = self.__messages
+        if len(messages) < self.size or self.__event is None:
+            return False
+        stale = 0
+        for i, message in enumerate(messages):
+            if message.next_time is not None and self.__is_past(message.next_time):
+                stale += 1
+            elif i + 1 < len(messages) and self.__is_past(messages[i + 1].time):
+                stale += 1
+            else:
+                break
+        return len(messages) - stale >= self.size
+
+
+    def __is_past(self, time: float) -> bool:
+        """Whether time is before any event that may still be served."""
+        next_event = self.__next_event
+        return time <= self.__event or (next_event is not None and time < next_event)
+
+
+    def message_at(self, event: float, next_event: float = None) -> Message:
+        """Returns a message with the data at event.
+
+        Returns None if a message that has not been received yet is
+        needed for that. The message has no next_time, as the data
+        served does not change at a time the receiver could step to.
+
+        Args:
+            event: The event to serve, later than the ones before.
+            next_event: The earliest event that may be served after
+                this one, if it is known, for full().
+        """
+        messages = self.__messages
+        self.__event = event
+        self.__next_event = next_event
+        while len(messages) > 1 and messages[1].time < event:
+            messages.popleft()
+        if messages and not self.finished and messages[0].next_time is not None \
+                and messages[0].next_time < event:
+            # its step is over, the next message is needed
+            messages.popleft()
+        if not messages:
+            return None
+
+        first = messages[0]
+        if first.time >= event or first.next_time is None or first.next_time < event \
+                or self.interpolation == Interpolation.HOLD:
+            return Message(event, None, first.data)
+        if len(messages) < 2:
+            return Message(event, None, first.data) if self.finished else None
+
+        second = messages[1]
+        weight = (event - first.time) / (second.time - first.time)
+        return Message(event, None, _interpolate(first.data, second.data, weight))
+
+
+def _interpolate(first: Any, second: Any, weight: float) -> Any:
+    """Interpolates linearly, or returns first if the data does not
+    support it.
+
+    NumPy arrays are interpolated element-wise, in one vectorised
+    expression, without importing NumPy here. Objects that only describe
+    an array, without the array interface, are held.
+    """
+    if isinstance(first, Number) and isinstance(second, Number) \
+            and not isinstance(first, bool) and not isinstance(second, bool):
+        return first + weight * (second - first)
+    if hasattr(first, '__array__') and hasattr(second, '__array__') \
+            and getattr(first, 'shape', None) == getattr(second, 'shape', 0):
+        if first.dtype.kind in 'iufc' and second.dtype.kind in 'iufc':
+            return first + weight * (second - first)
+    return first
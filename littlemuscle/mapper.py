@@ -0,0 +1,47 @@
+# Describing mappers
+
+from .message import Message
+from .operator import Operator
+from .submodel import Endpoint
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+
+class MapperDescription:
+    def __init__(self) -> None:
+        self.inputs = []                        # type: List[Endpoint]
+        self.outputs = []                       # type: List[Endpoint]
+
+
+    @property
+    def endpoints(self) -> List[Endpoint]:
+        return self.inputs + self.outputs
+
+
+    def add_input(self, name: str) -> None:
+        self.inputs.append(Endpoint(Operator.M, name))
+
+
+    def add_output(self, name: str) -> None:
+        self.outputs.append(Endpoint(Operator.M, name))
+
+
+class Mapper(ABC):
+    """A stateless transformation of data between submodels.
+
+    A mapper runs as a single Operator.M node. It runs whenever a
+    message has arrived on each of its inputs, and sends a message on
+    each of its outputs. Returning the same object on several outputs
+    sends it to several receivers without copying it.
+    """
+
+    @abstractmethod
+    def describe(self) -> MapperDescription:
+        pass
+
+
+    @abstractmethod
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        """Compute the outputs' data from the received messages."""
+        pass
@@ -0,0 +1,242 @@
+from .configuration import Configuration
+from .message import Lazy, Message
+from .operator import Operator
+from .submodel import Submodel, SubmodelDescription
+
+from collections import OrderedDict
+from overrides import overrides
+import os
+from typing import Any, Callable, Dict, Tuple
+
+# hashlib and pickle are slow to import and only needed when caching,
+# so they are imported where they are used
+
+
+# offset of the final event from the initial event, final observation
+CacheEntry = Tuple[float, Dict[str, Any]]
+
+
+class ResultCache:
+    """Remembers the results of runs of a submodel.
+
+    Pass a ResultCache to Simulation.add_submodel() to have the submodel
+    run only for inputs it has not seen before. The cache is keyed on a
+    hash of the Configuration and of the data of the messages received
+    by F_INIT, and stores what the submodel sent from O_F. When the same
+    inputs come in again, the stored results are sent on without running
+    the submodel. The initial event is not part of the key, so this is
+    only correct for submodels whose results do not depend on the time
+    at which they are started.
+
+    Only the most recently used max_entries results are kept in memory.
+    If a directory is given, all results are also written there, and
+    results that are not in memory are looked up on disk, so that they
+    survive eviction and can be reused in later runs.
+
+    Use a separate cache (or directory) for each kind of submodel, as
+    results of different submodels with the same inputs would collide.
+
+    Args:
+        max_entries: Maximum number of results to keep in memory.
+        directory: Directory to store results on disk in, if any.
+        normalise: Function applied to the data of each received
+            message before hashing, e.g. to round values so that inputs
+            that are equal within a tolerance get the same key.
+    """
+    def __init__(self,
+            max_entries: int = 1024,
+            directory: str = None,
+            normalise: Callable[[Any], Any] = None
+            ) -> None:
+
+        self.max_entries = max_entries
+        self.directory = directory
+        self.normalise = normalise
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.__entries = OrderedDict()  # type: OrderedDict[str, CacheEntry]
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+
+    def key(self, configuration: Configuration, input_messages: Dict[str, Message]) -> str:
+        """Returns the key for running with the given inputs."""
+        inputs = []
+        for endpoint in sorted(input_messages):
+            data = input_messages[endpoint].data
+            if self.normalise is not None:
+                data = self.normalise(data)
+            inputs.append((endpoint, data))
+
+        from hashlib import sha256
+        import pickle
+        if configuration is None:
+            configured = None
+        else:
+            configured = (configuration.time_scale, configuration.space_scales,
+                    sorted(configuration.parameters.items()))
+        return sha256(pickle.dumps((configured, inputs), pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+    def get(self, key: str) -> CacheEntry:
+        """Returns the entry for key, or None if there is none."""
+        entry = self.__entries.get(key)
+        if entry is not None:
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if self.directory is not None:
+            path = os.path.join(self.directory, key)
+            if os.path.exists(path):
+                import pickle
+                with open(path, 'rb') as f:
+                    entry = pickle.load(f)
+                self.__insert(key, entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        self.__insert(key, entry)
+        if self.directory is not None:
+            path = os.path.join(self.directory, key)
+            import pickle
+            temp_path = '{}.{}.tmp'.format(path, os.getpid())
+            with open(temp_path, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+    def __insert(self, key: str, entry: CacheEntry) -> None:
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+
+class CachedSubmodel(Submodel):
+    """Wraps a Submodel, skipping runs whose results are in a cache.
+
+    The submodel may only receive in F_INIT and send in O_F, since
+    messages exchanged during the run would not be part of the key, and
+    could not be reproduced from the cache.
+
+    On a cache hit, the loop still goes through F_INIT, O_I, S, B and
+    O_F once, but none of these call the submodel. The final observation
+    is sent at the same event as it would have been by the submodel.
+    Lazy final observations are all evaluated, to store them.
+    """
+    def __init__(self, submodel: Submodel, cache: ResultCache) -> None:
+        description = submodel.describe()
+        for endpoint in description.endpoints:
+            if endpoint.operator not in (Operator.F_INIT, Operator.O_F):
+                raise RuntimeError(('Submodel has endpoint {} on operator {}, only'
+                    ' submodels with endpoints on F_INIT and O_F can be cached'
+                    ).format(endpoint.name, endpoint.operator.value))
+
+        self.__submodel = submodel
+        self.__cache = cache
+        self.__key = None               # type: str
+        self.__hit = None               # type: CacheEntry
+        self.__initial_event = None     # type: float
+        self.__final_event = None       # type: float
+
+
+    @overrides
+    def describe(self) -> SubmodelDescription:
+        return self.__submodel.describe()
+
+
+    @overrides
+    def initialise_state(self,
+            configuration: Configuration,
+            initial_event: float,
+            input_messages: Dict[str, Message]
+            ) -> float:
+
+        self.__key = self.__cache.key(configuration, input_messages)
+        self.__hit = self.__cache.get(self.__key)
+        self.__initial_event = initial_event
+        self.__final_event = initial_event
+        if self.__hit is not None:
+            return initial_event + self.__hit[0]
+        return self.__submodel.initialise_state(configuration, initial_event, input_messages)
+
+
+    @overrides
+    def solve(self,
+            event: float,
+            input_messages: Dict[str, Message]) -> float:
+
+        if self.__hit is not None:
+            return None
+        return self.__submodel.solve(event, input_messages)
+
+
+    @overrides
+    def update_boundary_conditions(self,
+            event: float, next_event: float,
+            input_messages: Dict[str, Message]) -> float:
+
+        if self.__hit is not None:
+            return None
+        self.__final_event = event
+        return self.__submodel.update_boundary_conditions(event, next_event, input_messages)
+
+
+    @overrides
+    def observe_intermediate_state(self) -> Dict[str, Any]:
+        if self.__hit is not None:
+            return {}
+        return self.__submodel.observe_intermediate_state()
+
+
+    @overrides
+    def observe_final_state(self) -> Dict[str, Any]:
+        if self.__hit is not None:
+            return dict(self.__hit[1])
+
+        observation = {
+                name: data.value() if isinstance(data, Lazy) else data
+                for name, data in self.__submodel.observe_final_state().items()}
+        self.__cache.put(self.__key, (
+            self.__final_event - self.__initial_event, dict(observation)))
+        return observation
+
+
+    @overrides
+    def save_state(self) -> Any:
+        return {
+                'key': self.__key,
+                'hit': self.__hit,
+                'initial_event': self.__initial_event,
+                'final_event': self.__final_event,
+                'submodel': self.__submodel.save_state()
+                }
+
+
+    @overrides
+    def load_state(self, state: Any) -> None:
+        self.__key = state['key']
+        self.__hit = state['hit']
+        self.__initial_event = state['initial_event']
+        self.__final_event = state['final_event']
+        self.__submodel.load_state(state['submodel'])
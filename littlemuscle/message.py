@@ -1,6 +1,8 @@
-from typing import Any
+from typing import Any, Callable
 
 class Message:
+    __slots__ = ('time', 'next_time', 'data')
+
     def __init__(self, time: float, next_time: float, data: Any):
         self.time = time
         self.next_time = next_time
@@ -13,3 +15,33 @@ class Message:
 
     def __str__(self) -> str:
         return 'Message({}, {}, {})'.format(self.time, self.next_time, self.data)
+
+
+class Lazy:
+    """Observation data that is only computed if it is sent.
+
+    Submodels may return a Lazy instead of the data for an endpoint from
+    observe_intermediate_state() or observe_final_state(), and mappers
+    from map(). The engine calls the function, without arguments, only
+    if the endpoint is connected to a conduit, right after the operator
+    that returned it, and sends the result. Sending endpoints need not
+    be connected, so a submodel can offer observations that are costly
+    to make, and only pay for those that a model uses.
+
+    The function is called at most once, also if the Lazy is sent on
+    several endpoints, so return a new Lazy for every observation.
+    Ensembles do not support Lazy observations of their instances.
+    """
+    __slots__ = ('function', '__value', '__evaluated')
+
+    def __init__(self, function: Callable[[], Any]) -> None:
+        self.function = function
+        self.__value = None         # type: Any
+        self.__evaluated = False
+
+
+    def value(self) -> Any:
+        if not self.__evaluated:
+            self.__value = self.function()
+            self.__evaluated = True
+        return self.__value
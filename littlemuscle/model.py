@@ -1,8 +1,10 @@
+from .interpolation import Interpolation
+from .mapper import Mapper
 from .operator import Operator
 from .submodel import Endpoint, Submodel
 
 from enum import Enum
-from typing import List
+from typing import List, Union
 
 
 class Conduit:
@@ -10,17 +12,26 @@ class Conduit:
             from_compute_element: str,
             from_endpoint: Endpoint,
             to_compute_element: str,
-            to_endpoint: Endpoint
+            to_endpoint: Endpoint,
+            depth: int = 1,
+            interpolation: Interpolation = None,
+            tap: bool = False
             ) -> None:
 
         self.from_compute_element = from_compute_element
         self.from_endpoint = from_endpoint
         self.to_compute_element = to_compute_element
         self.to_endpoint = to_endpoint
+        self.depth = depth
+        self.interpolation = interpolation
+        # whether it may share its sending endpoint with another conduit
+        self.tap = tap
 
 
 class KindOfComputeElement(Enum):
     SUBMODEL = 'submodel'
+    ENSEMBLE = 'ensemble'
+    MAPPER = 'mapper'
 
 
 class ComputeElement:
@@ -28,7 +39,7 @@ class ComputeElement:
             kind: KindOfComputeElement,
             name: str,
             endpoints: List[Endpoint],
-            implementation: Submodel
+            implementation: Union[Submodel, Mapper]
             ) -> None:
 
         self.kind = kind
@@ -1,80 +1,457 @@
 from .configuration import Configuration
 from .edge_type import EdgeType
+from .interpolation import Interpolation, TemporalAdapter
+from .mapper import Mapper
 from .message import Message
-from .model import ComputeElement, Conduit
+from .model import ComputeElement, Conduit, KindOfComputeElement
 from .operator import Operator
 from .submodel import Endpoint, Submodel
 
-from copy import deepcopy
+from array import array
+from collections import deque
+from collections.abc import Mapping
 from enum import Enum
-from typing import Dict, Iterator, List, Tuple
+from typing import Deque, Dict, FrozenSet, Iterator, List, Set, Tuple, Union
 
-import networkx as nx
 
+STATE_SLOT = 0
 
-Inbox = Dict[str, Message]
+# edge types by their code in ModelExecutionGraph.edge_types
+EDGE_TYPES = (EdgeType.STEP, EdgeType.MESSAGE, EdgeType.STATE)
+_EDGE_TYPE_CODES = {edge_type: code for code, edge_type in enumerate(EDGE_TYPES)}
+
+
+class Inbox(Mapping):
+    """Messages received by a ModelNode, by receiving endpoint name.
+
+    Messages are kept in a list of slots, one per receiving endpoint,
+    plus slot STATE_SLOT for the state message that arrives over step
+    edges. The state message is available as the state attribute, and
+    is not included when the Inbox is used as a read-only dict.
+    """
+    __slots__ = ('slots', '_indices', '_names')
+
+    def __init__(self, slot_indices: Dict[str, int]) -> None:
+        self.slots = [None] * len(slot_indices)     # type: List[Message]
+        self._indices = slot_indices
+        self._names = [name for name in slot_indices if name != '']
+
+
+    @property
+    def state(self) -> Message:
+        return self.slots[STATE_SLOT]
+
+
+    def __getitem__(self, endpoint: str) -> Message:
+        if endpoint == '':
+            raise KeyError(endpoint)
+        return self.slots[self._indices[endpoint]]
+
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+    def clear(self) -> None:
+        slots = self.slots
+        for i in range(len(slots)):
+            slots[i] = None
+
+
+Route = Tuple['ModelNode', int]
 
 
 class ModelNode:
+    """An operator of a compute element, with its inbox.
+
+    The inbox has a slot for each receiving endpoint, which holds one
+    message, or more if it is connected by a conduit with a depth
+    greater than one, in which case the messages are received in the
+    order they were sent. A slot is full if it holds as many messages
+    as its depth. num_blocking counts the full slots of the receivers
+    of this node, and the engines hold back a node as long as it is
+    not zero, so that it does not overwrite messages that have not
+    been received yet.
+
+    A slot of an S or B node can have a TemporalAdapter instead, which
+    keeps the messages sent to it, and fills the slot with the data at
+    the event the operator runs at, once the state message arrives. The
+    O_F node of the sender then has the slot in finishes, and the
+    engines call finish_sending() after it ran. An adapter blocks its
+    sender while it is full and its oldest message may still be served,
+    see TemporalAdapter.full().
+    """
     def __init__(self,
             element_name: str,
             operator: Operator,
-            implementation: Submodel,
-            empty_inbox: Inbox
+            implementation: Union[Submodel, Mapper],
+            endpoint_names: List[str]
             ) -> None:
+        """Create a ModelNode.
 
+        Args:
+            endpoint_names: Names of the receiving endpoints of this
+                node. For submodel operators, the first of these must
+                be the state slot ''. Mappers have no state.
+        """
         super().__init__()
 
         self.element_name = element_name
         self.operator = operator
         self.implementation = implementation
-        self.inbox = deepcopy(empty_inbox)
-
-        self.__empty_inbox = empty_inbox
+        self.endpoint_names = endpoint_names
+        self.slot_indices = {name: i for i, name in enumerate(endpoint_names)}
+        self.num_missing = len(endpoint_names)
+        self.routes = {}    # type: Dict[str, Route]
+        self.index = -1     # set by ModelExecutionGraph
+
+        # sending endpoints without a conduit, set by ModelExecutionGraph
+        self.unconnected = frozenset()  # type: FrozenSet[str]
+        self.observations_evaluated = 0
+        self.observations_skipped = 0
+
+        # conduit senders and depths by slot, set by ModelExecutionGraph
+        self.senders = [None] * len(endpoint_names)     # type: List[ModelNode]
+        self.depths = [1] * len(endpoint_names)
+        self.num_blocking = 0
+        # whether take_messages() left a full inbox, from buffered messages
+        self.refilled = False
+        # temporal adapters by slot, None if there are none
+        self.adapters = None    # type: List[TemporalAdapter]
+        # adapted slots fed by this element, for O_F nodes
+        self.finishes = None    # type: List[Route]
+        # more receivers by sending endpoint, for taps on connected
+        # endpoints, None if there are none
+        self.taps = None        # type: Dict[str, List[Route]]
+
+        self.__inbox = Inbox(self.slot_indices)
+        self.__spare_inbox = Inbox(self.slot_indices)
+        # messages after the first, for slots with a depth over one
+        self.__queues = [None] * len(endpoint_names)    # type: List[Deque[Message]]
+        self.__conduit_slots = []                       # type: List[int]
+        self.__hash = hash((element_name, operator))
 
 
     def __hash__(self) -> int:
-        return hash((self.element_name, self.operator))
+        return self.__hash
 
 
-    def post_message(self, endpoint: str, message: Message) -> None:
-        self.inbox[endpoint] = message
+    def connect(self,
+            slot: int, sender: 'ModelNode', depth: int,
+            interpolation: Interpolation = None
+            ) -> None:
+        """Sets the node sending to a slot, and how many messages the
+        slot can hold.
+
+        With an interpolation, the slot gets a TemporalAdapter that
+        holds depth messages.
+        """
+        self.senders[slot] = sender
+        self.depths[slot] = depth
+        if interpolation is not None:
+            if self.adapters is None:
+                self.adapters = [None] * len(self.endpoint_names)
+            self.adapters[slot] = TemporalAdapter(interpolation, depth)
+            return
+        if depth > 1:
+            self.__queues[slot] = deque()
+        self.__conduit_slots.append(slot)
+
+
+    def post_message(self, slot: int, message: Message) -> bool:
+        """Returns True if this message filled the last empty slot.
+
+        Raises a RuntimeError if the slot is full, rather than lose a
+        message. The engines do not run senders that would do that.
+        Temporal adapters keep all messages that may still be served,
+        and only use their size to block the sender.
+        """
+        if self.adapters is not None:
+            return self.__post_adapted(slot, message)
+        return self.__post_to_inbox(slot, message)
+
+
+    def __post_to_inbox(self, slot: int, message: Message) -> bool:
+        """post_message() for slots without temporal adapter."""
+        slots = self.__inbox.slots
+        if slots[slot] is None:
+            slots[slot] = message
+            if self.depths[slot] == 1:
+                sender = self.senders[slot]
+                if sender is not None:
+                    sender.num_blocking += 1
+            self.num_missing -= 1
+            return self.num_missing == 0
+
+        queue = self.__queues[slot]
+        if queue is None or len(queue) + 1 >= self.depths[slot]:
+            raise RuntimeError('A message to {}.{} for {} would replace one that was not'
+                    ' received yet'.format(self.element_name, self.operator.value,
+                        self.endpoint_names[slot] or 'the state'))
+        queue.append(message)
+        if len(queue) + 1 == self.depths[slot]:
+            self.senders[slot].num_blocking += 1
+        return False
+
+
+    def __post_adapted(self, slot: int, message: Message) -> bool:
+        """post_message() for nodes with temporal adapters."""
+        num_missing = self.num_missing
+        adapter = self.adapters[slot]
+        if adapter is None:
+            self.__post_to_inbox(slot, message)
+            if slot == STATE_SLOT:
+                for adapted_slot, adapter in enumerate(self.adapters):
+                    if adapter is not None:
+                        self.__serve(adapted_slot, adapter)
+        else:
+            adapter.add(message)
+            self.__serve(slot, adapter)
+        return num_missing > 0 and self.num_missing == 0
+
+
+    def finish_sending(self, slot: int) -> bool:
+        """Tells the adapter of a slot that its sender has finished.
+
+        Returns True if that filled the last empty slot.
+        """
+        num_missing = self.num_missing
+        adapter = self.adapters[slot]
+        adapter.finish()
+        self.__serve(slot, adapter)
+        return num_missing > 0 and self.num_missing == 0
+
+
+    def __update_blocking(self, slot: int, adapter: TemporalAdapter) -> None:
+        full = adapter.full()
+        if full != adapter.blocking:
+            adapter.blocking = full
+            self.senders[slot].num_blocking += 1 if full else -1
+
+
+    def finished_slots(self) -> List[int]:
+        """Returns the adapted slots whose sender has finished."""
+        return [slot for slot, adapter in enumerate(self.adapters or ())
+                if adapter is not None and adapter.finished]
+
+
+    def __serve(self, slot: int, adapter: TemporalAdapter) -> None:
+        """Fills an adapted slot, if the state message is there."""
+        slots = self.__inbox.slots
+        state = slots[STATE_SLOT]
+        if state is None or slots[slot] is not None:
+            self.__update_blocking(slot, adapter)
+            return
+        # S solves at the next event of its state, B updates at its event
+        # and next at the next one, or never if there is none
+        if self.operator == Operator.S:
+            message = adapter.message_at(state.next_time)
+        else:
+            message = adapter.message_at(state.time,
+                    state.next_time if state.next_time is not None else float('inf'))
+        self.__update_blocking(slot, adapter)
+        if message is not None:
+            slots[slot] = message
+            self.num_missing -= 1
+
+
+    def has_message(self, slot: int) -> bool:
+        return self.__inbox.slots[slot] is not None
 
 
     def inbox_full(self) -> bool:
-        for key in self.inbox:
-            if self.inbox[key] is None:
-                return False
-        return True
+        return self.num_missing == 0
+
+
+    def peek_messages(self) -> List[Message]:
+        """Returns the first message in each slot, None if empty."""
+        return list(self.__inbox.slots)
+
+
+    def buffered_messages(self) -> List[List[Message]]:
+        """Returns all messages in each slot, first one first.
+
+        For adapted slots, these are the messages in the adapter, from
+        which the slot is filled again when they are posted.
+        """
+        adapters = self.adapters or [None] * len(self.__queues)
+        return [adapter.messages() if adapter is not None
+                else [] if message is None else [message] + list(queue or ())
+                for message, queue, adapter in zip(self.__inbox.slots, self.__queues, adapters)]
 
 
     def take_messages(self) -> Inbox:
-        """Also empties inbox."""
-        messages = self.inbox
-        self.inbox = deepcopy(self.__empty_inbox)
+        """Takes the first message from each slot.
+
+        The inbox is double-buffered, so the returned Inbox is reused
+        and stays valid only until the next call to take_messages().
+        Slots that hold more messages get the next one.
+        """
+        messages = self.__inbox
+        self.__inbox = self.__spare_inbox
+        self.__spare_inbox = messages
+        slots = self.__inbox.slots
+        self.__inbox.clear()
+        self.num_missing = len(self.slot_indices)
+
+        for slot in self.__conduit_slots:
+            if messages.slots[slot] is None:
+                continue
+            queue = self.__queues[slot]
+            if queue is None:
+                self.senders[slot].num_blocking -= 1
+                continue
+            if len(queue) + 1 == self.depths[slot]:
+                self.senders[slot].num_blocking -= 1
+            if queue:
+                slots[slot] = queue.popleft()
+                self.num_missing -= 1
+        self.refilled = self.num_missing == 0
         return messages
 
 
-class ModelExecutionGraph(nx.DiGraph):
+    def clear_messages(self) -> None:
+        """Empties the inbox, and resets num_blocking.
+
+        This must be done for all nodes at once, so that num_blocking
+        matches the emptied inboxes of the receivers.
+        """
+        self.__inbox.clear()
+        for queue in self.__queues:
+            if queue is not None:
+                queue.clear()
+        for adapter in self.adapters or ():
+            if adapter is not None:
+                adapter.clear()
+        self.num_missing = len(self.slot_indices)
+        self.num_blocking = 0
+        self.refilled = False
+
+
+# sender, receiver, edge type, sending endpoint, receiving endpoint
+Edge = Tuple[ModelNode, ModelNode, EdgeType, str, str]
+
+
+class ModelExecutionGraph:
+    """The operators of a model, and the edges between them.
+
+    Nodes are numbered in the order in which they were added, and are
+    stored in a list, with node.index the position of a node in it.
+    Edges are stored in arrays with the index of the sending and
+    receiving node and a code for the edge type (see EDGE_TYPES), and
+    lists with the endpoint names.
+
+    At run time, the engines only use nodes(), and route messages with
+    the routes of each node, a dict from sending endpoint to receiving
+    node and slot, which replaces a lookup of the outgoing edges. The
+    edges are only used to describe the graph, see edges(), and
+    to_networkx() to analyse it with networkx.
+    """
     def __init__(self,
             compute_elements: List[ComputeElement],
-            conduits: List[Conduit]
+            conduits: List[Conduit],
+            check_connected: bool = True
             ) -> None:
+        """Create a ModelExecutionGraph.
+
+        Args:
+            compute_elements: The compute elements of the model.
+            conduits: The conduits connecting them.
+            check_connected: Whether to raise if a receiving endpoint
+                is not connected to a conduit. Disabled when running
+                part of a model, e.g. for a replay. Sending endpoints
+                need not be connected, messages sent on them are
+                dropped.
+        """
+        self.__nodes = []                   # type: List[ModelNode]
+        self.__nodes_by_operator = {}       # type: Dict[Tuple[str, Operator], ModelNode]
+        self.__connected_receivers = set()  # type: Set[Route]
+
+        self.edge_sources = array('l')
+        self.edge_targets = array('l')
+        self.edge_types = array('B')
+        self.edge_from_endpoints = []       # type: List[str]
+        self.edge_to_endpoints = []         # type: List[str]
+
+        for element in compute_elements:
+            if element.kind == KindOfComputeElement.MAPPER:
+                self.__add_mapper_to_graph(element)
+            else:
+                self.__add_submodel_to_graph(element)
+
+        # taps last, so that they only share endpoints that are connected
+        for conduit in sorted(conduits, key=lambda conduit: conduit.tap):
+            self.__add_conduit_to_graph(conduit)
 
-        super().__init__()
+        self.__find_unconnected_senders(compute_elements)
+        if check_connected:
+            self.__check_endpoints_connected(compute_elements)
 
-        for submodel in compute_elements:
-            self.__add_submodel_to_graph(submodel)
 
-        for conduit in conduits:
-            self.__add_conduit_to_graph(conduit)
+    def nodes(self) -> List[ModelNode]:
+        """Returns the nodes, ordered by index. Do not modify."""
+        return self.__nodes
+
+
+    def __iter__(self) -> Iterator[ModelNode]:
+        return iter(self.__nodes)
+
+
+    def __len__(self) -> int:
+        return len(self.__nodes)
+
+
+    def edges(self) -> Iterator[Edge]:
+        """Yields the edges, in the order in which they were added."""
+        nodes = self.__nodes
+        for i in range(len(self.edge_sources)):
+            yield (nodes[self.edge_sources[i]], nodes[self.edge_targets[i]],
+                    EDGE_TYPES[self.edge_types[i]],
+                    self.edge_from_endpoints[i], self.edge_to_endpoints[i])
+
+
+    def to_networkx(self) -> 'networkx.DiGraph':
+        """Returns the graph as a networkx DiGraph.
+
+        Nodes are ModelNodes, and edges have attributes edge_type,
+        from_endpoint_name and to_endpoint_name. This imports networkx,
+        so it is only done here.
+        """
+        import networkx as nx
+
+        digraph = nx.DiGraph()
+        digraph.add_nodes_from(self.__nodes)
+        for from_node, to_node, edge_type, from_name, to_name in self.edges():
+            digraph.add_edge(from_node, to_node, edge_type=edge_type,
+                    from_endpoint_name=from_name, to_endpoint_name=to_name)
+        return digraph
 
 
-    def find_receiver(self, model_node: ModelNode, endpoint_name: str) -> ModelNode:
-        for u, v, data in super().edges(data=True):
-            if u == model_node:
-                if data['from_endpoint_name'] == endpoint_name:
-                    return v, data['to_endpoint_name']
+    def find_receiver(self,
+            model_node: ModelNode, endpoint_name: str
+            ) -> Tuple[ModelNode, str]:
+        """Returns the receiving node and endpoint name of an endpoint
+        of model_node. The endpoint of a state message is called ''.
+        """
+        receiver, slot = model_node.routes[endpoint_name]
+        return receiver, receiver.endpoint_names[slot]
+
+
+    def clear_inboxes(self) -> None:
+        """Removes messages left over from a previous run."""
+        for node in self.nodes():
+            node.clear_messages()
+
+
+    def reset_observation_counts(self) -> None:
+        """Sets the observation counters of all nodes to zero."""
+        for node in self.nodes():
+            node.observations_evaluated = 0
+            node.observations_skipped = 0
 
 
     def __add_submodel_to_graph(self, element: ComputeElement) -> None:
@@ -92,47 +469,115 @@ class ModelExecutionGraph(nx.DiGraph):
         self.__add_step_edge(o_f_node, f_init_node, '__F_INIT', EdgeType.STATE)
 
 
+    def __add_mapper_to_graph(self, element: ComputeElement) -> None:
+        input_names = [endpoint.name for endpoint in element.implementation.describe().inputs]
+        node = ModelNode(element.name, Operator.M, element.implementation, input_names)
+        self.__add_node(node)
+
+
     def __add_element_node(self, element: ComputeElement, operator: Operator) -> ModelNode:
-        empty_inbox = self.__make_empty_inbox(element.endpoints, operator)
-        node = ModelNode(element.name, operator, element.implementation, empty_inbox)
-        super().add_node(node)
+        endpoint_names = self.__make_endpoint_names(element.endpoints, operator)
+        node = ModelNode(element.name, operator, element.implementation, endpoint_names)
+        self.__add_node(node)
         return node
 
 
+    def __add_node(self, node: ModelNode) -> None:
+        node.index = len(self.__nodes)
+        self.__nodes.append(node)
+        self.__nodes_by_operator[(node.element_name, node.operator)] = node
+
+
+    def __add_edge(self,
+            from_node: ModelNode, to_node: ModelNode,
+            edge_type: EdgeType, from_endpoint_name: str, to_endpoint_name: str
+            ) -> None:
+
+        self.edge_sources.append(from_node.index)
+        self.edge_targets.append(to_node.index)
+        self.edge_types.append(_EDGE_TYPE_CODES[edge_type])
+        self.edge_from_endpoints.append(from_endpoint_name)
+        self.edge_to_endpoints.append(to_endpoint_name)
+
+
     def __add_step_edge(self,
             from_node: ModelNode, to_node: ModelNode,
             operator_name: str,
             edge_type: EdgeType = EdgeType.STEP
             ) -> None:
 
-        super().add_edge(from_node, to_node,
-                edge_type=edge_type,
-                from_endpoint_name=operator_name, to_endpoint_name='')
+        self.__add_edge(from_node, to_node, edge_type, operator_name, '')
+        from_node.routes[operator_name] = (to_node, STATE_SLOT)
 
 
 
-    def __make_empty_inbox(self, endpoints: List[Endpoint], operator: Operator) -> Inbox:
-        inbox = { '': None }
+    def __make_endpoint_names(self, endpoints: List[Endpoint], operator: Operator) -> List[str]:
+        names = ['']
 
         if operator.may_receive():
             for endpoint in endpoints:
                 if endpoint.operator == operator:
-                    inbox[endpoint.name] = None
-        return inbox
+                    names.append(endpoint.name)
+        return names
 
 
     def __add_conduit_to_graph(self, conduit: Conduit) -> None:
         from_node = self.__find_node_by_endpoint(conduit.from_compute_element, conduit.from_endpoint)
         to_node = self.__find_node_by_endpoint(conduit.to_compute_element, conduit.to_endpoint)
-        super().add_edge(from_node, to_node,
-                edge_type=EdgeType.MESSAGE,
-                from_endpoint_name=conduit.from_endpoint.name,
-                to_endpoint_name=conduit.to_endpoint.name)
-
-
-    def __find_node_by_endpoint(self, element_name: str, endpoint: Endpoint) -> int:
-        nodes = [n for n in super().nodes
-                if n.element_name == element_name
-                and n.operator == endpoint.operator]
-        assert len(nodes) == 1
-        return nodes[0]
+
+        sender = conduit.from_endpoint.name
+        receiver = (to_node, to_node.slot_indices[conduit.to_endpoint.name])
+        if sender in from_node.routes and not conduit.tap:
+            raise RuntimeError('Endpoint {} on element {} is connected more than once'.format(
+                sender, conduit.from_compute_element))
+        if receiver in self.__connected_receivers:
+            raise RuntimeError('Endpoint {} on element {} is connected more than once'.format(
+                conduit.to_endpoint.name, conduit.to_compute_element))
+
+        if sender not in from_node.routes:
+            from_node.routes[sender] = receiver
+        else:
+            if from_node.taps is None:
+                from_node.taps = {}
+            from_node.taps.setdefault(sender, []).append(receiver)
+        self.__connected_receivers.add(receiver)
+        to_node.connect(receiver[1], from_node, conduit.depth, conduit.interpolation)
+        if conduit.interpolation is not None:
+            o_f_node = self.__nodes_by_operator.get((conduit.from_compute_element, Operator.O_F))
+            if o_f_node is not None:
+                if o_f_node.finishes is None:
+                    o_f_node.finishes = []
+                o_f_node.finishes.append(receiver)
+
+        self.__add_edge(from_node, to_node, EdgeType.MESSAGE,
+                conduit.from_endpoint.name, conduit.to_endpoint.name)
+
+
+    def __find_unconnected_senders(self, compute_elements: List[ComputeElement]) -> None:
+        unconnected = {}    # type: Dict[ModelNode, Set[str]]
+        for element in compute_elements:
+            for endpoint in element.endpoints:
+                node = self.__find_node_by_endpoint(element.name, endpoint)
+                if endpoint.name not in node.slot_indices and endpoint.name not in node.routes:
+                    unconnected.setdefault(node, set()).add(endpoint.name)
+        for node, names in unconnected.items():
+            node.unconnected = frozenset(names)
+
+
+    def __check_endpoints_connected(self, compute_elements: List[ComputeElement]) -> None:
+        unconnected = []
+        for element in compute_elements:
+            for endpoint in element.endpoints:
+                node = self.__find_node_by_endpoint(element.name, endpoint)
+                if endpoint.name in node.slot_indices:
+                    receiver = (node, node.slot_indices[endpoint.name])
+                    if receiver not in self.__connected_receivers:
+                        unconnected.append('{}.{}'.format(element.name, endpoint.name))
+
+        if unconnected:
+            raise RuntimeError('Endpoints not connected to a conduit: {}'.format(
+                ', '.join(unconnected)))
+
+
+    def __find_node_by_endpoint(self, element_name: str, endpoint: Endpoint) -> ModelNode:
+        return self.__nodes_by_operator[(element_name, endpoint.operator)]
@@ -11,7 +11,7 @@ from random import uniform
 from typing import Dict, Tuple
 
 
-def plot_model_graph(graph: ModelExecutionGraph) -> None:
+def plot_model_graph(graph: ModelExecutionGraph, filename: str = None) -> None:
 
     def offset(
             pos: Dict[int, Tuple[float, float]],
@@ -25,9 +25,9 @@ def plot_model_graph(graph: ModelExecutionGraph) -> None:
         return result
 
 
-    G = graph
+    G = graph.to_networkx()
 
-    pos = _layout_graph(G)
+    pos = _layout_graph(graph)
 
     nx.draw_networkx_nodes(G, pos)
 
@@ -67,7 +67,11 @@ def plot_model_graph(graph: ModelExecutionGraph) -> None:
     nx.draw_networkx_edge_labels(G, pos, edge_to_labels, label_pos=0.3)
 
     plt.axis('off')
-    plt.show()
+    if filename is None:
+        plt.show()
+    else:
+        plt.savefig(filename)
+        plt.close()
 
 
 def _layout_graph(graph: ModelExecutionGraph) -> Dict[int, Tuple[float, float]]:
@@ -111,7 +115,8 @@ def _layout_graph(graph: ModelExecutionGraph) -> Dict[int, Tuple[float, float]]:
             Operator.O_I: (0.0, 0.02),
             Operator.S: (0.01, 0.0),
             Operator.B: (-0.01, -0.02),
-            Operator.O_F: (-0.02, -0.05)
+            Operator.O_F: (-0.02, -0.05),
+            Operator.M: (0.0, 0.0)
             }
 
     pos = dict()
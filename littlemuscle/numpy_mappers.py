@@ -0,0 +1,173 @@
+"""A library of vectorised mappers for NumPy array data.
+
+Mappers that transform a single array take it on an input named 'in',
+and send the result on each of their outputs. By default there is one
+output named 'out', but several can be given, in which case the same
+result array is sent on each of them without copying.
+
+Grid operations work along the last axis, so that stacked arrays, e.g.
+from an ensemble, are transformed in a single operation.
+"""
+from .mapper import Mapper, MapperDescription
+from .message import Message
+
+from abc import abstractmethod
+from overrides import overrides
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+class ArrayMapper(Mapper):
+    """Base class for mappers that transform a single array."""
+    def __init__(self, outputs: List[str] = None) -> None:
+        self.__outputs = outputs if outputs is not None else ['out']
+
+
+    @overrides
+    def describe(self) -> MapperDescription:
+        description = MapperDescription()
+        description.add_input('in')
+        for name in self.__outputs:
+            description.add_output(name)
+        return description
+
+
+    @overrides
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        result = self.transform(np.asarray(input_messages['in'].data))
+        return {name: result for name in self.__outputs}
+
+
+    @abstractmethod
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        """Compute the output array from the input array."""
+        pass
+
+
+class GridInterpolation(ArrayMapper):
+    """Linearly interpolates from one 1D grid onto another.
+
+    Points outside the source grid get the value at its nearest end.
+    The indices and weights are computed once, so each map is only a
+    gather and a weighted sum.
+    """
+    def __init__(self,
+            from_grid: Sequence[float], to_grid: Sequence[float],
+            outputs: List[str] = None
+            ) -> None:
+        super().__init__(outputs)
+        from_grid = np.asarray(from_grid, dtype=float)
+        to_grid = np.clip(np.asarray(to_grid, dtype=float), from_grid[0], from_grid[-1])
+
+        right = np.clip(np.searchsorted(from_grid, to_grid, side='right'), 1, len(from_grid) - 1)
+        left = right - 1
+        width = from_grid[right] - from_grid[left]
+
+        self.__left = left
+        self.__right = right
+        self.__weight = np.where(width > 0.0, (to_grid - from_grid[left]) / width, 0.0)
+
+
+    @overrides
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        left = data[..., self.__left]
+        return left + (data[..., self.__right] - left) * self.__weight
+
+
+class Restriction(ArrayMapper):
+    """Averages blocks of factor consecutive points into one point."""
+    def __init__(self, factor: int, outputs: List[str] = None) -> None:
+        super().__init__(outputs)
+        self.__factor = factor
+
+
+    @overrides
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        if data.shape[-1] % self.__factor != 0:
+            raise ValueError('Cannot restrict {} points by a factor of {}'.format(
+                data.shape[-1], self.__factor))
+        blocks = data.reshape(data.shape[:-1] + (-1, self.__factor))
+        return blocks.mean(axis=-1)
+
+
+class Prolongation(ArrayMapper):
+    """Copies each point to factor consecutive points."""
+    def __init__(self, factor: int, outputs: List[str] = None) -> None:
+        super().__init__(outputs)
+        self.__factor = factor
+
+
+    @overrides
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        return np.repeat(data, self.__factor, axis=-1)
+
+
+class UnitConversion(ArrayMapper):
+    """Converts to another unit by computing data * scale + offset."""
+    def __init__(self, scale: float, offset: float = 0.0, outputs: List[str] = None) -> None:
+        super().__init__(outputs)
+        self.__scale = scale
+        self.__offset = offset
+
+
+    @overrides
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        return data * self.__scale + self.__offset
+
+
+class Scatter(Mapper):
+    """Splits an array along its first axis and sends out the parts.
+
+    The array received on 'in' is split into len(outputs) parts of
+    (nearly) equal size, which are views on the original array. Other
+    data, including lists and arrays without dimensions, is sent
+    unchanged on each output.
+    """
+    def __init__(self, outputs: List[str]) -> None:
+        self.__outputs = outputs
+
+
+    @overrides
+    def describe(self) -> MapperDescription:
+        description = MapperDescription()
+        description.add_input('in')
+        for name in self.__outputs:
+            description.add_output(name)
+        return description
+
+
+    @overrides
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        data = input_messages['in'].data
+        if not isinstance(data, np.ndarray) or data.ndim == 0:
+            return {name: data for name in self.__outputs}
+        return dict(zip(self.__outputs, np.array_split(data, len(self.__outputs))))
+
+
+class Gather(Mapper):
+    """Concatenates the arrays received on its inputs along the first axis.
+
+    The result is sent on 'out'. If any of the inputs is not an array of
+    at least one dimension, the list of received data is sent instead.
+    """
+    def __init__(self, inputs: List[str]) -> None:
+        self.__inputs = inputs
+
+
+    @overrides
+    def describe(self) -> MapperDescription:
+        description = MapperDescription()
+        for name in self.__inputs:
+            description.add_input(name)
+        description.add_output('out')
+        return description
+
+
+    @overrides
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        data = [input_messages[name].data for name in self.__inputs]
+        parts = [np.asarray(item) for item in data]
+        if any(part.ndim == 0 for part in parts):
+            return {'out': data}
+        return {'out': np.concatenate(parts)}
@@ -13,11 +13,11 @@ class Operator(Enum):
     M = 'M'
 
     def may_receive(self) -> bool:
-        receiving_operators = [Operator.F_INIT, Operator.S, Operator.B]
+        receiving_operators = [Operator.F_INIT, Operator.S, Operator.B, Operator.M]
         return self in receiving_operators
 
     def may_send(self) -> bool:
-        sending_operators = [Operator.O_I, Operator.O_F]
+        sending_operators = [Operator.O_I, Operator.O_F, Operator.M]
         return self in sending_operators
 
 
@@ -0,0 +1,183 @@
+from .configuration import Configuration
+from .message import Lazy
+from .model_execution_graph import ModelExecutionGraph, ModelNode
+from .operator import Operator
+from .simulation_engine import (
+        Outbox, ReadyQueue, _blocked_error, _deliver_messages, _run_operator,
+        _start_simulation)
+from .submodel import Submodel
+from .transport import PickleTransport
+
+from collections import deque
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection, wait
+from traceback import format_exc
+from typing import Dict, FrozenSet, Tuple
+
+
+class _Worker:
+    """A process that runs the operators of a single compute element.
+
+    The Submodel lives in the worker process, so it keeps its state
+    there between operator executions.
+    """
+    def __init__(self,
+            element_name: str,
+            implementation: Submodel,
+            configuration: Configuration,
+            unconnected: FrozenSet[str],
+            transport: PickleTransport
+            ) -> None:
+
+        self.element_name = element_name
+        self.connection, worker_connection = Pipe()
+        self.__transport = transport
+        self.process = Process(
+                target=_worker_main,
+                args=(worker_connection, transport.for_worker(),
+                    implementation, configuration, unconnected),
+                name='littlemuscle-{}'.format(element_name))
+        self.process.start()
+        worker_connection.close()
+
+
+    def submit(self, node: ModelNode) -> None:
+        self.__transport.send(self.connection, (node.operator, node.take_messages()))
+
+
+    def result(self, node: ModelNode) -> Outbox:
+        succeeded, result = self.__transport.receive(self.connection)
+        if not succeeded:
+            raise RuntimeError('Error in element {}:\n{}'.format(
+                self.element_name, result))
+        sent_messages, evaluated, skipped = result
+        node.observations_evaluated += evaluated
+        node.observations_skipped += skipped
+        return sent_messages
+
+
+    def stop(self) -> None:
+        try:
+            self.__transport.send(self.connection, None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+
+
+def run_simulation_parallel(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration],
+        transport: PickleTransport = None
+        ) -> None:
+    """Run a simulation with each compute element in its own process.
+
+    All runnable operators are executed concurrently, and their output
+    messages are routed through the main process, which does all the
+    scheduling. Submodel implementations and message data must be
+    picklable. Since each submodel runs in a copy of its implementation
+    object, the objects in the calling process are not updated.
+
+    Each submodel receives exactly the same messages as it would with
+    run_simulation(), so the results are identical. A submodel may run
+    ahead of the submodels it sends to by as many messages as the depth
+    of the conduits allows, see Simulation.add_conduit(). Lazy observations
+    are evaluated in the worker, and those on unconnected endpoints are
+    dropped there, so they need not be picklable.
+
+    Args:
+        transport: How to send messages between processes. Defaults to
+            a PickleTransport. Pass a SharedMemoryTransport to avoid
+            copying large arrays. The transport is closed at the end.
+    """
+    if transport is None:
+        transport = PickleTransport()
+
+    workers = {}            # type: Dict[str, _Worker]
+    busy = {}               # type: Dict[Connection, Tuple[_Worker, ModelNode]]
+
+    try:
+        unconnected = {}    # type: Dict[str, FrozenSet[str]]
+        for node in graph.nodes():
+            unconnected[node.element_name] = \
+                    unconnected.get(node.element_name, frozenset()) | node.unconnected
+
+        for node in graph.nodes():
+            if node.element_name not in workers:
+                workers[node.element_name] = _Worker(
+                        node.element_name, node.implementation,
+                        configurations.get(node.element_name),
+                        unconnected[node.element_name], transport)
+
+        ready = _start_simulation(graph)
+        while ready or busy:
+            deferred = deque()  # type: ReadyQueue
+            while ready:
+                node = ready.popleft()
+                worker = workers[node.element_name]
+                # An element's operators are connected by step edges, so
+                # only one of them can be runnable at a time, but a
+                # mapper may get new inputs while it is still running.
+                # Also hold back operators whose receivers are full.
+                if worker.connection in busy or node.num_blocking:
+                    deferred.append(node)
+                    continue
+                worker.submit(node)
+                busy[worker.connection] = (worker, node)
+
+            if deferred and not busy:
+                # all are blocked, see _next_node()
+                raise _blocked_error(graph, deferred)
+            ready = deferred
+
+            for connection in wait(list(busy)):
+                worker, node = busy.pop(connection)
+                _deliver_messages(graph, node, worker.result(node), ready)
+
+    finally:
+        for worker in workers.values():
+            worker.stop()
+        transport.close()
+
+
+def _worker_main(
+        connection: Connection,
+        transport: PickleTransport,
+        implementation: Submodel,
+        configuration: Configuration,
+        unconnected: FrozenSet[str]
+        ) -> None:
+
+    task = transport.receive(connection)
+    while task is not None:
+        operator, received_messages = task
+        try:
+            sent_messages = _run_operator(
+                    operator, implementation, configuration, received_messages)
+            evaluated, skipped = _evaluate_observations(sent_messages, unconnected)
+            transport.send(connection, (True, (sent_messages, evaluated, skipped)))
+        except Exception:
+            transport.send(connection, (False, format_exc()))
+        task = transport.receive(connection)
+
+
+def _evaluate_observations(sent_messages: Outbox, unconnected: FrozenSet[str]) -> Tuple[int, int]:
+    """Evaluates Lazy data and drops messages on unconnected endpoints.
+
+    Returns:
+        The number of Lazy observations evaluated and skipped.
+    """
+    evaluated = 0
+    skipped = 0
+    for endpoint in list(sent_messages):
+        message = sent_messages[endpoint]
+        if endpoint in unconnected:
+            del sent_messages[endpoint]
+            if type(message.data) is Lazy:
+                skipped += 1
+        elif type(message.data) is Lazy:
+            message.data = message.data.value()
+            evaluated += 1
+    return evaluated, skipped
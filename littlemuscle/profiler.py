@@ -0,0 +1,148 @@
+from .message import Message
+from .model_execution_graph import Inbox, ModelNode
+
+import sys
+from typing import Any, Dict, List, Tuple
+
+
+OperatorKey = Tuple[str, str]
+
+
+class Profiler:
+    """Records where the time goes in a simulation run.
+
+    Pass a Profiler to Simulation.run() or run_simulation(), and the
+    engine will record, for every operator invocation, the wall clock
+    time and CPU time it took and the size of the message data it
+    received and sent, as well as the time the engine itself spent
+    scheduling and delivering messages. Without a Profiler, the engine
+    does not measure anything.
+
+    Afterwards, use summary() to get a table per element, operator and
+    conduit, or write_chrome_trace() to save a timeline that can be
+    viewed in chrome://tracing or https://ui.perfetto.dev.
+    """
+    def __init__(self) -> None:
+        # element, operator, start, end, cpu time, bytes in, bytes out
+        self.operator_events = []   # type: List[Tuple[str, str, float, float, float, int, int]]
+        # start, end of each span spent in the engine itself
+        self.scheduler_events = []  # type: List[Tuple[float, float]]
+        # (element, endpoint) -> [number of messages, bytes]
+        self.conduit_traffic = {}   # type: Dict[OperatorKey, List[int]]
+
+
+    def record_operator(self,
+            node: ModelNode,
+            received_messages: Inbox,
+            sent_messages: Dict[str, Message],
+            start: float, end: float, cpu_time: float
+            ) -> None:
+        """Records an operator invocation. Times are in seconds."""
+        bytes_in = 0
+        for message in received_messages.values():
+            bytes_in += payload_size(message.data)
+
+        bytes_out = 0
+        for endpoint, message in sent_messages.items():
+            if endpoint.startswith('__'):
+                continue
+            size = payload_size(message.data)
+            bytes_out += size
+            traffic = self.conduit_traffic.setdefault((node.element_name, endpoint), [0, 0])
+            traffic[0] += 1
+            traffic[1] += size
+
+        self.operator_events.append((
+            node.element_name, node.operator.value,
+            start, end, cpu_time, bytes_in, bytes_out))
+
+
+    def record_scheduling(self, start: float, end: float) -> None:
+        """Records time spent by the engine itself, in seconds."""
+        self.scheduler_events.append((start, end))
+
+
+    def scheduler_time(self) -> float:
+        return sum(end - start for start, end in self.scheduler_events)
+
+
+    def summary(self) -> str:
+        """Returns a table of time and data per operator and conduit."""
+        totals = {}     # type: Dict[OperatorKey, List[float]]
+        for element, operator, start, end, cpu_time, bytes_in, bytes_out in self.operator_events:
+            total = totals.setdefault((element, operator), [0, 0.0, 0.0, 0, 0])
+            total[0] += 1
+            total[1] += end - start
+            total[2] += cpu_time
+            total[3] += bytes_in
+            total[4] += bytes_out
+
+        lines = ['{:<30} {:>8} {:>12} {:>12} {:>12} {:>12}'.format(
+            'operator', 'calls', 'wall [s]', 'cpu [s]', 'bytes in', 'bytes out')]
+        by_wall_time = sorted(totals.items(), key=lambda item: -item[1][1])
+        for (element, operator), (calls, wall, cpu, bytes_in, bytes_out) in by_wall_time:
+            lines.append('{:<30} {:>8} {:>12.6f} {:>12.6f} {:>12} {:>12}'.format(
+                '{}.{}'.format(element, operator), calls, wall, cpu, bytes_in, bytes_out))
+        lines.append('{:<30} {:>8} {:>12.6f}'.format(
+            '(scheduler)', len(self.scheduler_events), self.scheduler_time()))
+
+        lines.append('')
+        lines.append('{:<30} {:>8} {:>12}'.format('conduit', 'messages', 'bytes'))
+        by_bytes = sorted(self.conduit_traffic.items(), key=lambda item: -item[1][1])
+        for (element, endpoint), (messages, size) in by_bytes:
+            lines.append('{:<30} {:>8} {:>12}'.format(
+                '{}.{}'.format(element, endpoint), messages, size))
+
+        return '\n'.join(lines)
+
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Returns the recorded events in Chrome trace event format."""
+        starts = ([event[2] for event in self.operator_events] +
+                [start for start, _ in self.scheduler_events])
+        origin = min(starts) if starts else 0.0
+
+        threads = {'(scheduler)': 0}
+        events = []
+        for element, operator, start, end, cpu_time, bytes_in, bytes_out in self.operator_events:
+            tid = threads.setdefault(element, len(threads))
+            events.append({
+                'name': '{}.{}'.format(element, operator), 'cat': 'operator',
+                'ph': 'X', 'pid': 0, 'tid': tid,
+                'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6,
+                'args': {'cpu_us': cpu_time * 1e6,
+                    'bytes_in': bytes_in, 'bytes_out': bytes_out}})
+
+        for start, end in self.scheduler_events:
+            events.append({
+                'name': 'schedule', 'cat': 'scheduler', 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6})
+
+        for name, tid in threads.items():
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': tid,
+                'args': {'name': name}})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+    def write_chrome_trace(self, filename: str) -> None:
+        import json
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def payload_size(data: Any) -> int:
+    """Estimates the size in bytes of message data.
+
+    Uses nbytes for arrays, and adds up the items of lists, tuples and
+    dicts. Other objects count for their own size only.
+    """
+    nbytes = getattr(data, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(data, (list, tuple)):
+        return sum(payload_size(item) for item in data)
+    if isinstance(data, dict):
+        return sum(payload_size(item) for item in data.values())
+    return sys.getsizeof(data)
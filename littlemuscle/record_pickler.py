@@ -0,0 +1,59 @@
+"""Pickling of conduit log records, with large arrays stored apart.
+
+This is used by recording.py, and kept separate so that importing the
+package does not import pickle and mmap.
+"""
+import mmap
+import os
+import pickle
+import sys
+from typing import Any, BinaryIO
+
+
+_ARRAY_TAG = 'littlemuscle.RecordedArray'
+_ALIGNMENT = 64
+
+
+def map_file(path: str) -> Any:
+    if os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class RecordingPickler(pickle.Pickler):
+    def __init__(self, records: BinaryIO, arrays: BinaryIO, min_array_size: int) -> None:
+        super().__init__(records, pickle.HIGHEST_PROTOCOL)
+        self.__arrays = arrays
+        self.__min_array_size = min_array_size
+
+
+    def persistent_id(self, obj: Any) -> Any:
+        # if NumPy has not been imported, there are no arrays to record
+        np = sys.modules.get('numpy')
+        if (np is None or not isinstance(obj, np.ndarray) or obj.dtype.hasobject
+                or obj.nbytes < self.__min_array_size):
+            return None
+
+        offset = self.__arrays.tell()
+        padding = -offset % _ALIGNMENT
+        self.__arrays.write(bytes(padding))
+        self.__arrays.write(np.ascontiguousarray(obj).data)
+        return (_ARRAY_TAG, offset + padding, obj.dtype, obj.shape)
+
+
+class RecordUnpickler(pickle.Unpickler):
+    def __init__(self, records: BinaryIO, arrays: Any) -> None:
+        super().__init__(records)
+        self.__arrays = arrays
+
+
+    def persistent_load(self, pid: Any) -> Any:
+        tag, offset, dtype, shape = pid
+        if tag != _ARRAY_TAG:
+            raise pickle.UnpicklingError('Unknown persistent id {}'.format(tag))
+        import numpy as np
+        count = 1
+        for extent in shape:
+            count *= extent
+        return np.frombuffer(self.__arrays, dtype, count, offset).reshape(shape)
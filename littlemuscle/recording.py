@@ -0,0 +1,132 @@
+from .message import Message
+from .model_execution_graph import ModelNode
+
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple
+
+
+Record = NamedTuple('Record', [
+        ('sender', str),
+        ('sending_endpoint', str),
+        ('receiver', str),
+        ('receiving_endpoint', str),
+        ('message', Message)])
+
+
+_RECORDS_SUFFIX = '.records'
+_ARRAYS_SUFFIX = '.arrays'
+
+
+class Recorder:
+    """Records all messages sent over conduits during a run.
+
+    Pass a Recorder to Simulation.run() or run_simulation(), and every
+    message delivered over a conduit is appended to a log in the given
+    directory. Use Simulation.replay() to run a single compute element
+    from the log later, or ConduitLog to read it.
+
+    The log is split into chunks of about chunk_size bytes. Each chunk
+    consists of a stream of pickled Records, and a file with the raw
+    contents of NumPy arrays in the messages that are at least
+    min_array_size bytes large. When reading the log, these arrays are
+    memory-mapped rather than loaded.
+
+    A log recorded earlier in the same directory is removed when the
+    Recorder is created, so that it does not mix with the new one.
+    """
+    def __init__(self,
+            directory: str,
+            chunk_size: int = 1 << 26,
+            min_array_size: int = 1 << 12
+            ) -> None:
+
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.min_array_size = min_array_size
+
+        self.__chunk = 0
+        self.__records = None   # type: BinaryIO
+        self.__arrays = None    # type: BinaryIO
+
+        os.makedirs(directory, exist_ok=True)
+        for chunk in _list_chunks(directory):
+            base = os.path.join(directory, chunk)
+            os.remove(base + _RECORDS_SUFFIX)
+            if os.path.exists(base + _ARRAYS_SUFFIX):
+                os.remove(base + _ARRAYS_SUFFIX)
+
+
+    def record_delivery(self, sender: ModelNode, sent_messages: Dict[str, Message]) -> None:
+        """Records the conduit messages among sent_messages."""
+        for endpoint, message in sent_messages.items():
+            if endpoint.startswith('__'):
+                continue
+            routes = [sender.routes[endpoint]]
+            if sender.taps is not None:
+                routes.extend(sender.taps.get(endpoint, ()))
+            for receiver, slot in routes:
+                self.record(Record(
+                    sender.element_name, endpoint,
+                    receiver.element_name, receiver.endpoint_names[slot],
+                    message))
+
+
+    def record(self, record: Record) -> None:
+        if self.__records is None or self.__chunk_full():
+            self.__next_chunk()
+        # pickle is slow to import, so record_pickler is only imported here
+        from .record_pickler import RecordingPickler
+        RecordingPickler(self.__records, self.__arrays, self.min_array_size).dump(record)
+
+
+    def close(self) -> None:
+        if self.__records is not None:
+            self.__records.close()
+            self.__arrays.close()
+            self.__records = None
+            self.__arrays = None
+
+
+    def __chunk_full(self) -> bool:
+        return self.__records.tell() + self.__arrays.tell() >= self.chunk_size
+
+
+    def __next_chunk(self) -> None:
+        self.close()
+        self.__chunk += 1
+        base = os.path.join(self.directory, '{:06d}'.format(self.__chunk))
+        self.__records = open(base + _RECORDS_SUFFIX, 'ab')
+        self.__arrays = open(base + _ARRAYS_SUFFIX, 'ab')
+
+
+class ConduitLog:
+    """Reads a log written by a Recorder."""
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+
+    def records(self, receiver: str = None) -> Iterator[Record]:
+        """Yields the recorded messages in order of delivery.
+
+        Args:
+            receiver: If given, yield only messages sent to the compute
+                element with this name.
+        """
+        from .record_pickler import RecordUnpickler, map_file
+        for chunk in _list_chunks(self.directory):
+            base = os.path.join(self.directory, chunk)
+            arrays = map_file(base + _ARRAYS_SUFFIX)
+            with open(base + _RECORDS_SUFFIX, 'rb') as records:
+                unpickler = RecordUnpickler(records, arrays)
+                while True:
+                    try:
+                        record = unpickler.load()
+                    except EOFError:
+                        break
+                    if receiver is None or record.receiver == receiver:
+                        yield record
+
+
+def _list_chunks(directory: str) -> List[str]:
+    return sorted(name[:-len(_RECORDS_SUFFIX)] for name in os.listdir(directory)
+            if name.endswith(_RECORDS_SUFFIX))
@@ -1,4 +1,19 @@
 class Scale():
-    def __init__(self, grain: float, extent: float):
+    def __init__(self,
+            grain: float, extent: float,
+            min_grain: float = None, max_grain: float = None):
+        """Create a Scale.
+
+        Args:
+            grain: Step size.
+            extent: Size of the whole domain. A time scale may have
+                None here, see TimeDrivenAdapter.
+            min_grain: Smallest step size to allow, for submodels that
+                choose their own steps.
+            max_grain: Largest step size to allow, for submodels that
+                choose their own steps.
+        """
         self.grain = grain
         self.extent = extent
+        self.min_grain = min_grain
+        self.max_grain = max_grain
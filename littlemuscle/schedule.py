@@ -0,0 +1,250 @@
+from .configuration import Configuration
+from .mapper import Mapper, MapperDescription
+from .message import Lazy, Message
+from .model_execution_graph import Inbox, ModelExecutionGraph, ModelNode
+from .operator import Operator
+from .simulation_engine import (
+        Outbox, _deliver_messages, _run_b, _run_dynamic, _run_f_init, _run_m, _run_o_f,
+        _run_o_i, _run_operator, _run_s, _start_simulation)
+from .submodel import SubmodelDescription, TimeDrivenSubmodel
+from .time_driven_adapter import TimeDrivenAdapter
+
+from array import array
+from collections import deque
+from functools import partial
+from overrides import overrides
+from typing import Any, Callable, Dict, FrozenSet, List, Tuple
+
+
+# receiver, slot, by sending endpoint
+Deliveries = Tuple[Tuple[str, ModelNode, int], ...]
+
+# node to run, its operator, endpoints it sends on, where those messages go
+Step = Tuple[ModelNode, Callable[[Inbox], Outbox], FrozenSet[str], Deliveries]
+
+
+class Schedule:
+    """The order in which a run will execute its operators.
+
+    Attributes:
+        steps: For each operator execution, the node to run, its
+            operator with the implementation and configuration bound to
+            it, and the endpoints it is expected to send messages on,
+            with the receiving node and slot for each.
+        queue_lengths: For each operator execution, the number of nodes
+            that are runnable after taking that node out of the ready
+            queue. Since the queue is FIFO, these are the nodes that
+            follow it in steps.
+    """
+    def __init__(self, steps: List[Step], queue_lengths: array) -> None:
+        self.steps = steps
+        self.queue_lengths = queue_lengths
+
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+
+def compile_schedule(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration]
+        ) -> Schedule:
+    """Computes the order of operator executions before a run.
+
+    This is possible if all submodels are TimeDrivenAdapters, because
+    their events then follow from their time scales, unless a submodel
+    converges early. The graph is run once with stand-ins that keep time
+    like the submodels but do no work and never converge, and the order
+    in which run_simulation() executes their operators is recorded.
+
+    Returns None if the graph contains a submodel of another kind, e.g.
+    an ensemble, or one without a time scale, or if a node would have to
+    be held back because a receiver is full, as the schedule could then
+    not be resumed dynamically.
+
+    Args:
+        graph: The model to run. It must not have been run yet.
+        configurations: Configuration for each compute element.
+    """
+    probes = {}     # type: Dict[str, Any]
+    for node in graph.nodes():
+        if node.element_name in probes:
+            continue
+        if isinstance(node.implementation, Mapper):
+            probes[node.element_name] = _MapperProbe(node.implementation.describe())
+        elif isinstance(node.implementation, TimeDrivenAdapter):
+            configuration = configurations.get(node.element_name)
+            if configuration is None or configuration.time_scale is None:
+                return None
+            probes[node.element_name] = TimeDrivenAdapter(
+                    _SubmodelProbe(node.implementation.describe()))
+        else:
+            return None
+
+    steps = []                  # type: List[Step]
+    queue_lengths = array('L')
+    operators = {}              # type: Dict[ModelNode, Callable[[Inbox], Outbox]]
+    interned = {}               # type: Dict[Tuple[ModelNode, Deliveries], Step]
+
+    ready = _start_simulation(graph)
+    while ready:
+        if ready[0].num_blocking:
+            graph.clear_inboxes()
+            return None
+        node = ready.popleft()
+        queue_lengths.append(len(ready))
+        sent_messages = _run_operator(
+                node.operator, probes[node.element_name],
+                configurations.get(node.element_name), node.take_messages())
+
+        deliveries = tuple((endpoint,) + node.routes[endpoint] for endpoint in sent_messages
+                if endpoint not in node.unconnected)
+        if node.taps is not None:
+            deliveries += tuple((endpoint,) + tap for endpoint in sent_messages
+                    for tap in node.taps.get(endpoint, ()))
+        step = interned.get((node, deliveries))
+        if step is None:
+            if node not in operators:
+                operators[node] = _bind_operator(node, configurations.get(node.element_name))
+            step = (node, operators[node], frozenset(sent_messages), deliveries)
+            interned[(node, deliveries)] = step
+        steps.append(step)
+
+        _deliver_messages(graph, node, sent_messages, ready)
+
+    graph.clear_inboxes()
+    return Schedule(steps, queue_lengths)
+
+
+def run_schedule(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration],
+        schedule: Schedule
+        ) -> None:
+    """Runs a simulation in a precomputed order.
+
+    This executes the operators in the order given by the schedule,
+    without checking which nodes are runnable. If an operator sends on
+    other endpoints than expected, e.g. because a submodel converged,
+    the ready queue is reconstructed from the schedule and the rest of
+    the run is scheduled dynamically, like in run_simulation(). Either
+    way, the result is the same as that of run_simulation().
+
+    The same graph and schedule can be used for several runs.
+
+    Args:
+        graph: The model to run, as passed to compile_schedule().
+        configurations: Configuration for each compute element.
+        schedule: The result of compile_schedule().
+    """
+    steps = schedule.steps
+    graph.clear_inboxes()
+    _start_simulation(graph)
+
+    for i, (node, operator, expected, deliveries) in enumerate(steps):
+        sent_messages = operator(node.take_messages())
+
+        if sent_messages.keys() != expected:
+            end = i + 1 + schedule.queue_lengths[i]
+            ready = deque(step[0] for step in steps[i + 1:end])
+            _deliver_messages(graph, node, sent_messages, ready)
+            _run_dynamic(graph, configurations, ready)
+            return
+
+        for endpoint, receiver, slot in deliveries:
+            message = sent_messages[endpoint]
+            if type(message.data) is Lazy:
+                message.data = message.data.value()
+                node.observations_evaluated += 1
+            receiver.post_message(slot, message)
+
+        if node.unconnected:
+            for endpoint in node.unconnected:
+                message = sent_messages.get(endpoint)
+                if message is not None and type(message.data) is Lazy:
+                    node.observations_skipped += 1
+
+        if node.finishes is not None:
+            for receiver, slot in node.finishes:
+                receiver.finish_sending(slot)
+
+
+def _bind_operator(node: ModelNode, configuration: Configuration) -> Callable[[Inbox], Outbox]:
+    """Returns a function that runs the node's operator on an inbox."""
+    implementation = node.implementation
+    if node.operator == Operator.F_INIT:
+        return partial(_run_f_init, configuration, implementation=implementation)
+    run = {
+            Operator.O_I: _run_o_i,
+            Operator.S: _run_s,
+            Operator.B: _run_b,
+            Operator.O_F: _run_o_f,
+            Operator.M: _run_m,
+            }[node.operator]
+    return partial(run, implementation=implementation)
+
+
+class _SubmodelProbe(TimeDrivenSubmodel):
+    """Stands in for a submodel while compiling a schedule."""
+    def __init__(self, description: SubmodelDescription) -> None:
+        self.__description = description
+        self.__intermediate = [endpoint.name for endpoint in description.endpoints
+                if endpoint.operator == Operator.O_I]
+        self.__final = [endpoint.name for endpoint in description.endpoints
+                if endpoint.operator == Operator.O_F]
+
+
+    @overrides
+    def describe(self) -> SubmodelDescription:
+        return self.__description
+
+
+    @overrides
+    def initialise_state(self,
+            configuration: Configuration,
+            initial_time: float,
+            input_messages: Dict[str, Message]
+            ) -> None:
+        pass
+
+
+    @overrides
+    def solve(self, time: float, input_messages: Dict[str, Message]) -> None:
+        pass
+
+
+    @overrides
+    def update_boundary_conditions(self,
+            time: float, input_messages: Dict[str, Message]) -> None:
+        pass
+
+
+    @overrides
+    def has_converged(self) -> bool:
+        return False
+
+
+    @overrides
+    def observe_intermediate_state(self) -> Dict[str, Any]:
+        return {name: None for name in self.__intermediate}
+
+
+    @overrides
+    def observe_final_state(self) -> Dict[str, Any]:
+        return {name: None for name in self.__final}
+
+
+class _MapperProbe(Mapper):
+    """Stands in for a mapper while compiling a schedule."""
+    def __init__(self, description: MapperDescription) -> None:
+        self.__description = description
+
+
+    @overrides
+    def describe(self) -> MapperDescription:
+        return self.__description
+
+
+    @overrides
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        return {endpoint.name: None for endpoint in self.__description.outputs}
@@ -0,0 +1,134 @@
+from .transport import PickleTransport
+
+from copy import copy
+from io import BytesIO
+from multiprocessing.connection import Connection
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any, Tuple
+
+import numpy as np
+
+
+class SharedArray:
+    """Describes an array stored in a shared memory-mapped file."""
+    __slots__ = ('path', 'dtype', 'shape')
+
+    def __init__(self, path: str, dtype: np.dtype, shape: Tuple[int, ...]) -> None:
+        self.path = path
+        self.dtype = dtype
+        self.shape = shape
+
+
+class SharedMemoryTransport(PickleTransport):
+    """Sends large NumPy arrays between processes via shared memory.
+
+    Arrays of at least min_size bytes are copied once into a file in
+    shared memory (/dev/shm where available), and only a SharedArray
+    descriptor is pickled and sent. The main process routes descriptors
+    without looking at the data. The receiving worker maps the file
+    and gives the submodel a read-only view of it, without copying.
+
+    Every message is delivered exactly once, so the receiver removes the
+    file as soon as it has mapped it. The memory is released when the
+    last view of the array is gone. Files of messages that were never
+    delivered are removed by close().
+    """
+    shares_memory = True
+
+
+    def __init__(self, min_size: int = 1 << 20, directory: str = None) -> None:
+        """Create a SharedMemoryTransport.
+
+        Args:
+            min_size: Minimum size in bytes of arrays to be shared.
+                Smaller arrays are pickled as usual.
+            directory: Where to create the shared files. Defaults to a
+                new directory in /dev/shm, or in the system temporary
+                directory if there is no /dev/shm.
+        """
+        if directory is None and os.path.isdir('/dev/shm'):
+            directory = '/dev/shm'
+
+        self.min_size = max(min_size, 1)
+        self.directory = tempfile.mkdtemp(prefix='littlemuscle-', dir=directory)
+        self._attach = False
+        self._owner = True
+
+
+    def send(self, connection: Connection, obj: Any) -> None:
+        buf = BytesIO()
+        _SharingPickler(buf, self).dump(obj)
+        connection.send_bytes(buf.getbuffer())
+
+
+    def receive(self, connection: Connection) -> Any:
+        buf = BytesIO(connection.recv_bytes())
+        return _AttachingUnpickler(buf, self._attach).load()
+
+
+    def for_worker(self) -> 'SharedMemoryTransport':
+        worker_transport = copy(self)
+        worker_transport._attach = True
+        worker_transport._owner = False
+        return worker_transport
+
+
+    def close(self) -> None:
+        if self._owner:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def _share(self, array: np.ndarray) -> SharedArray:
+        fd, path = tempfile.mkstemp(suffix='.array', dir=self.directory)
+        try:
+            os.ftruncate(fd, array.nbytes)
+            with mmap.mmap(fd, array.nbytes) as buf:
+                shared = np.ndarray(array.shape, array.dtype, buffer=buf)
+                shared[...] = array
+                del shared
+        finally:
+            os.close(fd)
+        return SharedArray(path, array.dtype, array.shape)
+
+
+_PERSISTENT_TAG = 'littlemuscle.SharedArray'
+
+
+class _SharingPickler(pickle.Pickler):
+    def __init__(self, file: BytesIO, transport: SharedMemoryTransport) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.__transport = transport
+
+
+    def persistent_id(self, obj: Any) -> Any:
+        if (isinstance(obj, np.ndarray) and not obj.dtype.hasobject
+                and obj.nbytes >= self.__transport.min_size):
+            obj = self.__transport._share(obj)
+
+        if isinstance(obj, SharedArray):
+            return (_PERSISTENT_TAG, obj.path, obj.dtype, obj.shape)
+        return None
+
+
+class _AttachingUnpickler(pickle.Unpickler):
+    def __init__(self, file: BytesIO, attach: bool) -> None:
+        super().__init__(file)
+        self.__attach = attach
+
+
+    def persistent_load(self, pid: Any) -> Any:
+        tag, path, dtype, shape = pid
+        if tag != _PERSISTENT_TAG:
+            raise pickle.UnpicklingError('Unknown persistent id {}'.format(tag))
+
+        if not self.__attach:
+            return SharedArray(path, dtype, shape)
+
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        os.unlink(path)
+        return np.frombuffer(buf, dtype).reshape(shape)
@@ -1,14 +1,31 @@
+from .analysis import (
+        check_graph, check_message_counts, describe_waiting_nodes, find_waiting_nodes)
+from .checkpoint import Checkpointer
 from .configuration import Configuration
+from .ensemble import Ensemble
+from .interpolation import Interpolation
+from .mapper import Mapper
+from .memoization import CachedSubmodel, ResultCache
 from .message import Message
 from .model import ComputeElement, Conduit, Endpoint, KindOfComputeElement
 from .model_execution_graph import ModelExecutionGraph
-from .model_graph_plotter import plot_model_graph
 from .operator import Operator
-from .simulation_engine import run_simulation
-from .submodel import Scale, Submodel, SubmodelDescription, TimeDrivenSubmodel
+from .profiler import Profiler
+from .recording import ConduitLog, Recorder
+from .schedule import Schedule, compile_schedule, run_schedule
+from .simulation_engine import replay_simulation, run_simulation
+from .sink import Sink
+from .submodel import (
+        BatchedTimeDrivenSubmodel, Scale, Submodel, SubmodelDescription,
+        TimeDrivenSubmodel)
 from .time_driven_adapter import TimeDrivenAdapter
 
-from typing import List
+import os
+from typing import Any, Dict, List, Tuple, TYPE_CHECKING, Union
+import warnings
+
+if TYPE_CHECKING:
+    from .transport import PickleTransport
 
 
 class Simulation:
@@ -16,58 +33,553 @@ class Simulation:
         self.__compute_elements = []    # type: List[ComputeElement]
         self.__conduits = []            # type: List[Conduit]
         self.__configurations = {}       # type: Dict[str, Configuration]
+        self.__sinks = []               # type: List[Sink]
+        self.__simulations = {}         # type: Dict[str, Simulation]
+        self.__exports = {}             # type: Dict[str, Tuple[str, Endpoint]]
+        self.__submodels = {}           # type: Dict[str, Any]
+
+        # incremented on every change, to know when to rebuild the graph
+        self.__version = 0
+        self.__graph = None             # type: ModelExecutionGraph
+        self.__graph_stamp = None       # type: tuple
+        self.__flat_configurations = {} # type: Dict[str, Configuration]
+        self.__flat_sinks = []          # type: List[Sink]
+        self.__schedule = None          # type: Schedule
+        self.__schedule_compiled = False
+
 
+    def add_submodel(self,
+            name: str,
+            submodel: TimeDrivenSubmodel,
+            cache: ResultCache = None
+            ) -> None:
+        """Add a submodel.
 
-    def add_submodel(self, name: str, submodel: TimeDrivenSubmodel) -> None:
+        Args:
+            name: Name of the compute element.
+            submodel: The submodel to add.
+            cache: If given, reuse results of previous runs of the
+                submodel with the same inputs from this cache. See
+                ResultCache.
+        """
+        self.__submodels[name] = submodel
         if isinstance(submodel, TimeDrivenSubmodel):
             submodel = TimeDrivenAdapter(submodel)
+        if cache is not None:
+            submodel = CachedSubmodel(submodel, cache)
 
         description = submodel.describe()
         new_model = ComputeElement(KindOfComputeElement.SUBMODEL, name, description.endpoints, submodel)
         self.__compute_elements.append(new_model)
+        self.__version += 1
+
+
+    def add_ensemble(self,
+            name: str,
+            submodels: Union[List[TimeDrivenSubmodel], BatchedTimeDrivenSubmodel],
+            num_processes: int = 1
+            ) -> None:
+        """Add an ensemble of instances of a submodel.
+
+        The ensemble is a single compute element. Messages sent to it
+        must contain a sequence with an item for each instance, which is
+        scattered over the instances, and messages it sends contain the
+        gathered data of all instances. See Ensemble.
+
+        Args:
+            name: Name of the compute element.
+            submodels: Either a list of instances of a submodel, or a
+                BatchedTimeDrivenSubmodel that implements all of them.
+            num_processes: Number of processes to divide a list of
+                instances over.
+        """
+        self.__submodels[name] = submodels
+        if isinstance(submodels, BatchedTimeDrivenSubmodel):
+            submodel = TimeDrivenAdapter(submodels)
+        else:
+            submodel = Ensemble([
+                    TimeDrivenAdapter(instance)
+                    if isinstance(instance, TimeDrivenSubmodel) else instance
+                    for instance in submodels], num_processes)
+
+        description = submodel.describe()
+        new_model = ComputeElement(KindOfComputeElement.ENSEMBLE, name, description.endpoints, submodel)
+        self.__compute_elements.append(new_model)
+        self.__version += 1
+
+
+    def add_mapper(self, name: str, mapper: Mapper) -> None:
+        """Add a mapper.
+
+        Args:
+            name: Name of the compute element.
+            mapper: The mapper to add, e.g. one of those in
+                numpy_mappers.
+        """
+        self.__submodels[name] = mapper
+        description = mapper.describe()
+        new_model = ComputeElement(KindOfComputeElement.MAPPER, name, description.endpoints, mapper)
+        self.__compute_elements.append(new_model)
+        self.__version += 1
+
+
+    def add_simulation(self, name: str, simulation: 'Simulation') -> None:
+        """Add another Simulation as a part of this one.
+
+        Endpoints that the nested simulation exports with
+        export_endpoint() can be connected with add_conduit() as if the
+        nested simulation were a compute element called name. For
+        running, nested simulations are flattened: their compute
+        elements become elements of this one, named name.element, so
+        nesting costs nothing at run time. Their configurations can be
+        overridden with set_configuration() using those names.
+
+        A Simulation can be added only once, as its submodels cannot be
+        shared. A ValueError is raised if it was added already, or if
+        name is already used by an element or nested simulation.
+        """
+        if simulation is self:
+            raise ValueError('A Simulation cannot be added to itself')
+        for nested_name, nested in self.__simulations.items():
+            if nested is simulation:
+                raise ValueError('Simulation {} was already added as {}'.format(
+                    name, nested_name))
+        if name in self.__simulations or any(
+                element.name == name for element in self.__compute_elements):
+            raise ValueError('There is already an element named {}'.format(name))
+        self.__simulations[name] = simulation
+        self.__version += 1
+
+
+    def export_endpoint(self, name: str, compute_element: str, endpoint: str) -> None:
+        """Make an endpoint available to a Simulation this one is added to.
+
+        Args:
+            name: Name to make the endpoint available under.
+            compute_element: Element, or nested simulation, that has
+                the endpoint.
+            endpoint: Name of the endpoint on that element.
+        """
+        self.__verify_element_exists(compute_element)
+        self.__exports[name] = self.__find_endpoint(compute_element, endpoint)
+        self.__version += 1
+
+
+    def add_sink(self,
+            name: str, sink: Sink,
+            from_compute_element: str, from_endpoint: str
+            ) -> None:
+        """Add a Sink, and connect it to a sending endpoint.
+
+        The endpoint may also be connected to another element, or to
+        other sinks, which then all receive the messages sent on it.
+
+        Args:
+            name: Name of the sink's compute element.
+            sink: The Sink to write the messages with.
+            from_compute_element: Element to record messages from.
+            from_endpoint: Endpoint on that element to record.
+        """
+        self.__verify_element_exists(from_compute_element)
+        from_compute_element, from_endpoint = self.__find_endpoint(
+                from_compute_element, from_endpoint)
+
+        self.add_mapper(name, sink)
+        _, to_endpoint = self.__find_endpoint(name, 'in')
+        self.__conduits.append(Conduit(
+                from_compute_element, from_endpoint, name, to_endpoint, tap=True))
+        self.__sinks.append(sink)
+        self.__version += 1
 
 
     def add_conduit(self,
             from_compute_element: str, from_endpoint: str,
-            to_compute_element: str, to_endpoint: str
+            to_compute_element: str, to_endpoint: str,
+            depth: int = 1,
+            interpolation: Interpolation = None
             ) -> None:
+        """Connect a sending endpoint to a receiving endpoint.
+
+        Args:
+            depth: How many messages the receiving endpoint can hold.
+                With a depth of k, the sender can send up to k messages
+                before the receiver has received the first, e.g. so that
+                a fast submodel can run ahead of a slow one when running
+                in parallel. The sender then waits until the receiver
+                has received one. Messages are received in the order in
+                which they were sent.
+            interpolation: If given, the receiver gets a message at each
+                of its events, with the data at that time, held or
+                interpolated from the depth most recent messages sent,
+                see Interpolation. This couples submodels with different
+                time scales without either adapting its steps to the
+                other. Only for endpoints on S or B, and LINEAR needs a
+                depth of at least 2.
+        """
+        if depth < 1:
+            raise ValueError('The depth of a conduit must be at least 1')
+        if interpolation == Interpolation.LINEAR and depth < 2:
+            raise ValueError('Linear interpolation needs a conduit depth of at least 2')
 
         self.__verify_element_exists(from_compute_element)
         self.__verify_element_exists(to_compute_element)
 
-        from_endpoint = self.__find_endpoint(from_compute_element, from_endpoint)
-        to_endpoint = self.__find_endpoint(to_compute_element, to_endpoint)
+        from_compute_element, from_endpoint = self.__find_endpoint(
+                from_compute_element, from_endpoint)
+        to_compute_element, to_endpoint = self.__find_endpoint(
+                to_compute_element, to_endpoint)
+        if interpolation is not None and to_endpoint.operator not in (Operator.S, Operator.B):
+            raise ValueError('Interpolation is only supported for endpoints on S or B')
 
-        new_conduit = Conduit(from_compute_element, from_endpoint, to_compute_element, to_endpoint)
+        new_conduit = Conduit(
+                from_compute_element, from_endpoint, to_compute_element, to_endpoint,
+                depth, interpolation)
         self.__conduits.append(new_conduit)
+        self.__version += 1
 
 
     def set_configuration(self, compute_element: str, configuration: Configuration) -> None:
         self.__verify_element_exists(compute_element)
         self.__configurations[compute_element] = configuration
+        self.__version += 1
+
+
+    def get_configuration(self, compute_element: str) -> Configuration:
+        """Returns the configuration an element will run with, if any."""
+        self.__verify_element_exists(compute_element)
+        if compute_element in self.__configurations:
+            return self.__configurations[compute_element]
+        simulation_name, _, rest = compute_element.partition('.')
+        if simulation_name in self.__simulations:
+            return self.__simulations[simulation_name].get_configuration(rest)
+        return None
+
+
+    def get_submodel(self, compute_element: str) -> Any:
+        """Returns the submodel, ensemble or mapper added as an element.
+
+        Nested elements can be found as simulation.element. After a
+        parallel run, these objects are not updated, see
+        run_simulation_parallel().
+        """
+        self.__verify_element_exists(compute_element)
+        if compute_element in self.__submodels:
+            return self.__submodels[compute_element]
+        simulation_name, _, rest = compute_element.partition('.')
+        return self.__simulations[simulation_name].get_submodel(rest)
+
+
+    def observation_counts(self) -> Dict[str, Tuple[int, int]]:
+        """Returns how many Lazy observations the last run evaluated.
 
+        Observations and mapper outputs given as a Lazy are only
+        evaluated if they are sent on a connected endpoint, and skipped
+        otherwise, see Lazy.
 
-    def run(self) -> None:
-        graph = ModelExecutionGraph(self.__compute_elements, self.__conduits)
-        plot_model_graph(graph)
+        Returns:
+            For each compute element, with nested ones as
+            simulation.element, the number of Lazy observations that
+            were evaluated and the number that were skipped.
+        """
+        counts = {}     # type: Dict[str, Tuple[int, int]]
+        if self.__graph is None:
+            return counts
+        for node in self.__graph.nodes():
+            evaluated, skipped = counts.get(node.element_name, (0, 0))
+            counts[node.element_name] = (
+                    evaluated + node.observations_evaluated,
+                    skipped + node.observations_skipped)
+        return counts
 
-        run_simulation(graph, self.__configurations)
+
+    def cache_results(self, directory: str) -> None:
+        """Reuse results of submodels from earlier runs.
+
+        Gives each submodel that can be cached (see CachedSubmodel) and
+        does not have a cache yet a ResultCache that stores its results
+        in a subdirectory of directory, named after the element and the
+        class of the submodel, or of the instances of an ensemble. Runs
+        of the same model with a different configuration for some
+        elements, e.g. in a parameter sweep, then recompute only those
+        elements and the ones that receive different inputs because of
+        them. Includes nested simulations.
+        """
+        for element in self.__compute_elements:
+            if element.kind == KindOfComputeElement.MAPPER:
+                continue
+            if isinstance(element.implementation, CachedSubmodel):
+                continue
+            if any(endpoint.operator not in (Operator.F_INIT, Operator.O_F)
+                    for endpoint in element.endpoints):
+                continue
+            submodel = self.__submodels[element.name]
+            if isinstance(submodel, list):
+                class_name = 'ensemble_of_' + '+'.join(sorted(set(
+                        _class_name(instance) for instance in submodel)))
+            else:
+                class_name = _class_name(submodel)
+            cache = ResultCache(directory=os.path.join(directory, element.name, class_name))
+            element.implementation = CachedSubmodel(element.implementation, cache)
+
+        for name, simulation in self.__simulations.items():
+            simulation.cache_results(os.path.join(directory, name))
+        self.__version += 1
+
+
+    def run(self,
+            parallel: bool = False,
+            transport: 'PickleTransport' = None,
+            profiler: Profiler = None,
+            checkpointer: Checkpointer = None,
+            resume_from: str = None,
+            recorder: Recorder = None,
+            static_schedule: bool = False,
+            asynchronous: bool = False
+            ) -> None:
+        """Run the simulation.
+
+        This does not plot or otherwise need a display, so it can be used
+        on headless machines. Use plot() to visualise the model.
+
+        Before running, the model is checked for operators that could
+        never run (see check_graph()), and a RuntimeError is raised if
+        there are any. Endpoints that may be sent too few messages (see
+        check_message_counts()) give a RuntimeWarning, as the receiver
+        may still converge before it runs out. A RuntimeError is raised
+        if elements were left waiting for messages in the middle of
+        their run at the end, naming them and the endpoints they were
+        waiting on. Messages left over for elements that finished give
+        a RuntimeWarning.
+
+        Args:
+            parallel: If True, run each compute element in a separate
+                process, executing independent submodels concurrently.
+                See run_simulation_parallel().
+            transport: How to send messages between processes when
+                running in parallel, e.g. a SharedMemoryTransport. One
+                that shares memory cannot be used with interpolating
+                conduits, which serve messages more than once.
+            profiler: A Profiler to record timings in. Only supported
+                when not running in parallel.
+            checkpointer: A Checkpointer to periodically save the state
+                of the simulation with. Only supported when not running
+                in parallel.
+            resume_from: Path of a checkpoint written by a Checkpointer,
+                or a directory of them to use the latest, to continue
+                a previous run from.
+            recorder: A Recorder to record all messages sent over
+                conduits with, for use with replay(). Only supported
+                when not running in parallel.
+            static_schedule: If True, and all submodels are time driven,
+                compute the order of operator executions up front and
+                run in that order, which saves scheduling overhead for
+                cheap submodels. See compile_schedule(). Compiling takes
+                about as long as a run with no-op submodels, so the
+                schedule is kept for later runs, until the Simulation
+                is changed. Not supported together with other options.
+            asynchronous: If True, run with an asyncio event loop, so
+                that submodels with async methods can wait concurrently.
+                See simulate_async(). Not supported together with other
+                options.
+        """
+        graph, configurations, sinks = self.__execution_graph()
+        graph.reset_observation_counts()
+
+        if transport is not None and not parallel:
+            raise ValueError('A transport can only be used with parallel=True')
+        if profiler is not None and parallel:
+            raise ValueError('A profiler cannot be used with parallel=True')
+        if (checkpointer is not None or resume_from is not None) and parallel:
+            raise ValueError('Checkpointing is not supported with parallel=True')
+        if recorder is not None and parallel:
+            raise ValueError('Recording is not supported with parallel=True')
+        if static_schedule and (parallel or profiler is not None or checkpointer is not None
+                or resume_from is not None or recorder is not None):
+            raise ValueError('A static schedule cannot be combined with other options')
+        if sinks and parallel:
+            raise ValueError('Sinks are not supported with parallel=True')
+        if transport is not None and transport.shares_memory \
+                and any(node.adapters is not None for node in graph):
+            raise ValueError('Interpolating conduits cannot be used with a transport'
+                    ' that shares memory')
+        if asynchronous and (parallel or profiler is not None or checkpointer is not None
+                or resume_from is not None or recorder is not None or static_schedule):
+            raise ValueError('Running asynchronously cannot be combined with other options')
+
+        try:
+            if static_schedule:
+                if not self.__schedule_compiled:
+                    self.__schedule = compile_schedule(graph, configurations)
+                    self.__schedule_compiled = True
+                if self.__schedule is not None:
+                    run_schedule(graph, configurations, self.__schedule)
+                else:
+                    run_simulation(graph, configurations)
+            elif parallel:
+                # this imports multiprocessing, which is slow, so only do it here
+                from .parallel_engine import run_simulation_parallel
+                run_simulation_parallel(graph, configurations, transport)
+            elif asynchronous:
+                # this imports asyncio, which is slow, so only do it here
+                from .async_engine import run_simulation_async
+                run_simulation_async(graph, configurations)
+            else:
+                run_simulation(graph, configurations,
+                        profiler, checkpointer, resume_from, recorder)
+
+            unfinished, leftover = find_waiting_nodes(graph)
+            if unfinished:
+                raise RuntimeError('The simulation stopped with operators waiting: {}'.format(
+                    describe_waiting_nodes(unfinished)))
+            if leftover:
+                warnings.warn('Messages were left unused by operators that finished: {}'.format(
+                    describe_waiting_nodes(leftover)), RuntimeWarning)
+        finally:
+            for sink in sinks:
+                sink.close()
+
+
+    def replay(self, compute_element: str, log_directory: str) -> None:
+        """Run a single compute element on recorded inputs.
+
+        Runs only the given compute element, feeding it the messages it
+        received in a run that was recorded with a Recorder. Messages it
+        sends are dropped. Other compute elements and conduits may be
+        left out of this Simulation, their submodels are not needed.
+        Elements that receive over interpolating conduits cannot be
+        replayed, as the log holds the messages as they were sent.
+
+        Args:
+            compute_element: Name of the element to run.
+            log_directory: Directory the Recorder wrote to.
+        """
+        elements, conduits, configurations, _ = self.__flatten('')
+        elements = [e for e in elements if e.name == compute_element]
+        if not elements:
+            raise RuntimeError('Element with name {} not found'.format(compute_element))
+        if any(c.to_compute_element == compute_element and c.interpolation is not None
+                for c in conduits):
+            raise RuntimeError('Element {} receives over an interpolating conduit, and'
+                    ' cannot be replayed'.format(compute_element))
+        graph = ModelExecutionGraph(elements, [], check_connected=False)
+        replay_simulation(graph, configurations, ConduitLog(log_directory))
+
+
+    def plot(self, filename: str = None) -> None:
+        """Plot the model execution graph.
+
+        This imports matplotlib, which is slow, so it is only done here.
+
+        Args:
+            filename: File to save the plot to. If None, the plot is
+                shown on screen instead.
+        """
+        from .model_graph_plotter import plot_model_graph
+
+        graph, _, _ = self.__execution_graph()
+        plot_model_graph(graph, filename)
+
+
+    def __execution_graph(self) -> Tuple[ModelExecutionGraph, Dict[str, Configuration], List[Sink]]:
+        """Returns the flattened graph, configurations and sinks.
+
+        The graph is built once and reused for later runs, until this
+        Simulation or one of its nested simulations is changed.
+        """
+        stamp = self.__stamp()
+        if self.__graph is not None and self.__graph_stamp == stamp:
+            self.__graph.clear_inboxes()
+        else:
+            elements, conduits, configurations, sinks = self.__flatten('')
+            graph = ModelExecutionGraph(elements, conduits)
+            problems = check_graph(graph)
+            if problems:
+                raise RuntimeError('The simulation would not run to completion:\n{}'.format(
+                    '\n'.join(problems)))
+            mismatches = check_message_counts(graph, configurations)
+            if mismatches:
+                warnings.warn('The simulation may not run to completion:\n{}'.format(
+                    '\n'.join(mismatches)), RuntimeWarning)
+            self.__graph = graph
+            self.__graph_stamp = stamp
+            self.__flat_configurations = configurations
+            self.__flat_sinks = sinks
+            self.__schedule = None
+            self.__schedule_compiled = False
+        return self.__graph, self.__flat_configurations, self.__flat_sinks
+
+
+    def __stamp(self) -> tuple:
+        return (self.__version,) + tuple(
+                simulation.__stamp() for simulation in self.__simulations.values())
+
+
+    def __flatten(self, prefix: str) -> Tuple[
+            List[ComputeElement], List[Conduit], Dict[str, Configuration], List[Sink]]:
+        """Returns the elements, conduits, configurations and sinks of
+        this simulation and the ones nested in it, with names prefixed.
+        """
+        elements = [
+                ComputeElement(e.kind, prefix + e.name, e.endpoints, e.implementation)
+                for e in self.__compute_elements]
+        conduits = [
+                Conduit(prefix + c.from_compute_element, c.from_endpoint,
+                    prefix + c.to_compute_element, c.to_endpoint, c.depth, c.interpolation,
+                    c.tap)
+                for c in self.__conduits]
+        configurations = {}     # type: Dict[str, Configuration]
+        sinks = list(self.__sinks)
+
+        for name, simulation in self.__simulations.items():
+            nested = simulation.__flatten('{}{}.'.format(prefix, name))
+            elements.extend(nested[0])
+            conduits.extend(nested[1])
+            configurations.update(nested[2])
+            sinks.extend(nested[3])
+
+        for name, configuration in self.__configurations.items():
+            configurations[prefix + name] = configuration
+
+        return elements, conduits, configurations, sinks
+
+
+    def __has_element(self, element_name: str) -> bool:
+        if element_name in self.__simulations:
+            return True
+        if any(e.name == element_name for e in self.__compute_elements):
+            return True
+        simulation_name, _, rest = element_name.partition('.')
+        simulation = self.__simulations.get(simulation_name)
+        return simulation is not None and simulation.__has_element(rest)
 
 
     def __verify_element_exists(self, element_name: str) -> None:
-        element_names = [e.name for e in self.__compute_elements]
-        if element_name not in element_names:
+        if not self.__has_element(element_name):
             raise RuntimeError(
                     ('Element with name {} not found').format(element_name))
 
 
-    def __find_endpoint(self, element_name: str, endpoint_name: str) -> Endpoint:
+    def __find_endpoint(self, element_name: str, endpoint_name: str) -> Tuple[str, Endpoint]:
+        """Returns the element that actually has the endpoint, and the
+        endpoint. For nested simulations, this is one of their elements.
+        """
+        if element_name in self.__simulations:
+            exports = self.__simulations[element_name].__exports
+            if endpoint_name in exports:
+                path, endpoint = exports[endpoint_name]
+                return '{}.{}'.format(element_name, path), endpoint
+
         for element in self.__compute_elements:
             if element.name != element_name:
                 continue
             for endpoint in element.endpoints:
                 if endpoint.name == endpoint_name:
-                    return endpoint
+                    return element_name, endpoint
         raise RuntimeError(
                 'Endpoint with name {} not found on element {}'.format(
                     endpoint_name, element_name))
+
+
+def _class_name(obj: Any) -> str:
+    return '{}.{}'.format(type(obj).__module__, type(obj).__qualname__)
+
@@ -1,51 +1,212 @@
+from .analysis import describe_waiting_nodes, find_waiting_nodes, node_name
+from .checkpoint import Checkpointer, load_checkpoint
 from .configuration import Configuration
-from .message import Message
-from .model_execution_graph import Inbox, ModelExecutionGraph, ModelNode
+from .mapper import Mapper
+from .message import Lazy, Message
+from .model_execution_graph import Inbox, ModelExecutionGraph, ModelNode, STATE_SLOT
 from .operator import Operator
+from .profiler import Profiler
+from .recording import ConduitLog, Recorder
 from .submodel import Submodel
 
-from typing import Dict
+from collections import deque
+from time import perf_counter, process_time
+from typing import Any, Deque, Dict, Tuple, Union
+
+
+Outbox = Dict[str, Message]
+
+# cur_event, next_event and repeat of an operator that is running
+Events = Tuple[float, float, bool]
+
+ReadyQueue = Deque[ModelNode]
 
 
 def run_simulation(
         graph: ModelExecutionGraph,
-        configurations: Dict[str, Configuration]
+        configurations: Dict[str, Configuration],
+        profiler: Profiler = None,
+        checkpointer: Checkpointer = None,
+        resume_from: str = None,
+        recorder: Recorder = None
         ) -> None:
+    """Run a simulation.
+
+    Args:
+        graph: The model to run.
+        configurations: Configuration for each compute element.
+        profiler: If given, record timings in it.
+        checkpointer: If given, write checkpoints using it.
+        resume_from: A checkpoint (or directory with checkpoints) to
+            continue from, instead of starting from the beginning.
+        recorder: If given, record all conduit traffic using it.
+    """
+    if resume_from is not None:
+        ready, simulated_time = load_checkpoint(graph, resume_from)
+    else:
+        ready, simulated_time = _start_simulation(graph), 0.0
+
+    if profiler is not None or checkpointer is not None or recorder is not None:
+        _run_instrumented(graph, configurations, ready,
+                profiler, checkpointer, recorder, simulated_time)
+        return
+
+    _run_dynamic(graph, configurations, ready)
 
-    for node in graph.nodes():
-        if node.operator == Operator.F_INIT:
-            node.post_message('', Message(0.0, 0.0, False))
 
-    node = _find_runnable_node(graph)
-    while node:
+def _run_dynamic(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration],
+        ready: ReadyQueue
+        ) -> None:
+    """Runs nodes from the ready queue until it is empty."""
+    blocked = deque()   # type: ReadyQueue
+    while ready or blocked:
+        node = _next_node(graph, ready, blocked)
+        sent_messages = _run_operator(
+                node.operator, node.implementation,
+                configurations.get(node.element_name), node.take_messages())
+        _deliver_messages(graph, node, sent_messages, ready)
+
+
+def _run_instrumented(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration],
+        ready: ReadyQueue,
+        profiler: Profiler,
+        checkpointer: Checkpointer,
+        recorder: Recorder,
+        simulated_time: float
+        ) -> None:
+    """Like the loop in run_simulation(), but profiles, checkpoints and
+    records.
+
+    This is a separate loop so that a normal run does not pay for any
+    of the measurements and checks.
+    """
+    if checkpointer is not None:
+        checkpointer.start(simulated_time)
+
+    blocked = deque()   # type: ReadyQueue
+    while ready or blocked:
+        scheduling_start = perf_counter()
+        node = _next_node(graph, ready, blocked)
         received_messages = node.take_messages()
-        if node.operator == Operator.F_INIT:
-            conf = configurations[node.element_name]
-            sent_messages = _run_f_init(conf, received_messages, node.implementation)
-        elif node.operator == Operator.O_I:
-            sent_messages = _run_o_i(received_messages, node.implementation)
-        elif node.operator == Operator.S:
-            sent_messages = _run_s(received_messages, node.implementation)
-        elif node.operator == Operator.B:
-            sent_messages = _run_b(received_messages, node.implementation)
-        elif node.operator == Operator.O_F:
-            sent_messages = _run_o_f(received_messages, node.implementation)
-
-        _deliver_messages(graph, node, sent_messages)
-        node = _find_runnable_node(graph)
-
-
-def _find_runnable_node(graph: ModelExecutionGraph) -> ModelNode:
+
+        start = perf_counter()
+        cpu_start = process_time()
+        sent_messages = _run_operator(
+                node.operator, node.implementation,
+                configurations.get(node.element_name), received_messages)
+        cpu_time = process_time() - cpu_start
+        end = perf_counter()
+
+        _deliver_messages(graph, node, sent_messages, ready)
+        delivered = perf_counter()
+
+        if profiler is not None:
+            profiler.record_scheduling(scheduling_start, start)
+            profiler.record_operator(node, received_messages, sent_messages, start, end, cpu_time)
+            profiler.record_scheduling(end, delivered)
+
+        if recorder is not None:
+            recorder.record_delivery(node, sent_messages)
+
+        if checkpointer is not None:
+            for message in sent_messages.values():
+                simulated_time = max(simulated_time, message.time)
+            if checkpointer.is_due(simulated_time):
+                checkpointer.write(graph, blocked + ready, simulated_time)
+
+    if recorder is not None:
+        recorder.close()
+
+
+def replay_simulation(
+        graph: ModelExecutionGraph,
+        configurations: Dict[str, Configuration],
+        log: ConduitLog
+        ) -> None:
+    """Run part of a model, with inputs from a recorded run.
+
+    The graph contains only the compute elements to be run, and is built
+    without checking that all endpoints are connected. Messages that
+    were sent to these elements by other elements during the recorded
+    run are taken from the log, and messages sent to elements that are
+    not in the graph are dropped.
+
+    A recorded message is delivered only when none of the nodes in the
+    graph can run, so that it arrives after everything that preceded it
+    in the original run.
+    """
+    elements = set()
+    targets = {}
     for node in graph.nodes():
-        if node.inbox_full():
-            return node
-    return None
+        elements.add(node.element_name)
+        for name, slot in node.slot_indices.items():
+            if name != '':
+                targets[(node.element_name, name)] = (node, slot)
+
+    records = (record for record in log.records()
+            if record.receiver in elements and record.sender not in elements)
+
+    ready = _start_simulation(graph)
+    blocked = deque()   # type: ReadyQueue
+    while True:
+        while ready or blocked:
+            node = _next_node(graph, ready, blocked)
+            sent_messages = _run_operator(
+                    node.operator, node.implementation,
+                    configurations.get(node.element_name), node.take_messages())
+            _deliver_messages(graph, node, sent_messages, ready)
+
+        record = next(records, None)
+        if record is None:
+            return
+        try:
+            node, slot = targets[(record.receiver, record.receiving_endpoint)]
+        except KeyError:
+            raise RuntimeError('Recorded message for unknown endpoint {}.{}'.format(
+                record.receiver, record.receiving_endpoint))
+        if node.post_message(slot, record.message):
+            ready.append(node)
+
+
+def _start_simulation(graph: ModelExecutionGraph) -> ReadyQueue:
+    """Posts the initial state messages, returns the runnable nodes."""
+    ready = deque()     # type: ReadyQueue
+    for node in graph.nodes():
+        if node.operator == Operator.F_INIT:
+            if node.post_message(STATE_SLOT, Message(0.0, 0.0, False)):
+                ready.append(node)
+    return ready
+
+
+def _run_operator(
+        operator: Operator,
+        implementation: Union[Submodel, Mapper],
+        configuration: Configuration,
+        received_messages: Inbox
+        ) -> Outbox:
+
+    if operator == Operator.F_INIT:
+        return _run_f_init(configuration, received_messages, implementation)
+    elif operator == Operator.O_I:
+        return _run_o_i(received_messages, implementation)
+    elif operator == Operator.S:
+        return _run_s(received_messages, implementation)
+    elif operator == Operator.B:
+        return _run_b(received_messages, implementation)
+    elif operator == Operator.O_F:
+        return _run_o_f(received_messages, implementation)
+    elif operator == Operator.M:
+        return _run_m(received_messages, implementation)
 
 
 def _will_repeat(received_messages: Inbox) -> bool:
     repeat = len(received_messages) > 0
 
-    for _, message in received_messages.items():
+    for message in received_messages.values():
         repeat = repeat and message.next_time is not None
 
     return repeat
@@ -53,47 +214,166 @@ def _will_repeat(received_messages: Inbox) -> bool:
 
 def _initial_event(received_messages: Inbox) -> float:
     event = 0.0
-    for _, message in received_messages.items():
+    for message in received_messages.values():
         event = max(event, message.time)
     return event
 
 
+def _next_event(received_messages: Inbox) -> float:
+    """Returns the earliest next event, or None if any is None."""
+    next_event = None
+    for message in received_messages.values():
+        if message.next_time is None:
+            return None
+        if next_event is None or message.next_time < next_event:
+            next_event = message.next_time
+    return next_event
+
+
 def _take_state(received_messages: Inbox) -> (float, float, bool):
     "Returns cur_event, next_event, repeat."
-    cur_event = received_messages[''].time
-    next_event = received_messages[''].next_time
-    repeat = received_messages[''].data
-    del(received_messages[''])
-    return cur_event, next_event, repeat
+    state = received_messages.state
+    return state.time, state.next_time, state.data
+
+
+def _next_node(graph: ModelExecutionGraph, ready: ReadyQueue, blocked: ReadyQueue) -> ModelNode:
+    """Takes the next node to run from the ready queue.
+
+    This is the first node that can run without replacing messages that
+    have not been received yet. Nodes at the head of ready that cannot
+    are moved to blocked, and are taken from there first once they can,
+    so that the order is as if they had stayed in place. If all nodes
+    are blocked, nothing can run without losing data, and a
+    RuntimeError is raised, see _blocked_error().
+    """
+    if blocked:
+        for i, node in enumerate(blocked):
+            if not node.num_blocking:
+                del blocked[i]
+                return node
+    while ready:
+        node = ready.popleft()
+        if not node.num_blocking:
+            return node
+        blocked.append(node)
+    raise _blocked_error(graph, blocked)
 
 
-def _deliver_messages(graph: ModelExecutionGraph, node: ModelNode, sent_messages: Inbox) -> None:
-    for sending_endpoint_name in sent_messages:
-        receiver, receiving_endpoint_name = graph.find_receiver(node, sending_endpoint_name)
-        receiver.post_message(receiving_endpoint_name, sent_messages[sending_endpoint_name])
+def _blocked_error(graph: ModelExecutionGraph, blocked: ReadyQueue) -> RuntimeError:
+    """Describes a run stuck on full conduits, naming the blocked
+    senders and the receivers waiting for other messages.
+    """
+    unfinished, leftover = find_waiting_nodes(graph)
+    unfinished.update(leftover)
+    return RuntimeError(('Nothing can run without replacing messages that were not received'
+        ' yet. Blocked: {}. Waiting: {}. Send at the rate of the receiver, or use a'
+        ' deeper or interpolating conduit').format(
+            ', '.join(node_name(node) for node in blocked),
+            describe_waiting_nodes(unfinished) or 'none'))
 
 
+def _deliver_messages(
+        graph: ModelExecutionGraph,
+        node: ModelNode,
+        sent_messages: Outbox,
+        ready: ReadyQueue
+        ) -> None:
+    """Posts sent messages to their receivers.
+
+    Lazy data is evaluated before it is sent. Messages on unconnected
+    endpoints are removed from sent_messages without evaluating them,
+    so that only delivered messages are profiled, recorded and
+    checkpointed. Messages on endpoints with taps are posted to those
+    too. If taking its messages left node with a full inbox, it is made
+    ready again, and if it is an O_F node, the temporal adapters that
+    its element sends to are told that it finished.
+    """
+    routes = node.routes
+    dropped = None
+    for sending_endpoint_name, message in sent_messages.items():
+        try:
+            receiver, receiving_endpoint_name = routes[sending_endpoint_name]
+        except KeyError:
+            if sending_endpoint_name not in node.unconnected:
+                raise RuntimeError('Element {} sent a message on unknown endpoint {}'.format(
+                    node.element_name, sending_endpoint_name))
+            if dropped is None:
+                dropped = []
+            dropped.append(sending_endpoint_name)
+            continue
+        if type(message.data) is Lazy:
+            message.data = message.data.value()
+            node.observations_evaluated += 1
+        if receiver.post_message(receiving_endpoint_name, message):
+            ready.append(receiver)
+
+    if dropped is not None:
+        for sending_endpoint_name in dropped:
+            if type(sent_messages.pop(sending_endpoint_name).data) is Lazy:
+                node.observations_skipped += 1
+
+    if node.taps is not None:
+        for sending_endpoint_name, message in sent_messages.items():
+            for receiver, receiving_endpoint_name in node.taps.get(sending_endpoint_name, ()):
+                if receiver.post_message(receiving_endpoint_name, message):
+                    ready.append(receiver)
+
+    if node.refilled:
+        node.refilled = False
+        ready.append(node)
+
+    if node.finishes is not None:
+        for receiver, slot in node.finishes:
+            if receiver.finish_sending(slot):
+                ready.append(receiver)
+
+
+# The operators are run in two parts, so that the asyncio engine can
+# await the implementation's result in between: _start_*() takes the
+# events from the received messages and calls the implementation, and
+# _finish_*() makes the messages to send from the events and the result.
+
 def _run_f_init(
         configuration: Configuration,
         received_messages: Inbox,
         implementation: Submodel
-        ) -> Inbox:
+        ) -> Outbox:
+    return _finish_f_init(*_start_f_init(configuration, received_messages, implementation))
+
+
+def _start_f_init(
+        configuration: Configuration,
+        received_messages: Inbox,
+        implementation: Submodel
+        ) -> Tuple[Events, Any]:
 
-    _take_state(received_messages)
     repeat = _will_repeat(received_messages)
     cur_event = _initial_event(received_messages)
-
     next_event = implementation.initialise_state(configuration, cur_event, received_messages)
+    return (cur_event, None, repeat), next_event
+
+
+def _finish_f_init(events: Events, next_event: float) -> Outbox:
+    cur_event, _, repeat = events
     return { '__O_I': Message(cur_event, next_event, repeat) }
 
 
 def _run_o_i(
         received_messages: Inbox,
         implementation: Submodel
-        ) -> Inbox:
+        ) -> Outbox:
+    return _finish_o_i(*_start_o_i(received_messages, implementation))
 
-    cur_event, next_event, repeat = _take_state(received_messages)
-    sent_messages = implementation.observe_intermediate_state()
+
+def _start_o_i(
+        received_messages: Inbox,
+        implementation: Submodel
+        ) -> Tuple[Events, Any]:
+    return _take_state(received_messages), implementation.observe_intermediate_state()
+
+
+def _finish_o_i(events: Events, sent_messages: Dict[str, Any]) -> Outbox:
+    cur_event, next_event, repeat = events
     for endpoint in sent_messages:
         sent_messages[endpoint] = Message(cur_event, next_event, sent_messages[endpoint])
     sent_messages['__S'] = Message(cur_event, next_event, repeat)
@@ -103,21 +383,44 @@ def _run_o_i(
 def _run_s(
         received_messages: Inbox,
         implementation: Submodel
-        ) -> Inbox:
+        ) -> Outbox:
+    return _finish_s(*_start_s(received_messages, implementation))
+
+
+def _start_s(
+        received_messages: Inbox,
+        implementation: Submodel
+        ) -> Tuple[Events, Any]:
 
     cur_event, next_event, repeat = _take_state(received_messages)
     cur_event = next_event
-    next_event = implementation.solve(cur_event, received_messages)
+    return (cur_event, None, repeat), implementation.solve(cur_event, received_messages)
+
+
+def _finish_s(events: Events, next_event: float) -> Outbox:
+    cur_event, _, repeat = events
     return { '__B': Message(cur_event, next_event, repeat) }
 
 
 def _run_b(
         received_messages: Inbox,
         implementation: Submodel
-        ) -> Inbox:
+        ) -> Outbox:
+    return _finish_b(*_start_b(received_messages, implementation))
+
+
+def _start_b(
+        received_messages: Inbox,
+        implementation: Submodel
+        ) -> Tuple[Events, Any]:
 
     cur_event, next_event, repeat = _take_state(received_messages)
-    next_event = implementation.update_boundary_conditions(cur_event, next_event, received_messages)
+    return (cur_event, None, repeat), implementation.update_boundary_conditions(
+            cur_event, next_event, received_messages)
+
+
+def _finish_b(events: Events, next_event: float) -> Outbox:
+    cur_event, _, repeat = events
     if next_event is not None:
         return { '__O_I': Message(cur_event, next_event, repeat) }
     else:
@@ -127,12 +430,45 @@ def _run_b(
 def _run_o_f(
         received_messages: Inbox,
         implementation: Submodel
-        ) -> Inbox:
+        ) -> Outbox:
+    return _finish_o_f(*_start_o_f(received_messages, implementation))
 
-    cur_event, next_event, repeat = _take_state(received_messages)
-    sent_messages = implementation.observe_final_state()
+
+def _start_o_f(
+        received_messages: Inbox,
+        implementation: Submodel
+        ) -> Tuple[Events, Any]:
+    return _take_state(received_messages), implementation.observe_final_state()
+
+
+def _finish_o_f(events: Events, sent_messages: Dict[str, Any]) -> Outbox:
+    cur_event, next_event, repeat = events
     for endpoint in sent_messages:
         sent_messages[endpoint] = Message(cur_event, next_event, sent_messages[endpoint])
     if repeat:
         sent_messages['__F_INIT'] = Message(cur_event, next_event, repeat)
     return sent_messages
+
+
+def _run_m(
+        received_messages: Inbox,
+        implementation: Mapper
+        ) -> Outbox:
+    return _finish_m(*_start_m(received_messages, implementation))
+
+
+def _start_m(
+        received_messages: Inbox,
+        implementation: Mapper
+        ) -> Tuple[Events, Any]:
+
+    cur_event = _initial_event(received_messages)
+    next_event = _next_event(received_messages)
+    return (cur_event, next_event, False), implementation.map(received_messages)
+
+
+def _finish_m(events: Events, sent_messages: Dict[str, Any]) -> Outbox:
+    cur_event, next_event, _ = events
+    for endpoint in sent_messages:
+        sent_messages[endpoint] = Message(cur_event, next_event, sent_messages[endpoint])
+    return sent_messages
@@ -0,0 +1,179 @@
+from .mapper import Mapper, MapperDescription
+from .message import Message
+
+from overrides import overrides
+import os
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple, TYPE_CHECKING
+
+# pickle, threading and zlib are slow to import and only needed when a
+# sink is used, so they are imported where they are used
+if TYPE_CHECKING:
+    from queue import Queue
+    from threading import Thread
+
+
+# compressed or not, length of the payload
+_FRAME_HEADER = struct.Struct('<cQ')
+_CHUNK_SUFFIX = '.chunk'
+
+
+class Sink(Mapper):
+    """Writes the messages it receives to disk.
+
+    A Sink is a compute element with a single input named 'in', which
+    can be connected to any sending endpoint with Simulation.add_sink(),
+    including ones that are connected to another element. It stores the
+    time and data of the messages it receives in a directory, to be read
+    back with read_sink().
+
+    Messages are serialised when they are received, so that the sender
+    may reuse its data afterwards, but compressed and written to disk by
+    a background thread, so that the simulation does not wait for the
+    disk. At most max_pending messages wait to be written, after that
+    the simulation waits for the writer, so that memory use stays
+    bounded if the disk cannot keep up. Call close() to wait for all
+    messages to be written; the Simulation does this at the end of a
+    run. Since the thread must run in the process that runs the
+    simulation, sinks cannot be used in parallel runs.
+
+    The directory holds chunks of about chunk_size bytes, each a series
+    of frames with a pickled (time, data) tuple. Writing to a directory
+    that already has chunks adds new ones after them.
+
+    Args:
+        directory: Directory to write to.
+        every: Store only every every-th message, starting with the
+            first.
+        compression: zlib compression level, 0 to disable.
+        chunk_size: Size in bytes after which to start a new chunk.
+        max_pending: Number of received messages that may wait to be
+            written.
+    """
+    def __init__(self,
+            directory: str,
+            every: int = 1,
+            compression: int = 0,
+            chunk_size: int = 1 << 26,
+            max_pending: int = 64
+            ) -> None:
+
+        if max_pending < 1:
+            raise ValueError('max_pending must be at least 1')
+
+        self.directory = directory
+        self.every = every
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+
+        self.__count = 0
+        self.__queue = None     # type: Queue
+        self.__writer = None    # type: Thread
+        self.__closing = False
+        self.__error = None     # type: str
+
+
+    @overrides
+    def describe(self) -> MapperDescription:
+        description = MapperDescription()
+        description.add_input('in')
+        return description
+
+
+    @overrides
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        if self.__count % self.every == 0:
+            if self.__writer is None:
+                self.__start_writer()
+            import pickle
+            message = input_messages['in']
+            self.__queue.put(pickle.dumps(
+                (message.time, message.data), pickle.HIGHEST_PROTOCOL))
+        self.__count += 1
+        return {}
+
+
+    def close(self) -> None:
+        """Waits until all received messages have been written."""
+        if self.__writer is not None:
+            self.__closing = True
+            self.__queue.put(None)
+            self.__writer.join()
+            self.__writer = None
+            self.__queue = None
+        self.__count = 0
+
+        if self.__error is not None:
+            error, self.__error = self.__error, None
+            raise RuntimeError('Error writing to sink {}: {}'.format(self.directory, error))
+
+
+    def __start_writer(self) -> None:
+        from queue import Queue
+        from threading import Thread
+        os.makedirs(self.directory, exist_ok=True)
+        self.__queue = Queue(self.max_pending)
+        self.__closing = False
+        self.__writer = Thread(target=self.__write, name='littlemuscle-sink', daemon=True)
+        self.__writer.start()
+
+
+    def __write(self) -> None:
+        try:
+            _write_frames(self.__queue, self.directory, self.compression, self.chunk_size)
+        except Exception as e:
+            self.__error = str(e)
+            # keep taking messages until close(), which reports the error,
+            # so that the simulation does not wait for a full queue
+            while not self.__closing and self.__queue.get() is not None:
+                pass
+
+
+def read_sink(directory: str) -> Iterator[Tuple[float, Any]]:
+    """Yields the time and data of the messages stored by a Sink."""
+    import pickle
+    import zlib
+    for name in _list_chunks(directory):
+        with open(os.path.join(directory, name), 'rb') as f:
+            header = f.read(_FRAME_HEADER.size)
+            while len(header) == _FRAME_HEADER.size:
+                kind, length = _FRAME_HEADER.unpack(header)
+                payload = f.read(length)
+                if kind == b'Z':
+                    payload = zlib.decompress(payload)
+                yield pickle.loads(payload)
+                header = f.read(_FRAME_HEADER.size)
+
+
+def _list_chunks(directory: str) -> List[str]:
+    return sorted(name for name in os.listdir(directory) if name.endswith(_CHUNK_SUFFIX))
+
+
+def _write_frames(queue: 'Queue', directory: str, compression: int, chunk_size: int) -> None:
+    """Writes pickled messages from queue until it yields None."""
+    import zlib
+    existing = _list_chunks(directory)
+    number = int(existing[-1][:-len(_CHUNK_SUFFIX)]) if existing else 0
+    chunk = None    # type: BinaryIO
+
+    try:
+        payload = queue.get()
+        while payload is not None:
+            if chunk is None or chunk.tell() >= chunk_size:
+                if chunk is not None:
+                    chunk.close()
+                number += 1
+                chunk = open(os.path.join(directory, '{:06d}{}'.format(
+                    number, _CHUNK_SUFFIX)), 'ab')
+
+            if compression:
+                payload = zlib.compress(payload, compression)
+                chunk.write(_FRAME_HEADER.pack(b'Z', len(payload)))
+            else:
+                chunk.write(_FRAME_HEADER.pack(b'P', len(payload)))
+            chunk.write(payload)
+            payload = queue.get()
+    finally:
+        if chunk is not None:
+            chunk.close()
@@ -67,6 +67,19 @@ class Submodel(ABC):
     def observe_final_state(self) -> Dict[str, Any]:
         pass
 
+    def save_state(self) -> Any:
+        """Returns the state of the submodel, for checkpointing.
+
+        The result must be picklable. By default, this returns the
+        object's attributes. Override it together with load_state() if
+        that does not work or is inefficient.
+        """
+        return dict(self.__dict__)
+
+    def load_state(self, state: Any) -> None:
+        """Restores a state returned by save_state()."""
+        self.__dict__.update(state)
+
 
 class TimeDrivenSubmodel(ABC):
 
@@ -102,6 +115,17 @@ class TimeDrivenSubmodel(ABC):
     def has_converged(self) -> bool:
         pass
 
+    def propose_step(self, time: float) -> float:
+        """Returns the size of the step to take after time.
+
+        This is called after initialise_state() and after each solve(),
+        with the time just reached. Return None to step by the grain of
+        the time scale, which is what this does by default. Proposed
+        steps are bounded by the min_grain and max_grain of the time
+        scale, see TimeDrivenAdapter.
+        """
+        return None
+
     @abstractmethod
     def observe_intermediate_state(self) -> Dict[str, Any]:
         pass
@@ -109,3 +133,30 @@ class TimeDrivenSubmodel(ABC):
     @abstractmethod
     def observe_final_state(self) -> Dict[str, Any]:
         pass
+
+    def save_state(self) -> Any:
+        """Returns the state of the submodel, for checkpointing.
+
+        The result must be picklable. By default, this returns the
+        object's attributes. Override it together with load_state() if
+        that does not work or is inefficient.
+        """
+        return dict(self.__dict__)
+
+    def load_state(self, state: Any) -> None:
+        """Restores a state returned by save_state()."""
+        self.__dict__.update(state)
+
+
+class BatchedTimeDrivenSubmodel(TimeDrivenSubmodel):
+    """A TimeDrivenSubmodel that implements a whole ensemble at once.
+
+    Add one of these to a Simulation using add_ensemble(). It is called
+    once per operator for all instances together. Each received message
+    has as data a sequence (typically a NumPy array) with the instances
+    along the first axis, and observations must be returned in the same
+    way, so that all instances can be computed in a single vectorised
+    operation. has_converged() should return True only when all
+    instances have converged.
+    """
+    pass
@@ -0,0 +1,88 @@
+from .configuration import Configuration, Parameters, merge_configuration
+from .simulation import Simulation
+
+from copy import deepcopy
+from itertools import product
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+
+# parameters to override, by compute element
+Point = Dict[str, Parameters]
+
+
+def run_sweep(
+        simulation: Simulation,
+        grid: Dict[str, Dict[str, Sequence[Any]]],
+        observe: Callable[[Simulation], Any],
+        processes: int = None,
+        cache_directory: str = None
+        ) -> List[Tuple[Point, Any]]:
+    """Runs a simulation for every combination of parameter values.
+
+    Each run uses a copy of the simulation, with the parameters of a
+    point of the grid merged into the configurations of the elements
+    (see merge_configuration()). After the run, observe is called with
+    the copy, and its result is returned with the point, e.g. a value
+    taken from a submodel found with Simulation.get_submodel().
+
+    The runs are divided over a pool of processes, so the simulation,
+    observe and its results must be picklable. observe must be a
+    module-level function for that reason.
+
+    If a cache directory is given, all runs cache their results there,
+    see Simulation.cache_results(). Elements whose configuration and
+    inputs are the same as in an earlier run, including one of an
+    earlier sweep, are then not run again, so only the part of the
+    model that depends on the swept parameters is recomputed. Since
+    submodels whose results are taken from the cache do not run,
+    observe should get results from elements that are not cached, e.g.
+    a mapper receiving the final observation of interest.
+
+    Args:
+        simulation: The model to run, with its base configurations.
+        grid: For some compute elements, for some of their parameters,
+            the values to run with, e.g. {'macro': {'k': [1.0, 2.0]}}.
+        observe: Function that extracts the result of a run.
+        processes: Number of processes to use, defaults to the number
+            of CPUs. With 1, runs in the calling process.
+        cache_directory: Directory to cache submodel results in.
+
+    Returns:
+        The points of the grid, in order, each with its result.
+    """
+    axes = [(element, parameter, values)
+            for element, parameters in sorted(grid.items())
+            for parameter, values in sorted(parameters.items())]
+
+    points = []     # type: List[Point]
+    for values in product(*(values for _, _, values in axes)):
+        point = {}  # type: Point
+        for (element, parameter, _), value in zip(axes, values):
+            point.setdefault(element, {})[parameter] = value
+        points.append(point)
+
+    tasks = [(simulation, point, observe, cache_directory) for point in points]
+    if processes == 1:
+        results = [_run_point((deepcopy(simulation),) + task[1:]) for task in tasks]
+    else:
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            results = pool.map(_run_point, tasks, chunksize=1)
+
+    return list(zip(points, results))
+
+
+def _run_point(task: Tuple[Simulation, Point, Callable[[Simulation], Any], str]) -> Any:
+    simulation, point, observe, cache_directory = task
+    if cache_directory is not None:
+        simulation.cache_results(cache_directory)
+
+    for element, parameters in point.items():
+        base = simulation.get_configuration(element)
+        override = Configuration()
+        override.parameters = parameters
+        simulation.set_configuration(
+                element, merge_configuration(base or Configuration(), override))
+
+    simulation.run()
+    return observe(simulation)
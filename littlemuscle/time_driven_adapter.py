@@ -1,17 +1,46 @@
 from .configuration import Configuration
+from .scale import Scale
 from .submodel import Submodel, SubmodelDescription, TimeDrivenSubmodel
 from .message import Message
 
 from overrides import overrides
-from typing import Any, Dict
+import math
+from typing import Any, Awaitable, Dict
+
+
+_TOLERANCE = 1e-9   # relative, for comparing events to grain multiples
 
 
 class TimeDrivenAdapter(Submodel):
-    """Adapts a TimeDrivenSubmodel to the Submodel interface."""
+    """Adapts a TimeDrivenSubmodel to the Submodel interface.
+
+    If methods of the adaptee are coroutine functions, the corresponding
+    methods of the adapter return awaitables too, for use with
+    run_simulation_async().
+
+    The adapter steps through time by the grain of the time scale,
+    unless the adaptee proposes step sizes with propose_step(). Fixed
+    steps are at the initial event plus a whole number of grains, and
+    one that is within rounding error of the end of the extent is moved
+    onto it, so that rounding does not add or lose a step. Proposed
+    steps are bounded by the min_grain and max_grain of the time scale,
+    and the last of them ends exactly at the end of the extent.
+
+    Adaptive steps are kept in sync with those of coupled submodels in
+    two ways. If the extent of the time scale is None, the submodel runs
+    from its initial event until the next event announced by the
+    messages it received in F_INIT, so that e.g. a micro model covers
+    exactly one step of a macro model, whatever its size. And an
+    adaptive submodel does not step past the next event announced by
+    any message it receives in S or B, but stops there.
+    """
 
     def __init__(self, adaptee: TimeDrivenSubmodel) -> None:
         self.__adaptee = adaptee
         self.__initial_event = None     # type: float
+        self.__time_scale = None        # type: Scale
+        self.__end_event = None         # type: float
+        self.__adaptive = False
 
 
     @overrides
@@ -30,31 +59,44 @@ class TimeDrivenAdapter(Submodel):
 
         self.__initial_event = initial_event
 
-        next_event = self.__initial_event + self.__time_scale.grain
-        if self.__initial_event + self.__time_scale.extent < next_event:
-            next_event = None
-        self.__adaptee.initialise_state(configuration, initial_event, input_messages)
-        return next_event
+        if self.__time_scale.extent is not None:
+            self.__end_event = self.__initial_event + self.__time_scale.extent
+        else:
+            self.__end_event = _synchronise(initial_event, float('inf'), input_messages)
+            if self.__end_event == float('inf'):
+                raise RuntimeError('The time scale has no extent, and no message'
+                        ' received in F_INIT announces when to stop')
+
+        result = self.__adaptee.initialise_state(configuration, initial_event, input_messages)
+        if _is_awaitable(result):
+            return self.__next_event_async(result, initial_event, input_messages)
+        return self.__next_event(initial_event, input_messages)
 
     @overrides
     def solve(self,
             event: float,
             input_messages: Dict[str, Message]) -> float:
 
-        next_event = event + self.__time_scale.grain
-        if self.__initial_event + self.__time_scale.extent < next_event:
-            next_event = None
-        self.__adaptee.solve(event, input_messages)
-        return next_event
+        result = self.__adaptee.solve(event, input_messages)
+        if _is_awaitable(result):
+            return self.__next_event_async(result, event, input_messages)
+        return self.__next_event(event, input_messages)
 
     @overrides
     def update_boundary_conditions(self,
             event: float, next_event: float,
             input_messages: Dict[str, Message]) -> float:
 
-        self.__adaptee.update_boundary_conditions(event, input_messages)
-        if self.__adaptee.has_converged():
+        result = self.__adaptee.update_boundary_conditions(event, input_messages)
+        if _is_awaitable(result):
+            return self.__update_async(result, event, next_event, input_messages)
+        converged = self.__adaptee.has_converged()
+        if _is_awaitable(converged):
+            return self.__update_async(None, event, next_event, input_messages, converged)
+        if converged:
             next_event = None
+        elif self.__adaptive:
+            next_event = _synchronise(event, next_event, input_messages)
         return next_event
 
     @overrides
@@ -64,3 +106,112 @@ class TimeDrivenAdapter(Submodel):
     @overrides
     def observe_final_state(self) -> Dict[str, Any]:
         return self.__adaptee.observe_final_state()
+
+    def num_steps(self, configuration: Configuration) -> int:
+        """Returns the number of steps of a run starting at event 0.
+
+        Returns None if this cannot be known before running, because
+        the adaptee proposes its own steps or the time scale has no
+        extent. Early convergence is not taken into account.
+        """
+        time_scale = configuration.time_scale if configuration is not None else None
+        if time_scale is None or time_scale.extent is None or time_scale.grain <= 0.0:
+            return None
+        proposer = getattr(self.__adaptee.propose_step, '__func__', None)
+        if proposer is not TimeDrivenSubmodel.propose_step:
+            return None
+
+        # the same arithmetic as __next_event
+        return math.floor(time_scale.extent / time_scale.grain + _TOLERANCE)
+
+    def __next_event(self, event: float, input_messages: Dict[str, Message]) -> float:
+        """Returns the event after the given one, or None at the end."""
+        step = self.__adaptee.propose_step(event)
+        if step is None:
+            self.__adaptive = False
+            return self.__next_grain_event(event)
+
+        self.__adaptive = True
+        if self.__time_scale.min_grain is not None:
+            step = max(step, self.__time_scale.min_grain)
+        if self.__time_scale.max_grain is not None:
+            step = min(step, self.__time_scale.max_grain)
+        if step <= 0.0:
+            raise RuntimeError('Submodel proposed a step of {} at {}, steps must be'
+                    ' positive'.format(step, event))
+
+        if event >= self.__end_event:
+            return None
+        next_event = min(event + step, self.__end_event)
+        return _synchronise(event, next_event, input_messages)
+
+    def __next_grain_event(self, event: float) -> float:
+        """Returns the first multiple of the grain after the given event,
+        counting from the initial event, or None at the end.
+        """
+        grain = self.__time_scale.grain
+        steps = math.floor((event - self.__initial_event) / grain + _TOLERANCE) + 1
+        next_event = self.__initial_event + steps * grain
+        if math.isclose(next_event, self.__end_event,
+                rel_tol=_TOLERANCE, abs_tol=_TOLERANCE * grain):
+            return self.__end_event
+        if self.__end_event < next_event:
+            return None
+        return next_event
+
+    async def __next_event_async(self,
+            result: Awaitable, event: float, input_messages: Dict[str, Message]
+            ) -> float:
+        await result
+        return self.__next_event(event, input_messages)
+
+    async def __update_async(self,
+            result: Awaitable, event: float, next_event: float,
+            input_messages: Dict[str, Message], converged: Awaitable = None
+            ) -> float:
+
+        if result is not None:
+            await result
+        if converged is None:
+            converged = self.__adaptee.has_converged()
+        if _is_awaitable(converged):
+            converged = await converged
+        if converged:
+            next_event = None
+        elif self.__adaptive:
+            next_event = _synchronise(event, next_event, input_messages)
+        return next_event
+
+    @overrides
+    def save_state(self) -> Any:
+        return {
+                'initial_event': self.__initial_event,
+                'time_scale': self.__time_scale,
+                'end_event': self.__end_event,
+                'adaptive': self.__adaptive,
+                'adaptee': self.__adaptee.save_state()
+                }
+
+    @overrides
+    def load_state(self, state: Any) -> None:
+        self.__initial_event = state['initial_event']
+        self.__time_scale = state['time_scale']
+        self.__end_event = state['end_event']
+        self.__adaptive = state['adaptive']
+        self.__adaptee.load_state(state['adaptee'])
+
+
+def _is_awaitable(value: Any) -> bool:
+    return value is not None and hasattr(value, '__await__')
+
+
+def _synchronise(event: float, next_event: float, input_messages: Dict[str, Message]) -> float:
+    """Returns the earliest event after event announced by a message,
+    if that is before next_event, and next_event otherwise.
+    """
+    if next_event is None:
+        return None
+    for message in input_messages.values():
+        if message.next_time is not None and event < message.next_time < next_event:
+            next_event = message.next_time
+    return next_event
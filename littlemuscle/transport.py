@@ -0,0 +1,34 @@
+import pickle
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+
+class PickleTransport:
+    """Sends objects between processes by pickling them.
+
+    This is the default transport of the parallel engine. It copies all
+    message data through the pipe between the processes.
+    """
+    # whether message data may arrive as descriptors of shared memory,
+    # which can only be delivered once
+    shares_memory = False
+
+
+    def send(self, connection: 'Connection', obj: Any) -> None:
+        connection.send_bytes(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+
+    def receive(self, connection: 'Connection') -> Any:
+        return pickle.loads(connection.recv_bytes())
+
+
+    def for_worker(self) -> 'PickleTransport':
+        """Returns the transport to use on the worker side."""
+        return self
+
+
+    def close(self) -> None:
+        """Releases any resources held by the transport."""
+        pass
@@ -0,0 +1,189 @@
+"""Small submodels for the tests.
+
+Each one does a little arithmetic, so that a change in the order or
+content of the messages it receives shows up in its results.
+"""
+from littlemuscle import (
+        Configuration, Mapper, MapperDescription, Message, Operator, Scale,
+        Simulation, SubmodelDescription, TimeDrivenSubmodel)
+
+import pickle
+from typing import Any, Dict, List, Tuple
+
+
+class Macro(TimeDrivenSubmodel):
+    """Sends its state on 'out' and mixes in what comes back on 'in'.
+
+    The (time, state) history is kept in history, and sent on 'history'
+    at the end, so that it can be collected from a parallel run too.
+    """
+    def describe(self) -> SubmodelDescription:
+        description = SubmodelDescription(1)
+        description.add_endpoint(Operator.O_I, 'out')
+        description.add_endpoint(Operator.S, 'in')
+        description.add_endpoint(Operator.O_F, 'history')
+        return description
+
+    def initialise_state(self, configuration, initial_time, input_messages):
+        self.u = 1.0
+        self.history = []   # type: List[Tuple[float, float]]
+
+    def solve(self, time, input_messages):
+        self.u = self.u * 0.5 + input_messages['in'].data
+        self.history.append((time, self.u))
+
+    def update_boundary_conditions(self, time, input_messages):
+        pass
+
+    def has_converged(self):
+        return False
+
+    def observe_intermediate_state(self):
+        return {'out': self.u}
+
+    def observe_final_state(self):
+        return {'history': self.history}
+
+
+class Micro(TimeDrivenSubmodel):
+    """Decays the value it receives on 'init', sends it on 'result'.
+
+    Converges after converge_after steps, if given.
+    """
+    def __init__(self, converge_after: int = None) -> None:
+        self.converge_after = converge_after
+
+    def describe(self) -> SubmodelDescription:
+        description = SubmodelDescription(1)
+        description.add_endpoint(Operator.F_INIT, 'init')
+        description.add_endpoint(Operator.O_F, 'result')
+        return description
+
+    def initialise_state(self, configuration, initial_time, input_messages):
+        self.v = input_messages['init'].data
+        self.steps = 0
+
+    def solve(self, time, input_messages):
+        self.v = self.v * 0.9
+        self.steps += 1
+
+    def update_boundary_conditions(self, time, input_messages):
+        pass
+
+    def has_converged(self):
+        return self.converge_after is not None and self.steps >= self.converge_after
+
+    def observe_intermediate_state(self):
+        return {}
+
+    def observe_final_state(self):
+        return {'result': self.v}
+
+
+class Producer(TimeDrivenSubmodel):
+    """Sends its step count on 'out', and logs its steps to log."""
+    def __init__(self, log: List[Tuple[str, float]] = None) -> None:
+        self.log = log
+
+    def describe(self) -> SubmodelDescription:
+        description = SubmodelDescription(1)
+        description.add_endpoint(Operator.O_I, 'out')
+        return description
+
+    def initialise_state(self, configuration, initial_time, input_messages):
+        self.steps = 0
+
+    def solve(self, time, input_messages):
+        self.steps += 1
+        if self.log is not None:
+            self.log.append(('produce', time))
+
+    def update_boundary_conditions(self, time, input_messages):
+        pass
+
+    def has_converged(self):
+        return False
+
+    def observe_intermediate_state(self):
+        return {'out': self.steps}
+
+    def observe_final_state(self):
+        return {}
+
+
+class Consumer(TimeDrivenSubmodel):
+    """Keeps the data it receives on 'in' in seen, and logs to log."""
+    def __init__(self, log: List[Tuple[str, float]] = None) -> None:
+        self.log = log
+
+    def describe(self) -> SubmodelDescription:
+        description = SubmodelDescription(1)
+        description.add_endpoint(Operator.S, 'in')
+        return description
+
+    def initialise_state(self, configuration, initial_time, input_messages):
+        self.seen = []  # type: List[Any]
+
+    def solve(self, time, input_messages):
+        self.seen.append(input_messages['in'].data)
+        if self.log is not None:
+            self.log.append(('consume', time))
+
+    def update_boundary_conditions(self, time, input_messages):
+        pass
+
+    def has_converged(self):
+        return False
+
+    def observe_intermediate_state(self):
+        return {}
+
+    def observe_final_state(self):
+        return {}
+
+
+class Writer(Mapper):
+    """Pickles the data it receives on 'in' to a file."""
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def describe(self) -> MapperDescription:
+        description = MapperDescription()
+        description.add_input('in')
+        return description
+
+    def map(self, input_messages: Dict[str, Message]) -> Dict[str, Any]:
+        with open(self.path, 'wb') as f:
+            pickle.dump(input_messages['in'].data, f)
+        return {}
+
+
+def configuration(grain: float, extent: float) -> Configuration:
+    result = Configuration()
+    result.time_scale = Scale(grain, extent)
+    return result
+
+
+def macro_micro(micro: Micro = None) -> Simulation:
+    """A macro model that runs a micro model to completion each step."""
+    simulation = Simulation()
+    simulation.add_submodel('macro', Macro())
+    simulation.add_submodel('micro', micro or Micro())
+    simulation.add_conduit('macro', 'out', 'micro', 'init')
+    simulation.add_conduit('micro', 'result', 'macro', 'in')
+    simulation.set_configuration('macro', configuration(1.0, 10.0))
+    simulation.set_configuration('micro', configuration(0.1, 1.0))
+    return simulation
+
+
+def producer_consumer(
+        producer_extent: float, consumer_extent: float,
+        log: List[Tuple[str, float]] = None, depth: int = 1) -> Simulation:
+    """A Producer sending to a Consumer, both with steps of 1.0."""
+    simulation = Simulation()
+    simulation.add_submodel('producer', Producer(log))
+    simulation.add_submodel('consumer', Consumer(log))
+    simulation.add_conduit('producer', 'out', 'consumer', 'in', depth=depth)
+    simulation.set_configuration('producer', configuration(1.0, producer_extent))
+    simulation.set_configuration('consumer', configuration(1.0, consumer_extent))
+    return simulation
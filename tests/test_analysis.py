@@ -0,0 +1,32 @@
+from models import Micro, producer_consumer
+
+from littlemuscle import Simulation
+
+import pytest
+
+
+def test_mutual_wait_is_found_before_running():
+    simulation = Simulation()
+    simulation.add_submodel('a', Micro())
+    simulation.add_submodel('b', Micro())
+    simulation.add_conduit('a', 'result', 'b', 'init')
+    simulation.add_conduit('b', 'result', 'a', 'init')
+
+    with pytest.raises(RuntimeError, match='a.f_init can never run'):
+        simulation.run()
+
+
+def test_starvation_warns_and_names_waiting_operator():
+    simulation = producer_consumer(5.0, 10.0)
+    with pytest.warns(RuntimeWarning, match='consumer.S runs 10 times'):
+        with pytest.raises(RuntimeError, match='operators waiting: consumer.S for in'):
+            simulation.run()
+    # it ran as far as it could
+    assert simulation.get_submodel('consumer').seen == [0, 1, 2, 3, 4]
+
+
+def test_matching_rates_give_no_warnings(recwarn):
+    simulation = producer_consumer(5.0, 5.0)
+    simulation.run()
+    assert simulation.get_submodel('consumer').seen == [0, 1, 2, 3, 4]
+    assert not [warning for warning in recwarn if warning.category is RuntimeWarning]
@@ -0,0 +1,33 @@
+from models import producer_consumer
+
+import pytest
+
+
+@pytest.mark.parametrize('options', [
+    {}, {'parallel': True}, {'asynchronous': True}, {'static_schedule': True}])
+def test_sender_ahead_raises_instead_of_overwriting(options):
+    simulation = producer_consumer(10.0, 5.0)
+    with pytest.raises(RuntimeError, match='Blocked: producer.O_i'):
+        simulation.run(**options)
+
+
+def test_deep_conduit_keeps_all_messages():
+    log = []
+    simulation = producer_consumer(10.0, 5.0, log, depth=5)
+    with pytest.warns(RuntimeWarning, match='left unused'):
+        simulation.run()
+    assert simulation.get_submodel('consumer').seen == [0, 1, 2, 3, 4]
+    assert log.count(('produce', 9.0)) == 1
+
+
+@pytest.mark.parametrize('depth', [1, 3])
+def test_sender_waits_for_receiver(depth):
+    log = []
+    simulation = producer_consumer(10.0, 10.0, log, depth)
+    simulation.run()
+    assert simulation.get_submodel('consumer').seen == list(range(10))
+
+    ahead = 0
+    for kind, _ in log:
+        ahead += 1 if kind == 'produce' else -1
+        assert 0 <= ahead <= depth
@@ -0,0 +1,60 @@
+from models import Macro, Micro, configuration, macro_micro
+
+from littlemuscle import Checkpointer, Simulation
+
+import os
+from typing import List
+
+import pytest
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingMacro(Macro):
+    """A Macro that fails at time crash_at, and logs the times it
+    solved at to solved. Both are class attributes, so that they are
+    not part of the checkpointed state.
+    """
+    crash_at = None     # type: float
+    solved = []         # type: List[float]
+
+    def solve(self, time, input_messages):
+        if time == self.crash_at:
+            raise Crash()
+        CrashingMacro.solved.append(time)
+        super().solve(time, input_messages)
+
+
+def with_macro(macro):
+    simulation = Simulation()
+    simulation.add_submodel('macro', macro)
+    simulation.add_submodel('micro', Micro())
+    simulation.add_conduit('macro', 'out', 'micro', 'init')
+    simulation.add_conduit('micro', 'result', 'macro', 'in')
+    simulation.set_configuration('macro', configuration(1.0, 10.0))
+    simulation.set_configuration('micro', configuration(0.1, 1.0))
+    return simulation
+
+
+@pytest.mark.parametrize('compression', [0, 1])
+def test_resume_after_crash(tmp_path, monkeypatch, compression):
+    expected = macro_micro()
+    expected.run()
+
+    directory = str(tmp_path / 'checkpoints')
+    checkpointer = Checkpointer(directory, simulated_interval=3.0, compression=compression)
+    monkeypatch.setattr(CrashingMacro, 'crash_at', 7.0)
+    with pytest.raises(Crash):
+        with_macro(CrashingMacro()).run(checkpointer=checkpointer)
+    assert any(name.endswith('.pickle') for name in os.listdir(directory))
+
+    monkeypatch.setattr(CrashingMacro, 'crash_at', None)
+    monkeypatch.setattr(CrashingMacro, 'solved', [])
+    resumed = with_macro(CrashingMacro())
+    resumed.run(resume_from=directory)
+
+    # it continued from a checkpoint, rather than from the beginning
+    assert CrashingMacro.solved[0] > 3.0
+    assert resumed.get_submodel('macro').history == expected.get_submodel('macro').history
@@ -0,0 +1,50 @@
+from models import Macro, Micro, Writer, configuration, macro_micro
+
+from littlemuscle import Simulation
+from littlemuscle.shared_memory_transport import SharedMemoryTransport
+
+import numpy as np
+import pickle
+
+
+class ArrayMacro(Macro):
+    """A Macro with an array for a state, which Micro decays as a whole."""
+    def initialise_state(self, configuration, initial_time, input_messages):
+        super().initialise_state(configuration, initial_time, input_messages)
+        self.u = np.linspace(0.0, 1.0, 1 << 16)
+
+
+def run_with_writer(simulation, path, **kwargs):
+    simulation.add_mapper('writer', Writer(str(path)))
+    simulation.add_conduit('macro', 'history', 'writer', 'in')
+    simulation.run(**kwargs)
+    with path.open('rb') as f:
+        return pickle.load(f)
+
+
+def test_parallel_equals_serial(tmp_path):
+    serial = run_with_writer(macro_micro(), tmp_path / 'serial')
+    parallel = run_with_writer(macro_micro(), tmp_path / 'parallel', parallel=True)
+    assert len(serial) == 10
+    assert parallel == serial
+
+
+def test_shared_memory_equals_serial(tmp_path):
+    def array_macro_micro():
+        simulation = Simulation()
+        simulation.add_submodel('macro', ArrayMacro())
+        simulation.add_submodel('micro', Micro())
+        simulation.add_conduit('macro', 'out', 'micro', 'init')
+        simulation.add_conduit('micro', 'result', 'macro', 'in')
+        simulation.set_configuration('macro', configuration(1.0, 5.0))
+        simulation.set_configuration('micro', configuration(0.1, 1.0))
+        return simulation
+
+    serial = run_with_writer(array_macro_micro(), tmp_path / 'serial')
+    transport = SharedMemoryTransport(min_size=1024, directory=str(tmp_path))
+    shared = run_with_writer(array_macro_micro(), tmp_path / 'shared',
+            parallel=True, transport=transport)
+
+    assert [time for time, _ in shared] == [time for time, _ in serial]
+    for (_, expected), (_, actual) in zip(serial, shared):
+        assert np.array_equal(actual, expected)
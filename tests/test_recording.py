@@ -0,0 +1,34 @@
+from models import Macro, configuration, macro_micro
+
+from littlemuscle import Recorder, Simulation
+from littlemuscle.message import Message
+from littlemuscle.recording import ConduitLog, Record
+
+import numpy as np
+
+
+def test_replay_single_element(tmp_path):
+    recorded = macro_micro()
+    recorded.run(recorder=Recorder(str(tmp_path), chunk_size=500))
+    assert len(list(tmp_path.glob('*.records'))) > 1
+
+    replayed = Simulation()
+    replayed.add_submodel('macro', Macro())
+    replayed.set_configuration('macro', configuration(1.0, 10.0))
+    replayed.replay('macro', str(tmp_path))
+
+    expected = recorded.get_submodel('macro').history
+    assert len(expected) == 10
+    assert replayed.get_submodel('macro').history == expected
+
+
+def test_large_arrays_are_mapped(tmp_path):
+    recorder = Recorder(str(tmp_path), min_array_size=1024)
+    data = np.arange(1000.0)
+    recorder.record(Record('a', 'out', 'b', 'in', Message(0.0, 1.0, data)))
+    recorder.close()
+
+    record, = ConduitLog(str(tmp_path)).records()
+    assert record.sender == 'a' and record.receiving_endpoint == 'in'
+    assert np.array_equal(record.message.data, data)
+    assert not record.message.data.flags.writeable
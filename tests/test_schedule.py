@@ -0,0 +1,19 @@
+from models import Micro, macro_micro
+
+
+def test_static_schedule_equals_dynamic():
+    dynamic = macro_micro()
+    dynamic.run()
+    static = macro_micro()
+    static.run(static_schedule=True)
+    # a compiled schedule is kept and reused
+    static.run(static_schedule=True)
+    assert static.get_submodel('macro').history == dynamic.get_submodel('macro').history
+
+
+def test_static_schedule_falls_back_on_convergence():
+    dynamic = macro_micro(Micro(converge_after=3))
+    dynamic.run()
+    static = macro_micro(Micro(converge_after=3))
+    static.run(static_schedule=True)
+    assert static.get_submodel('macro').history == dynamic.get_submodel('macro').history